@@ -0,0 +1,443 @@
+import time
+import argparse
+
+import numpy as np
+
+import parta2
+from parta2 import RA, RB, ACC, CF, PC, TEMP, PA, IOA, TIMER, TRUN, NUM_REGS, MEM_SIZE, DECODE_TABLE
+
+# Errors recorded per instance when it stops
+NO_ERROR = -1
+FETCH_OUT_OF_RANGE = -2   # PC past the end of memory (IndexError in Arch242CPU)
+
+NO_TIMER = np.iinfo(np.int64).max   # timer_due of an instance whose timer is stopped
+
+
+# === Per-opcode decode arrays ===
+# Built from parta2.DECODE_TABLE so both emulators decode identically.
+# KIND[op] indexes KIND_HANDLERS; ARG[op] is the register index or
+# immediate nibble; SRC_HI/SRC_LO are the address registers for mem ops.
+
+KIND_HANDLERS = []
+KIND = np.zeros(256, dtype=np.int16)
+LENGTH = np.zeros(256, dtype=np.int32)
+ARG = np.zeros(256, dtype=np.int32)
+SRC_HI = np.full(256, RB, dtype=np.int32)
+SRC_LO = np.full(256, RA, dtype=np.int32)
+
+for _opcode, (_handler, _arg, _length) in enumerate(DECODE_TABLE):
+    if _handler not in KIND_HANDLERS:
+        KIND_HANDLERS.append(_handler)
+    KIND[_opcode] = KIND_HANDLERS.index(_handler)
+    LENGTH[_opcode] = _length
+    if isinstance(_arg, tuple):
+        SRC_HI[_opcode], SRC_LO[_opcode] = _arg
+    elif _arg is not None and _length == 1:
+        ARG[_opcode] = _arg
+
+
+# === Vectorized opcode groups ===
+# Each takes (batch, i, opcode, imm): the instances i that fetched an opcode
+# of that group, their opcodes and second instruction bytes, with PC already
+# advanced past the instruction.
+
+def mem_addr(b, i, opcode):
+    r = b.regs
+    return ((r[SRC_HI[opcode], i] & 0x0F) << 4) | (r[SRC_LO[opcode], i] & 0x0F)
+
+
+def v_rot_r(b, i, opcode, imm):
+    acc = b.regs[ACC, i]
+    b.regs[ACC, i] = ((acc >> 1) | ((acc & 1) << 3)) & 0xF
+
+
+def v_rot_l(b, i, opcode, imm):
+    acc = b.regs[ACC, i]
+    b.regs[ACC, i] = ((acc << 1) | ((acc >> 3) & 1)) & 0xF
+
+
+def v_rot_rc(b, i, opcode, imm):
+    combined = (b.regs[CF, i] << 4) | b.regs[ACC, i]
+    combined = ((combined >> 1) | ((combined & 1) << 4)) & 0x1F
+    b.regs[CF, i] = (combined >> 4) & 1
+    b.regs[ACC, i] = combined & 0xF
+
+
+def v_rot_lc(b, i, opcode, imm):
+    combined = (b.regs[CF, i] << 4) | b.regs[ACC, i]
+    combined = ((combined << 1) | ((combined >> 4) & 1)) & 0x1F
+    b.regs[CF, i] = (combined >> 4) & 1
+    b.regs[ACC, i] = combined & 0xF
+
+
+def v_from_mem(b, i, opcode, imm):
+    b.regs[ACC, i] = b.memory[i, mem_addr(b, i, opcode)] & 0xF
+
+
+def v_to_mem(b, i, opcode, imm):
+    b.memory[i, mem_addr(b, i, opcode)] = b.regs[ACC, i] & 0xF
+
+
+def v_addc_mba(b, i, opcode, imm):
+    total = b.regs[ACC, i] + (b.memory[i, mem_addr(b, i, opcode)] & 0xF) + b.regs[CF, i]
+    b.regs[ACC, i] = total & 0xF
+    b.regs[CF, i] = total > 0xF
+
+
+def v_add_mba(b, i, opcode, imm):
+    total = b.regs[ACC, i] + (b.memory[i, mem_addr(b, i, opcode)] & 0xF)
+    b.regs[ACC, i] = total & 0xF
+    b.regs[CF, i] = total > 0xF
+
+
+def v_subc_mba(b, i, opcode, imm):
+    diff = b.regs[ACC, i] - (b.memory[i, mem_addr(b, i, opcode)] & 0xF) + b.regs[CF, i]
+    b.regs[CF, i] = diff < 0
+    b.regs[ACC, i] = diff & 0xF
+
+
+def v_sub_mba(b, i, opcode, imm):
+    diff = b.regs[ACC, i] - (b.memory[i, mem_addr(b, i, opcode)] & 0xF)
+    b.regs[CF, i] = diff < 0
+    b.regs[ACC, i] = diff & 0xF
+
+
+def v_inc_mem(b, i, opcode, imm):
+    addr = mem_addr(b, i, opcode)
+    b.memory[i, addr] = (b.memory[i, addr].astype(np.int32) + 1) & 0xF
+
+
+def v_dec_mem(b, i, opcode, imm):
+    addr = mem_addr(b, i, opcode)
+    b.memory[i, addr] = (b.memory[i, addr].astype(np.int32) - 1) & 0xF
+
+
+def v_inc_reg(b, i, opcode, imm):
+    reg = ARG[opcode]
+    b.regs[reg, i] = (b.regs[reg, i] + 1) & 0xF
+
+
+def v_dec_reg(b, i, opcode, imm):
+    reg = ARG[opcode]
+    b.regs[reg, i] = (b.regs[reg, i] - 1) & 0xF
+
+
+def v_to_reg(b, i, opcode, imm):
+    b.regs[ARG[opcode], i] = b.regs[ACC, i] & 0xF
+
+
+def v_from_reg(b, i, opcode, imm):
+    b.regs[ACC, i] = b.regs[ARG[opcode], i] & 0xF
+
+
+def v_clr_cf(b, i, opcode, imm):
+    b.regs[CF, i] = 0
+
+
+def v_set_cf(b, i, opcode, imm):
+    b.regs[CF, i] = 1
+
+
+def v_ret(b, i, opcode, imm):
+    b.regs[PC, i] = (b.regs[PC, i] & 0xF000) | (b.regs[TEMP, i] & 0x0FFF)
+    b.regs[TEMP, i] = 0
+
+
+def v_retc(b, i, opcode, imm):
+    temp = b.regs[TEMP, i]
+    b.regs[PC, i] = (b.regs[PC, i] & 0xF000) | (temp & 0x0FFF)
+    b.regs[CF, i] = (temp >> 12) & 1
+    b.regs[TEMP, i] = 0
+
+
+def v_from_pa(b, i, opcode, imm):
+    b.regs[ACC, i] = b.regs[PA, i] & 0xF
+
+
+def v_inc(b, i, opcode, imm):
+    b.regs[ACC, i] = (b.regs[ACC, i] + 1) & 0xF
+
+
+def v_from_ioa(b, i, opcode, imm):
+    b.regs[ACC, i] = b.regs[IOA, i] & 0xF
+
+
+def v_timer_start(b, i, opcode, imm):
+    # cycles[i] is still the start of the instruction here
+    ticks = b.regs[TIMER, i] & 0xFF
+    ticks = np.where(ticks == 0, 256, ticks)
+    b.timer_due[i] = b.cycles[i] + 1 + ticks * parta2.TIMER_PRESCALE
+    b.regs[TRUN, i] = 1
+
+
+def v_timer_end(b, i, opcode, imm):
+    b.timer_due[i] = NO_TIMER
+    b.regs[TRUN, i] = 0
+
+
+def v_from_timerl(b, i, opcode, imm):
+    b.regs[ACC, i] = b.regs[TIMER, i] & 0x0F
+
+
+def v_from_timerh(b, i, opcode, imm):
+    b.regs[ACC, i] = (b.regs[TIMER, i] >> 4) & 0x0F
+
+
+def v_to_timerl(b, i, opcode, imm):
+    b.regs[TIMER, i] = (b.regs[TIMER, i] & 0xF0) | (b.regs[ACC, i] & 0x0F)
+
+
+def v_to_timerh(b, i, opcode, imm):
+    b.regs[TIMER, i] = ((b.regs[ACC, i] & 0x0F) << 4) | (b.regs[TIMER, i] & 0x0F)
+
+
+def v_timer_imm(b, i, opcode, imm):
+    b.regs[TIMER, i] = imm
+
+
+def v_to_pc(b, i, opcode, imm):
+    b.regs[PC, i] = b.regs[ACC, i]
+
+
+def v_nop(b, i, opcode, imm):
+    pass
+
+
+def v_dec(b, i, opcode, imm):
+    b.regs[ACC, i] = (b.regs[ACC, i] - 1) & 0xF
+
+
+def v_add_imm(b, i, opcode, imm):
+    b.regs[ACC, i] = (b.regs[ACC, i] + (imm & 0x0F)) & 0xF
+
+
+def v_sub_imm(b, i, opcode, imm):
+    diff = b.regs[ACC, i] - (imm & 0x0F)
+    b.regs[CF, i] = diff < 0
+    b.regs[ACC, i] = diff & 0xF
+
+
+def v_and_imm(b, i, opcode, imm):
+    b.regs[ACC, i] = b.regs[ACC, i] & (imm & 0x0F)
+
+
+def v_xor_imm(b, i, opcode, imm):
+    b.regs[ACC, i] = b.regs[ACC, i] ^ (imm & 0x0F)
+
+
+def v_or_imm(b, i, opcode, imm):
+    b.regs[ACC, i] = b.regs[ACC, i] | (imm & 0x0F)
+
+
+def v_call(b, i, opcode, imm):
+    b.regs[TEMP, i] = b.regs[PC, i] + 2
+    b.regs[PC, i] = imm
+
+
+def v_reti(b, i, opcode, imm):
+    b.regs[PC, i] = b.regs[TEMP, i]
+    b.regs[TEMP, i] = 0
+
+
+def v_acc_imm(b, i, opcode, imm):
+    b.regs[ACC, i] = ARG[opcode]
+
+
+def v_beqz(b, i, opcode, imm):
+    b.regs[PC, i] = np.where(b.regs[ACC, i] == 0, imm, b.regs[PC, i])
+
+
+def v_b_timer(b, i, opcode, imm):
+    b.regs[PC, i] = np.where(b.regs[TRUN, i] != 0, imm, b.regs[PC, i])
+
+
+def v_b(b, i, opcode, imm):
+    b.regs[PC, i] = imm
+
+
+def v_load_pair(b, i, opcode, imm):
+    # rarb / rcrd; one kind per opcode, so the whole group shares a pair
+    first, second, _ = DECODE_TABLE[int(opcode[0])][0].pair
+    b.regs[first, i] = opcode & 0x0F
+    b.regs[second, i] = imm & 0x0F
+
+
+def v_unknown(b, i, opcode, imm):
+    b.halted[i] = True
+    b.error[i] = opcode
+
+
+VECTOR_OPS = {
+    parta2.op_rot_r: v_rot_r,
+    parta2.op_rot_l: v_rot_l,
+    parta2.op_rot_rc: v_rot_rc,
+    parta2.op_rot_lc: v_rot_lc,
+    parta2.op_from_mem: v_from_mem,
+    parta2.op_to_mem: v_to_mem,
+    parta2.op_addc_mba: v_addc_mba,
+    parta2.op_add_mba: v_add_mba,
+    parta2.op_subc_mba: v_subc_mba,
+    parta2.op_sub_mba: v_sub_mba,
+    parta2.op_inc_mem: v_inc_mem,
+    parta2.op_dec_mem: v_dec_mem,
+    parta2.op_inc_reg: v_inc_reg,
+    parta2.op_dec_reg: v_dec_reg,
+    parta2.op_to_reg: v_to_reg,
+    parta2.op_from_reg: v_from_reg,
+    parta2.op_clr_cf: v_clr_cf,
+    parta2.op_set_cf: v_set_cf,
+    parta2.op_ret: v_ret,
+    parta2.op_retc: v_retc,
+    parta2.op_from_pa: v_from_pa,
+    parta2.op_inc: v_inc,
+    parta2.op_from_ioa: v_from_ioa,
+    parta2.op_timer_start: v_timer_start,
+    parta2.op_timer_end: v_timer_end,
+    parta2.op_from_timerl: v_from_timerl,
+    parta2.op_from_timerh: v_from_timerh,
+    parta2.op_to_timerl: v_to_timerl,
+    parta2.op_to_timerh: v_to_timerh,
+    parta2.op_to_pc: v_to_pc,
+    parta2.op_nop: v_nop,
+    parta2.op_dec: v_dec,
+    parta2.op_add_imm: v_add_imm,
+    parta2.op_sub_imm: v_sub_imm,
+    parta2.op_and_imm: v_and_imm,
+    parta2.op_xor_imm: v_xor_imm,
+    parta2.op_or_imm: v_or_imm,
+    parta2.op_timer_imm: v_timer_imm,
+    parta2.op_call: v_call,
+    parta2.op_reti: v_reti,
+    parta2.op_acc_imm: v_acc_imm,
+    parta2.op_beqz: v_beqz,
+    parta2.op_b_timer: v_b_timer,
+    parta2.op_b: v_b,
+    parta2.op_unknown: v_unknown,
+}
+
+for _op in parta2.RARB_OPS + parta2.RCRD_OPS:
+    VECTOR_OPS[_op] = v_load_pair
+
+KIND_OPS = [VECTOR_OPS[handler] for handler in KIND_HANDLERS]
+
+
+class BatchEmulator:
+    # N Arch242 machines stepped in lockstep. Memory is an N x 256 array and
+    # each register is a row of regs (regs[ACC] holds every instance's ACC).
+    # Instances run independently: each has its own PC, cycle count, timer
+    # and halt state, so they diverge freely on branches. timer_due is the
+    # cycle each instance's timer runs out; it is checked before every step,
+    # as Arch242CPU fires its events.
+    def __init__(self, n, program=None):
+        self.n = n
+        self.memory = np.zeros((n, MEM_SIZE), dtype=np.uint8)
+        self.regs = np.zeros((NUM_REGS, n), dtype=np.int32)
+        self.cycles = np.zeros(n, dtype=np.int64)
+        self.timer_due = np.full(n, NO_TIMER, dtype=np.int64)
+        self.halted = np.zeros(n, dtype=bool)
+        self.error = np.full(n, NO_ERROR, dtype=np.int32)
+        if program is not None:
+            self.load_program(program)
+
+    def load_program(self, program):
+        # same program into every instance
+        self.memory[:, :len(program)] = np.frombuffer(bytes(program), dtype=np.uint8)
+
+    def set_instance(self, k, cpu):
+        # copy an Arch242CPU's state into instance k
+        self.memory[k] = np.frombuffer(bytes(cpu.memory), dtype=np.uint8)
+        self.regs[:, k] = list(cpu.regs)
+        self.cycles[k] = cpu.cycles
+        due = [cycle for cycle, kind in cpu.events.pending() if kind == parta2.EVENT_TIMER]
+        self.timer_due[k] = due[0] if due else NO_TIMER
+        self.halted[k] = False
+        self.error[k] = NO_ERROR
+
+    def get_instance(self, k):
+        # instance k as a standalone Arch242CPU
+        cpu = parta2.Arch242CPU(bytes(self.memory[k]))
+        for reg in range(NUM_REGS):
+            cpu.regs[reg] = int(self.regs[reg, k])
+        cpu.cycles = int(self.cycles[k])
+        if self.timer_due[k] != NO_TIMER:
+            cpu.schedule(int(self.timer_due[k]), parta2.EVENT_TIMER)
+        return cpu
+
+    def step(self, active=None):
+        # execute one instruction on every running instance (or the given
+        # boolean mask of them); returns how many were stepped
+        running = ~self.halted if active is None else active & ~self.halted
+        idx = np.flatnonzero(running)
+        if idx.size == 0:
+            return 0
+
+        expired = idx[self.timer_due[idx] <= self.cycles[idx]]
+        if expired.size:
+            self.regs[TRUN, expired] = 0
+            self.timer_due[expired] = NO_TIMER
+
+        pc = self.regs[PC, idx]
+        out_of_range = pc >= MEM_SIZE
+        if out_of_range.any():
+            bad = idx[out_of_range]
+            self.halted[bad] = True
+            self.error[bad] = FETCH_OUT_OF_RANGE
+            idx = idx[~out_of_range]
+            pc = pc[~out_of_range]
+
+        opcode = self.memory[idx, pc].astype(np.int32)
+        length = LENGTH[opcode]
+        imm = self.memory[idx, (pc + 1) & 0xFF].astype(np.int32)
+        self.regs[PC, idx] = (pc + length) & 0xFF
+
+        kinds = KIND[opcode]
+        for kind in np.unique(kinds):
+            sel = kinds == kind
+            KIND_OPS[kind](self, idx[sel], opcode[sel], imm[sel])
+
+        ok = ~self.halted[idx]
+        self.cycles[idx[ok]] += length[ok]
+        return idx.size
+
+    def run(self, max_cycles):
+        # like Arch242CPU.run on every instance: each keeps stepping while
+        # its own cycle count is below its start + max_cycles
+        end = self.cycles + max_cycles
+        steps = 0
+        while True:
+            active = self.cycles < end
+            if not (active & ~self.halted).any():
+                return steps
+            self.step(active)
+            steps += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many Arch-242 instances in lockstep")
+    parser.add_argument('program', help="machine code (.bin) to load into every instance")
+    parser.add_argument('--instances', type=int, default=4096)
+    parser.add_argument('--cycles', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0,
+                        help="seed for the random IOA/PA inputs given to each instance")
+    args = parser.parse_args()
+
+    with open(args.program, "rb") as f:
+        program = f.read()
+
+    batch = BatchEmulator(args.instances, program)
+    rng = np.random.default_rng(args.seed)
+    batch.regs[IOA] = rng.integers(0, 16, args.instances)
+    batch.regs[PA] = rng.integers(0, 4, args.instances)
+
+    start = time.perf_counter()
+    batch.run(args.cycles)
+    elapsed = time.perf_counter() - start
+
+    total = int(batch.cycles.sum())
+    print(f"instances: {args.instances}, cycles: {total} in {elapsed:.3f}s "
+          f"({total / elapsed:,.0f} cycles/s)")
+    print(f"halted: {int(batch.halted.sum())}, distinct final PCs: {len(np.unique(batch.regs[PC]))}")
+
+
+if __name__ == '__main__':
+    main()
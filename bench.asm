@@ -0,0 +1,31 @@
+; === Benchmark workload ===
+; Tight loop touching registers, memory, ALU and both branch types.
+; Only uses instructions the emulator implements, so it runs forever.
+
+    acc 0x0A
+    to-reg r0
+    acc 0x0B
+    to-reg r1       ; MEM[RB:RA] = 0xBA
+
+loop:
+    from-mba
+    inc
+    to-mba
+    add-mba
+    sub 1
+    rot-l
+    rot-rc
+    inc*-reg r2
+    from-reg r2
+    xor 5
+    or 2
+    and 7
+    to-reg r3
+    from-reg r3
+    beqz skip
+    dec
+skip:
+    clr-cf
+    from-reg r2
+    beqz loop
+    b loop
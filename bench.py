@@ -0,0 +1,50 @@
+import sys
+import time
+
+import parta1
+import parta2
+
+
+def load_workload(asm_file):
+    with open(asm_file, 'r') as f:
+        return list(parta1.assemble_source(f.read()))
+
+
+def measure(program, execute_name, instructions):
+    emu = parta2.Arch242CPU(program)
+    fetch = emu.fetch
+    execute = getattr(emu, execute_name)
+    start = time.perf_counter()
+    for _ in range(instructions):
+        execute(fetch())
+    elapsed = time.perf_counter() - start
+    return instructions / elapsed
+
+
+def measure_run(program, cycles, **options):
+    # cycles/s of the headless run() loop
+    cpu = parta2.Arch242CPU(program, **options)
+    start = time.perf_counter()
+    cpu.run(cycles)
+    return cpu.cycles / (time.perf_counter() - start)
+
+
+def main():
+    asm_file = sys.argv[1] if len(sys.argv) > 1 else 'bench.asm'
+    instructions = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    program = load_workload(asm_file)
+
+    before = measure(program, 'execute_reference', instructions)
+    after = measure(program, 'execute', instructions)
+
+    print(f"workload: {asm_file} ({len(program)} bytes), {instructions} instructions")
+    print(f"  if/elif chain : {before:12,.0f} instr/s")
+    print(f"  decode table  : {after:12,.0f} instr/s")
+    print(f"  speedup       : {after / before:.2f}x")
+    print(f"  run(), interp : {measure_run(program, instructions, use_blocks=False):12,.0f} cycles/s")
+    print(f"  run(), blocks : {measure_run(program, instructions, use_jit=False):12,.0f} cycles/s")
+    print(f"  run(), JIT    : {measure_run(program, instructions):12,.0f} cycles/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import mmap
+import argparse
+
+import numpy as np
+
+import parta2
+from parta2 import EXEC_HEADER, EXEC_RECORD, EXEC_MAGIC, EXEC_VERSION, EXEC_NO_WRITE
+from profiler import Symbols
+
+# Mirrors parta2.EXEC_RECORD field for field
+RECORD_DTYPE = np.dtype([
+    ('cycle', '<u8'), ('pc', '<u2'), ('opcode', 'u1'), ('operand', 'u1'), ('length', 'u1'),
+    ('acc', 'u1'), ('cf', 'u1'), ('ra', 'u1'), ('rb', 'u1'), ('rc', 'u1'), ('rd', 'u1'),
+    ('re', 'u1'), ('pa', 'u1'), ('ioa', 'u1'), ('temp', '<u2'),
+    ('write_addr', '<u2'), ('write_value', 'u1'), ('pad', 'V5'),
+])
+assert RECORD_DTYPE.itemsize == EXEC_RECORD.size
+
+
+class ExecTrace:
+    # A trace file mapped into memory; records is a structured array view
+    # of the file, so nothing is read until a query touches it.
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count, dropped = EXEC_HEADER.unpack_from(self.map)
+        if magic != EXEC_MAGIC or version != EXEC_VERSION or record_size != EXEC_RECORD.size:
+            raise ValueError(f"{path}: not an Arch-242 execution trace (version {EXEC_VERSION})")
+        self.dropped = dropped
+        self.records = np.frombuffer(self.map, dtype=RECORD_DTYPE, count=count, offset=EXEC_HEADER.size)
+
+    def close(self):
+        # arrays sliced from records must be gone first, the map is shared
+        self.records = None
+        self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return len(self.records)
+
+    def writes(self):
+        return self.records[self.records['write_addr'] != EXEC_NO_WRITE]
+
+    def writes_to(self, addr):
+        return self.records[self.records['write_addr'] == addr]
+
+    def visits(self, pc):
+        return self.records[self.records['pc'] == pc]
+
+    def opcode_histogram(self):
+        return np.bincount(self.records['opcode'], minlength=256)
+
+
+def format_record(record, symbols):
+    line = (f"{int(record['cycle']):10}  [{int(record['pc']):02X}] op {int(record['opcode']):02X}"
+            f"  ACC={int(record['acc']):X} CF={int(record['cf'])} RA={int(record['ra']):X} "
+            f"RB={int(record['rb']):X} RC={int(record['rc']):X} RD={int(record['rd']):X}")
+    if record['write_addr'] != EXEC_NO_WRITE:
+        line += f"  MEM[{int(record['write_addr']):02X}]={int(record['write_value']):X}"
+    return f"{line}  {symbols.line(int(record['pc']))}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query an Arch-242 execution trace (parta2.py --exec-trace)")
+    parser.add_argument('trace', help="trace file")
+    parser.add_argument('-s', '--symbols', help="symbol map from `parta1.py -s`, for labels and source lines")
+    parser.add_argument('--writes', metavar='ADDR', help="every memory write to ADDR (number or label)")
+    parser.add_argument('--visits', metavar='ADDR', help="every instruction executed at ADDR (number or label)")
+    parser.add_argument('--limit', type=int, default=20, help="records to print per query")
+    args = parser.parse_args()
+
+    symbols = Symbols.load(args.symbols)
+    trace = ExecTrace(args.trace)
+    records = trace.records
+    print(f"{len(trace)} records, cycles {int(records['cycle'][0]) if len(trace) else 0}"
+          f"..{int(records['cycle'][-1]) if len(trace) else 0}, {trace.dropped} dropped")
+
+    queries = []
+    if args.writes:
+        queries.append((f"writes to {args.writes}", trace.writes_to(symbols.address(args.writes))))
+    if args.visits:
+        queries.append((f"visits to {args.visits}", trace.visits(symbols.address(args.visits))))
+    if not queries:
+        histogram = trace.opcode_histogram()
+        print("opcodes:")
+        for opcode in np.argsort(-histogram)[:10]:
+            if histogram[opcode]:
+                name = parta2.DECODE_TABLE[opcode][0].__name__[3:]
+                print(f"  {int(histogram[opcode]):10}  0x{int(opcode):02X} {name}")
+    for title, found in queries:
+        print(f"{title}: {len(found)}")
+        for record in found[:args.limit]:
+            print("  " + format_record(record, symbols))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import parta2
+
+KEY_NAMES = ('up', 'down', 'left', 'right', 'reset')
+
+
+def load_input_trace(path):
+    # Input trace: one line per run of frames, "<count> [key ...]", e.g.
+    #   30 right
+    #   10 up
+    #   5
+    # holds right for 30 frames, up for 10, then nothing for 5. '#' starts a
+    # comment. Returns a list of per-frame key sets.
+    frames = []
+    with open(path, 'r') as f:
+        for lineno, line in enumerate(f, 1):
+            tokens = line.split('#')[0].split()
+            if not tokens:
+                continue
+            try:
+                count = int(tokens[0])
+            except ValueError:
+                raise ValueError(f"{path}:{lineno}: expected a frame count, got {tokens[0]!r}")
+            keys = frozenset(token.lower() for token in tokens[1:])
+            unknown = keys - set(KEY_NAMES)
+            if unknown:
+                raise ValueError(f"{path}:{lineno}: unknown key(s) {', '.join(sorted(unknown))}")
+            frames.extend([keys] * count)
+    return frames
+
+
+def run_job(job):
+    # Runs in a worker process. job: dict with binary, seed, trace (path or
+    # None), cycles and optionally id / instructions_per_frame.
+    start = time.perf_counter()
+    with open(job['binary'], 'rb') as f:
+        program = f.read()
+    trace = load_input_trace(job['trace']) if job.get('trace') else []
+
+    emu = parta2.Arch242Emulator(program, seed=job.get('seed'),
+                                 instructions_per_frame=job.get('instructions_per_frame', 10))
+    budget = job['cycles']
+    error = None
+    try:
+        while emu.cycles < budget:
+            keys = trace[emu.frame_count] if emu.frame_count < len(trace) else ()
+            emu.frame(keys)
+    except (ValueError, IndexError) as e:
+        error = str(e)
+
+    return {
+        'id': job.get('id'),
+        'binary': job['binary'],
+        'seed': job.get('seed'),
+        'trace': job.get('trace'),
+        'budget': budget,
+        'cycles': emu.cycles,
+        'frames': emu.frame_count,
+        'score': emu.score,
+        'game_over': emu.game_over,
+        'halted': error is not None,
+        'error': error,
+        'pc': emu.regs[parta2.PC],
+        'memory_digest': hashlib.sha256(emu.memory).hexdigest(),
+        'elapsed': round(time.perf_counter() - start, 6),
+    }
+
+
+def parse_seeds(spec):
+    # "7", "0-99" or "1,5,9"
+    seeds = []
+    for part in spec.split(','):
+        if '-' in part:
+            lo, hi = part.split('-', 1)
+            seeds.extend(range(int(lo), int(hi) + 1))
+        else:
+            seeds.append(int(part))
+    return seeds
+
+
+def load_jobs(args):
+    if args.jobs:
+        with open(args.jobs, 'r') as f:
+            jobs = [json.loads(line) for line in f if line.strip()]
+        for job in jobs:
+            job.setdefault('cycles', args.cycles)
+    else:
+        traces = args.traces or [None]
+        jobs = [{'binary': binary, 'seed': seed, 'trace': trace, 'cycles': args.cycles}
+                for binary, seed, trace in itertools.product(args.binaries, parse_seeds(args.seeds), traces)]
+    for i, job in enumerate(jobs):
+        job.setdefault('id', i)
+        # a frame of 0 instructions never advances the cycle count, so the
+        # job would never reach its budget
+        per_frame = job.get('instructions_per_frame', 10)
+        if not isinstance(per_frame, int) or per_frame < 1:
+            raise ValueError(f"job {job['id']}: instructions_per_frame must be a positive integer, "
+                             f"got {per_frame!r}")
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run many headless Arch-242 jobs across all cores, streaming JSON lines")
+    parser.add_argument('binaries', nargs='*', help="machine code (.bin) files")
+    parser.add_argument('--jobs', help="JSON-lines file of jobs (binary, seed, trace, cycles) instead of a grid")
+    parser.add_argument('--seeds', default='0', help="RNG seeds for the grid, e.g. 0-99 or 1,5,9")
+    parser.add_argument('--traces', nargs='*', help="input trace files for the grid")
+    parser.add_argument('--cycles', type=int, default=100000, help="cycle budget per job")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-o', '--output', help="write results here instead of stdout")
+    args = parser.parse_args()
+
+    if not args.jobs and not args.binaries:
+        parser.error("give binaries for a job grid or --jobs FILE")
+
+    try:
+        jobs = load_jobs(args)
+    except (ValueError, OSError) as e:
+        print(e)
+        sys.exit(1)
+    out = open(args.output, 'w') if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(run_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:  # bad binary path, malformed trace...
+                    job = futures[future]
+                    result = {'id': job.get('id'), 'binary': job.get('binary'), 'failed': str(e)}
+                out.write(json.dumps(result) + '\n')
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"[fleet] {len(jobs)} jobs in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
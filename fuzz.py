@@ -0,0 +1,484 @@
+import sys
+import json
+import time
+import random
+import argparse
+
+import parta1
+import parta2
+from parta2 import ACC, CF, PC, TEMP, PA, TIMER, TRUN, MEM_SIZE, NUM_REGS, DECODE_TABLE
+
+# === Differential opcode fuzzer ===
+# Random instruction sequences are encoded with parta1.py's tables and run
+# from a random initial state on the reference if/elif decoder
+# (execute_reference) and on each fast engine for the same cycle budget.
+# The whole machine state, the cycle count and how the run ended must be
+# identical. A failing case is shrunk (cycle budget, instructions, initial
+# state) before it is reported.
+
+
+def supported(code):
+    return DECODE_TABLE[code[0]][0] is not parta2.op_unknown
+
+
+def encodable():
+    # (mnemonic, operand kind) for everything parta1.encode accepts
+    forms = [(name, None) for name in parta1.instruction_set]
+    forms += [(name, 'reg') for name in parta1.reg_ops]
+    forms += [(name, 'imm') for name in parta1.imm_ops]
+    forms += [(name, 'reg-imm') for name in parta1.imm_ops if name != 'timer']
+    forms += [('acc', 'imm'), ('rarb', 'byte'), ('rcrd', 'byte')]
+    forms += [(name, 'target') for name in parta1.branch_ops]
+    return forms
+
+
+def sample_tokens(name, kind):
+    if kind in ('reg', 'reg-imm'):
+        return [name, random.choice(list(parta1.regs))]
+    if kind == 'imm':
+        return [name, str(random.randrange(16))]
+    if kind == 'byte':
+        return [name, hex(random.randrange(256))]
+    if kind == 'target':
+        return [name, '0'] if name != 'b-bit' else [name, str(random.randrange(4)), '0']
+    return [name]
+
+
+FORMS = encodable()
+SUPPORTED_FORMS = [form for form in FORMS if supported(parta1.encode(sample_tokens(*form)))]
+UNSUPPORTED_FORMS = [form for form in FORMS if form not in SUPPORTED_FORMS]
+
+# opcodes the decoder implements that no parta1 mnemonic produces (call is
+# 0x4C here but 0xF0 in parta1); emitted as raw bytes
+ASSEMBLED = set()
+for _name, _kind in FORMS:
+    for _ in range(16):
+        ASSEMBLED.add(parta1.encode(sample_tokens(_name, _kind))[0])
+RAW_OPCODES = [op for op in range(256)
+               if DECODE_TABLE[op][0] is not parta2.op_unknown and op not in ASSEMBLED]
+
+
+class Op:
+    # One generated instruction: parta1 tokens, or a raw opcode. target is
+    # the index of the instruction a branch goes to, so the program can be
+    # re-laid out after instructions are removed.
+    __slots__ = ('tokens', 'raw', 'target')
+
+    def __init__(self, tokens=None, raw=None, target=None):
+        self.tokens = tokens
+        self.raw = raw
+        self.target = target
+
+    def encode(self, address):
+        if self.raw is not None:
+            opcode, operand = self.raw
+            if DECODE_TABLE[opcode][2] == 2:
+                return [opcode, address if self.target is not None else operand]
+            return [opcode]
+        tokens = list(self.tokens)
+        if self.target is not None:
+            tokens[-1] = str(address)
+        return parta1.encode(tokens)
+
+    def text(self, label):
+        if self.raw is not None:
+            opcode, operand = self.raw
+            name = DECODE_TABLE[opcode][0].__name__[3:]
+            if DECODE_TABLE[opcode][2] == 2:
+                return f"; raw {opcode:#04x} {label if self.target is not None else hex(operand)} ({name})"
+            return f"; raw {opcode:#04x} ({name})"
+        tokens = list(self.tokens)
+        if self.target is not None:
+            tokens[-1] = label
+        return ' '.join(tokens)
+
+
+class Case:
+    # ops laid out from address 0 over a random memory image, plus the
+    # initial registers and the cycle budget
+    def __init__(self, ops, memory, regs, budget):
+        self.ops = ops
+        self.memory = memory      # bytes, MEM_SIZE
+        self.regs = regs          # list, NUM_REGS
+        self.budget = budget
+
+    def layout(self):
+        # (code, addresses): every op is sized first, branch targets are
+        # then filled in (the size never depends on the target)
+        addresses = []
+        address = 0
+        for op in self.ops:
+            addresses.append(address)
+            address += len(op.encode(0))
+        addresses.append(address)
+        code = bytearray()
+        for op in self.ops:
+            target = addresses[op.target] & 0xFF if op.target is not None else 0
+            code.extend(op.encode(target))
+        return bytes(code[:MEM_SIZE]), addresses
+
+    def state(self):
+        code, _ = self.layout()
+        memory = code + self.memory[len(code):]
+        regs = b''.join(value.to_bytes(2, 'little') for value in self.regs)
+        return memory + regs
+
+    def source(self):
+        _, addresses = self.layout()
+        targets = {op.target for op in self.ops if op.target is not None}
+        lines = []
+        for i, op in enumerate(self.ops + [None]):
+            if i in targets:
+                lines.append(f"L{i}:")
+            if op is not None:
+                lines.append(f"    {op.text(f'L{op.target}')}")
+        return '\n'.join(lines)
+
+    def without(self, drop):
+        # a copy with the ops at the indices in drop removed; branches to a
+        # removed op go to the next one kept
+        keep = [i for i in range(len(self.ops)) if i not in drop]
+        new_index = {}
+        for new, old in enumerate(keep):
+            new_index[old] = new
+        def remap(target):
+            while target < len(self.ops) and target not in new_index:
+                target += 1
+            return new_index.get(target, len(keep))
+        ops = []
+        for i in keep:
+            op = self.ops[i]
+            target = remap(op.target) if op.target is not None else None
+            ops.append(Op(op.tokens, op.raw, target))
+        return Case(ops, self.memory, self.regs, self.budget)
+
+    def with_state(self, memory=None, regs=None, budget=None):
+        return Case(self.ops, self.memory if memory is None else memory,
+                    self.regs if regs is None else regs, self.budget if budget is None else budget)
+
+    def to_dict(self):
+        return {'code': self.state()[:MEM_SIZE].hex(), 'regs': self.regs,
+                'budget': self.budget, 'source': self.source()}
+
+
+NIBBLES = bytes(value & 0xF for value in range(256))
+
+
+def random_op(length, unknown_rate, raw_rate):
+    roll = random.random()
+    if roll < raw_rate and RAW_OPCODES:
+        opcode = random.choice(RAW_OPCODES)
+        branch = DECODE_TABLE[opcode][0] in (parta2.op_call, parta2.op_b, parta2.op_beqz)
+        return Op(raw=(opcode, random.randrange(256)),
+                  target=random.randrange(length + 1) if branch else None)
+    forms = UNSUPPORTED_FORMS if roll < raw_rate + unknown_rate else SUPPORTED_FORMS
+    name, kind = random.choice(forms)
+    target = random.randrange(length + 1) if kind == 'target' else None
+    return Op(sample_tokens(name, kind), target=target)
+
+
+def random_case(length, budget, unknown_rate=0.02, raw_rate=0.08):
+    ops = [random_op(length, unknown_rate, raw_rate) for _ in range(length)]
+    memory = random.getrandbits(8 * MEM_SIZE).to_bytes(MEM_SIZE, 'little').translate(NIBBLES)
+    regs = [random.randrange(16) for _ in range(NUM_REGS)]
+    regs[CF] = random.randrange(2)
+    regs[PC] = 0
+    # usually a return address inside memory, sometimes anything
+    regs[TEMP] = random.randrange(0x10000) if random.random() < 0.1 else random.randrange(MEM_SIZE)
+    regs[PA] = random.randrange(4)
+    # short enough to run out inside a case once a timer-start runs
+    regs[TIMER] = random.choice((1, 2, 3, random.randrange(256)))
+    regs[TRUN] = random.randrange(2)
+    return Case(ops, memory, regs, budget)
+
+
+# === Engines ===
+# Each runs one initial state for a cycle budget and returns
+# (state bytes, cycles, error) where error is the exception type that
+# stopped the run, or None.
+
+class ReferenceCPU(parta2.Arch242CPU):
+    # execute_reference, with a cycle per byte fetched like step(), and
+    # coverage: opcode -> set of edge cases seen (see edge_flags)
+    def __init__(self):
+        super().__init__(use_blocks=False)
+        self.coverage = {}
+
+    def fetch_next_byte(self):
+        self.fetched += 1
+        return parta2.Arch242CPU.fetch_next_byte(self)
+
+    def run(self, max_cycles):
+        r = self.regs
+        end = self.cycles + max_cycles
+        while self.cycles < end:
+            fired = self.cycles >= self.next_event
+            if fired:
+                self.fire_events()
+            pc, acc, cf = r[PC], r[ACC], r[CF]
+            opcode = self.memory[pc] if pc < MEM_SIZE else None
+            self.fetched = 1
+            try:
+                self.execute_reference(self.fetch())
+            except (ValueError, IndexError):
+                if opcode is not None:
+                    self.coverage.setdefault(opcode, set()).add('error')
+                raise
+            self.cycles += self.fetched
+            flags = self.coverage.setdefault(opcode, set())
+            flags.update(edge_flags(opcode, pc, acc, cf, r))
+            if fired:
+                flags.add('after event')
+
+
+def edge_flags(opcode, pc, acc, cf, r):
+    flags = ['cf=1 in' if cf else 'cf=0 in']
+    if r[CF] != cf:
+        flags.append('cf changed')
+    if r[ACC] == 0:
+        flags.append('acc=0 out')
+    if (acc, r[ACC]) in ((0xF, 0), (0, 0xF)):
+        flags.append('acc wrapped')
+    length = DECODE_TABLE[opcode][2]
+    if DECODE_TABLE[opcode][0] in parta2.BRANCH_HANDLERS:
+        flags.append('taken' if r[PC] != (pc + length) & 0xFF else 'not taken')
+    elif pc + length > 0xFF:
+        flags.append('pc wrapped')
+    return flags
+
+
+def run_cpu(cpu, state, budget):
+    cpu.restore(state)
+    cpu.cycles = 0
+    try:
+        cpu.run(budget)
+        error = None
+    except (ValueError, IndexError) as e:
+        error = type(e).__name__
+    return bytes(cpu.state), cpu.cycles, error
+
+
+def cpu_engine(cpu):
+    def run(states, budget):
+        return [run_cpu(cpu, state, budget) for state in states]
+    return run
+
+
+def batch_engine(states, budget):
+    # every case as one instance of a BatchEmulator (NumPy)
+    import numpy as np
+    import batch
+    emu = batch.BatchEmulator(len(states))
+    for k, state in enumerate(states):
+        emu.memory[k] = np.frombuffer(state[:MEM_SIZE], dtype=np.uint8)
+        emu.regs[:, k] = np.frombuffer(state[MEM_SIZE:], dtype='<u2')
+    emu.run(budget)
+    results = []
+    for k in range(len(states)):
+        error = int(emu.error[k])
+        if error == batch.NO_ERROR:
+            error = None
+        else:
+            error = 'IndexError' if error == batch.FETCH_OUT_OF_RANGE else 'ValueError'
+        regs = b''.join(int(value).to_bytes(2, 'little') for value in emu.regs[:, k])
+        results.append((emu.memory[k].tobytes() + regs, int(emu.cycles[k]), error))
+    return results
+
+
+ENGINES = {
+    'table': lambda: cpu_engine(parta2.Arch242CPU(use_blocks=False)),
+    'blocks': lambda: cpu_engine(parta2.Arch242CPU(use_jit=False)),
+    'jit': lambda: cpu_engine(parta2.Arch242CPU(jit_threshold=2)),
+    'batch': lambda: batch_engine,
+}
+
+
+# === Checking and shrinking ===
+
+def describe(want, got):
+    # field-by-field differences between two results
+    out = []
+    (want_state, want_cycles, want_error), (got_state, got_cycles, got_error) = want, got
+    if want_error != got_error:
+        out.append(f"ended: reference {want_error or 'ok'}, engine {got_error or 'ok'}")
+    if want_cycles != got_cycles:
+        out.append(f"cycles: reference {want_cycles}, engine {got_cycles}")
+    for addr in range(MEM_SIZE):
+        if want_state[addr] != got_state[addr]:
+            out.append(f"MEM[{addr:02X}]: reference {want_state[addr]:X}, engine {got_state[addr]:X}")
+    for name, reg in parta2.REG_INDEX.items():
+        offset = MEM_SIZE + 2 * reg
+        want_value = int.from_bytes(want_state[offset:offset + 2], 'little')
+        got_value = int.from_bytes(got_state[offset:offset + 2], 'little')
+        if want_value != got_value:
+            out.append(f"{name}: reference {want_value:X}, engine {got_value:X}")
+    return out
+
+
+class Checker:
+    def __init__(self, engine_names):
+        self.reference = ReferenceCPU()
+        self.engines = {name: ENGINES[name]() for name in engine_names}
+
+    def run(self, cases):
+        # list of (case, engine name, reference result, engine result)
+        failures = []
+        budget_groups = {}
+        for case in cases:
+            budget_groups.setdefault(case.budget, []).append(case)
+        for budget, group in budget_groups.items():
+            states = [case.state() for case in group]
+            want = [run_cpu(self.reference, state, budget) for state in states]
+            for name, engine in self.engines.items():
+                for case, expected, result in zip(group, want, engine(states, budget)):
+                    if result != expected:
+                        failures.append((case, name, expected, result))
+        return failures
+
+    def fails(self, case, engine):
+        state = case.state()
+        return run_cpu(self.reference, state, case.budget) != self.engines[engine]([state], case.budget)[0]
+
+    def shrink(self, case, engine):
+        # smallest budget, then fewest ops, then simplest initial state;
+        # repeated until nothing more can be taken away
+        fails = lambda candidate: self.fails(candidate, engine)
+        while True:
+            before = (case.budget, len(case.ops), case.regs, case.memory)
+            low, high = 1, case.budget
+            while low < high:
+                middle = (low + high) // 2
+                if fails(case.with_state(budget=middle)):
+                    high = middle
+                else:
+                    low = middle + 1
+            case = case.with_state(budget=high)
+
+            chunk = max(1, len(case.ops) // 2)
+            while chunk >= 1:
+                start = 0
+                while start < len(case.ops):
+                    candidate = case.without(set(range(start, start + chunk)))
+                    if fails(candidate):
+                        case = candidate
+                    else:
+                        start += chunk
+                chunk //= 2
+
+            for reg in range(NUM_REGS):
+                if reg != PC and case.regs[reg]:
+                    regs = list(case.regs)
+                    regs[reg] = 0
+                    if fails(case.with_state(regs=regs)):
+                        case = case.with_state(regs=regs)
+            chunk = MEM_SIZE
+            while chunk >= 1:
+                for start in range(0, MEM_SIZE, chunk):
+                    memory = bytearray(case.memory)
+                    if any(memory[start:start + chunk]):
+                        memory[start:start + chunk] = bytes(len(memory[start:start + chunk]))
+                        if fails(case.with_state(memory=bytes(memory))):
+                            case = case.with_state(memory=bytes(memory))
+                chunk //= 4
+            if (case.budget, len(case.ops), case.regs, case.memory) == before:
+                return case
+
+
+def format_failure(case, engine, want, got):
+    code, _ = case.layout()
+    out = [f"engine {engine} differs from execute_reference, {case.budget} cycles:"]
+    out += ['  ' + line for line in describe(want, got)]
+    out.append("  program:")
+    out += ['    ' + line for line in case.source().splitlines()]
+    out.append(f"  code: {code.hex() or '(none, runs from memory)'}")
+    regs = ' '.join(f"{name}={case.regs[reg]:X}" for name, reg in parta2.REG_INDEX.items()
+                    if case.regs[reg])
+    out.append(f"  registers: {regs or 'all 0'}")
+    data = [f"{addr:02X}={value:X}" for addr, value in enumerate(case.memory)
+            if value and addr >= len(code)]
+    out.append(f"  memory: {' '.join(data) or 'all 0'}")
+    return '\n'.join(out)
+
+
+def format_coverage(coverage):
+    flags = ['cf=0 in', 'cf=1 in', 'cf changed', 'acc=0 out', 'acc wrapped', 'taken', 'not taken',
+             'pc wrapped', 'after event', 'error']
+    known = [op for op in range(256) if DECODE_TABLE[op][0] is not parta2.op_unknown]
+    hit = [op for op in known if op in coverage]
+    out = [f"opcodes covered: {len(hit)}/{len(known)} decoded, "
+           f"{sum(1 for op in coverage if op not in known)} unknown"]
+    missing = [op for op in known if op not in coverage]
+    if missing:
+        out.append("  never run: " + ' '.join(f"{op:02X}" for op in missing))
+    by_handler = {}
+    for op, seen in coverage.items():
+        by_handler.setdefault(DECODE_TABLE[op][0].__name__[3:], set()).update(seen)
+    for name in sorted(by_handler):
+        seen = by_handler[name]
+        out.append(f"  {name:11} " + ', '.join(flag for flag in flags if flag in seen))
+    return '\n'.join(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential fuzzer: fast engines against execute_reference")
+    parser.add_argument('--cases', type=int, default=10000, help="random cases to run")
+    parser.add_argument('--seed', type=int, default=None, help="random seed (printed if not given)")
+    parser.add_argument('--length', type=int, default=16, help="instructions per case")
+    parser.add_argument('--budget', type=int, default=64, help="cycles per case")
+    parser.add_argument('--batch-size', type=int, default=1000, help="cases generated and run together")
+    parser.add_argument('--engines', default='table,blocks,jit,batch',
+                        help=f"comma-separated, from {', '.join(ENGINES)} (batch needs NumPy)")
+    parser.add_argument('--max-failures', type=int, default=3, help="stop after this many shrunk failures")
+    parser.add_argument('--save', metavar='FILE', help="append shrunk failures to FILE as JSON lines")
+    parser.add_argument('--coverage', action='store_true', help="print per-opcode edge case coverage")
+    args = parser.parse_args()
+
+    names = [name for name in args.engines.split(',') if name]
+    unknown = [name for name in names if name not in ENGINES]
+    if unknown:
+        print(f"Unknown engine: {', '.join(unknown)}")
+        sys.exit(1)
+    seed = args.seed if args.seed is not None else random.randrange(1 << 32)
+    random.seed(seed)
+    checker = Checker(names)
+
+    failures = []
+    seen = set()
+    done = 0
+    start = time.perf_counter()
+    while done < args.cases and len(failures) < args.max_failures:
+        count = min(args.batch_size, args.cases - done)
+        cases = [random_case(args.length, args.budget) for _ in range(count)]
+        for case, engine, _, _ in checker.run(cases):
+            if len(failures) >= args.max_failures:
+                break
+            small = checker.shrink(case, engine)
+            key = (engine, small.state())
+            if key in seen:
+                continue
+            seen.add(key)
+            state = small.state()
+            want = run_cpu(checker.reference, state, small.budget)
+            got = checker.engines[engine]([state], small.budget)[0]
+            failures.append((small, engine, want, got))
+        done += count
+    elapsed = time.perf_counter() - start
+
+    print(f"seed {seed}: {done} cases x {len(names)} engines in {elapsed:.2f}s "
+          f"({done / elapsed:,.0f} cases/s), {len(failures)} failures")
+    for small, engine, want, got in failures:
+        print()
+        print(format_failure(small, engine, want, got))
+    if args.save and failures:
+        with open(args.save, 'a') as f:
+            for small, engine, _, _ in failures:
+                f.write(json.dumps(dict(small.to_dict(), engine=engine)) + '\n')
+    if args.coverage:
+        print()
+        print(format_coverage(checker.reference.coverage))
+    if failures:
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+import parta1
+
+CACHE_DIR = '.arch242cache'
+ADDRESS_SPACE = 256
+HARVARD_ADDRESS_SPACE = 2048    # parta2.ROM_SIZE (parta2 imports this module)
+
+
+def assembler_fingerprint():
+    # the cache must miss when the assembler itself changes
+    with open(parta1.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def cache_key(text):
+    # sha256 of the source text and of parta1.py
+    return hashlib.sha256((assembler_fingerprint() + '\0' + text).encode()).hexdigest()
+
+
+def cached_object(path, cache_dir=CACHE_DIR, stats=None):
+    # Assemble path to an object, reusing a previous result keyed by
+    # cache_key().
+    with open(path, 'r') as f:
+        text = f.read()
+    entry = os.path.join(cache_dir, cache_key(text) + '.o')
+    if os.path.exists(entry):
+        if stats is not None:
+            stats['hits'] += 1
+        obj = parta1.read_object(entry)
+        obj['name'] = path
+        return obj
+    if stats is not None:
+        stats['misses'] += 1
+    obj = parta1.assemble_object(text, name=path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = entry + '.tmp'
+    parta1.write_object(tmp, obj)
+    os.replace(tmp, entry)
+    return obj
+
+
+def cached_image(path, cache_dir=CACHE_DIR):
+    # Assemble a standalone .asm to machine code through the same cache.
+    # Returns (code, labels, starts, hit); the labels and instruction start
+    # addresses let a hot reload keep PC on the same instruction.
+    with open(path, 'r') as f:
+        text = f.read()
+    entry = os.path.join(cache_dir, cache_key(text) + '.img')
+    if os.path.exists(entry):
+        with open(entry, 'r') as f:
+            image = json.load(f)
+        if 'starts' in image:       # entries written before starts are rebuilt
+            return bytes.fromhex(image['code']), image['labels'], set(image['starts']), True
+    asm = parta1.assemble_program(text)
+    starts = sorted({addr for addr, _, _ in asm.lines})
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = entry + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'code': asm.code.hex(), 'labels': asm.labels, 'starts': starts}, f)
+    os.replace(tmp, entry)
+    return bytes(asm.code), asm.labels, set(starts), False
+
+
+def load_input(path, cache_dir=CACHE_DIR, stats=None):
+    # .asm sources go through the cache, anything else is an object file
+    if path.endswith('.asm'):
+        return cached_object(path, cache_dir, stats)
+    return parta1.read_object(path)
+
+
+def link(objects, harvard=False):
+    # Lay the objects out back to back from address 0 and patch every
+    # relocation. Returns (code, symbols) with symbols the global map.
+    # harvard: the image goes to the 2 KiB ROM instead of shared memory.
+    bases = []
+    symbols = {}
+    address = 0
+    for obj in objects:
+        bases.append(address)
+        for name in obj['globals']:
+            if name in symbols:
+                raise ValueError(f"Duplicate global symbol: {name} ({obj['name']})")
+            symbols[name] = address + obj['labels'][name]
+        address += len(obj['code']) // 2
+    space = HARVARD_ADDRESS_SPACE if harvard else ADDRESS_SPACE
+    if address > space:
+        raise ValueError(f"Linked program is {address} bytes, the address space is {space}"
+                         f"{'' if harvard else ' (try --harvard)'}")
+
+    code = bytearray()
+    for obj, base in zip(objects, bases):
+        code.extend(bytes.fromhex(obj['code']))
+    for obj, base in zip(objects, bases):
+        for reloc in obj['relocations']:
+            label = reloc['symbol']
+            if label in obj['labels']:
+                target = base + obj['labels'][label]
+            elif label in symbols:
+                target = symbols[label]
+            else:
+                raise ValueError(f"{obj['name']}: unresolved symbol {label}")
+            offset = base + reloc['offset']
+            patched = parta1.relocate(reloc['tokens'], reloc['operand'], target)
+            code[offset:offset + len(patched)] = patched
+    return code, symbols
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arch-242 linker")
+    parser.add_argument('inputs', nargs='+', help=".asm sources or object files from parta1.py -c, in layout order")
+    parser.add_argument('-o', '--output', required=True, help="machine code to write (.bin)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="where assembled objects are cached")
+    parser.add_argument('-m', '--map', action='store_true', help="print the global symbol map")
+    parser.add_argument('--harvard', action='store_true',
+                        help="link for Harvard mode: up to 2 KiB of ROM instead of 256 bytes")
+    args = parser.parse_args()
+
+    stats = {'hits': 0, 'misses': 0}
+    try:
+        objects = [load_input(path, args.cache_dir, stats) for path in args.inputs]
+        code, symbols = link(objects, args.harvard)
+    except (ValueError, OSError) as e:
+        print(e)
+        sys.exit(1)
+    with open(args.output, 'wb') as f:
+        f.write(code)
+    if args.map:
+        for name, address in sorted(symbols.items(), key=lambda item: item[1]):
+            print(f"{address:02X}  {name}")
+    print(f"[link] {args.output}: {len(code)} bytes from {len(objects)} inputs "
+          f"(cache: {stats['hits']} hit, {stats['misses']} assembled)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
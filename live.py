@@ -0,0 +1,337 @@
+import sys
+import time
+import struct
+import asyncio
+import argparse
+from multiprocessing import shared_memory, resource_tracker
+
+import parta2
+from parta2 import DISPLAY_ROWS, DISPLAY_COLS, IOA, PA, KEY_BITS, key_mask, mask_keys
+
+# === Shared memory ===
+# A running headless emulator publishes its display rows, PA, IOA and
+# frame counter in a named shared memory block, and reads its
+# inputs back from the same block once per frame. Other processes attach by
+# name and read the rows in place. Frames are published under a sequence
+# lock: the count is odd while a frame is being written, so a reader that
+# sees the same even count before and after reading has a whole frame.
+# Each row is a 16-bit column mask (display_row: columns 0-7 from
+# 0x80-0x93, 8-9 from the 0x94-0x98 bank).
+
+SHARE_MAGIC = b'A24S'
+SHARE_VERSION = 2
+SHARE_HEADER = struct.Struct('<4sB3xIQ')   # magic, version, sequence, frame
+SHARE_ROWS = SHARE_HEADER.size
+SHARE_PA = SHARE_ROWS + 2 * DISPLAY_ROWS    # outputs, after each frame
+SHARE_IOA = SHARE_PA + 1
+SHARE_STATUS = SHARE_PA + 2                 # STATUS_*
+SHARE_KEYS_IN = SHARE_PA + 3                # inputs: held keys as a KEY_BITS mask
+SHARE_IOA_IN = SHARE_PA + 4                 # and the value for the IOA port
+SHARE_SIZE = SHARE_PA + 8
+SEQUENCE_OFFSET = 8
+FRAME_OFFSET = 12
+
+STATUS_RUNNING = 0
+STATUS_HALTED = 1
+
+DEFAULT_NAME = 'arch242'
+
+
+class SharedFrame:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+        # zero-copy view of the display rows, one 16-bit mask per row
+        self.rows = self.buf[SHARE_ROWS:SHARE_PA].cast('H')
+
+    @classmethod
+    def create(cls, name=DEFAULT_NAME):
+        shm = shared_memory.SharedMemory(name=name, create=True, size=SHARE_SIZE)
+        SHARE_HEADER.pack_into(shm.buf, 0, SHARE_MAGIC, SHARE_VERSION, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=DEFAULT_NAME):
+        shm = shared_memory.SharedMemory(name=name)
+        # Before Python 3.13 every process that opens a segment registers
+        # it, and its resource tracker unlinks it on exit, under the server
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        magic, version, _, _ = SHARE_HEADER.unpack_from(shm.buf)
+        if magic != SHARE_MAGIC or version != SHARE_VERSION:
+            shm.close()
+            raise ValueError(f"{name}: not an Arch-242 shared frame (version {SHARE_VERSION})")
+        return cls(shm, owner=False)
+
+    def close(self):
+        self.rows.release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # --- written by the emulator ---
+
+    def publish(self, frame, rows, pa, ioa, status):
+        buf = self.buf
+        sequence = struct.unpack_from('<I', buf, SEQUENCE_OFFSET)[0]
+        struct.pack_into('<I', buf, SEQUENCE_OFFSET, (sequence + 1) & 0xFFFFFFFF)
+        for y, value in enumerate(rows):
+            self.rows[y] = value
+        buf[SHARE_PA] = pa
+        buf[SHARE_IOA] = ioa
+        buf[SHARE_STATUS] = status
+        struct.pack_into('<Q', buf, FRAME_OFFSET, frame)
+        struct.pack_into('<I', buf, SEQUENCE_OFFSET, (sequence + 2) & 0xFFFFFFFF)
+
+    def inputs(self):
+        # (held keys, IOA value) as last written by a controller
+        return mask_keys(self.buf[SHARE_KEYS_IN]), self.buf[SHARE_IOA_IN] & 0xF
+
+    # --- used by viewers and controllers ---
+
+    @property
+    def frame(self):
+        return struct.unpack_from('<Q', self.buf, FRAME_OFFSET)[0]
+
+    def read(self):
+        # a consistent (frame, rows, pa, ioa, status) snapshot
+        buf = self.buf
+        while True:
+            before = struct.unpack_from('<I', buf, SEQUENCE_OFFSET)[0]
+            if before & 1:
+                continue
+            snapshot = (struct.unpack_from('<Q', buf, FRAME_OFFSET)[0], tuple(self.rows),
+                        buf[SHARE_PA], buf[SHARE_IOA], buf[SHARE_STATUS])
+            if struct.unpack_from('<I', buf, SEQUENCE_OFFSET)[0] == before:
+                return snapshot
+
+    def set_keys(self, keys):
+        self.buf[SHARE_KEYS_IN] = key_mask(keys)
+
+    def set_ioa(self, value):
+        self.buf[SHARE_IOA_IN] = value & 0xF
+
+
+# === Frame stream ===
+# Each message is FRAME_MESSAGE followed by count ROW_ENTRY (row, value)
+# pairs, the value a 16-bit column mask.
+# A keyframe lists every row; a delta lists the rows that changed since the
+# previous frame. A viewer gets a keyframe when it connects, and again if it
+# fell so far behind that its queue was dropped, so a slow viewer never
+# holds up the emulator or the other viewers.
+
+FRAME_MESSAGE = struct.Struct('<BQBBBB')   # kind, frame, status, pa, ioa, row count
+ROW_ENTRY = struct.Struct('<BH')
+KEYFRAME = 1
+DELTA = 2
+FRAME_QUEUE = 64    # messages buffered per viewer
+
+
+def encode_frame(kind, frame, rows, pa, ioa, status, previous=None):
+    changed = [(row, value) for row, value in enumerate(rows)
+               if previous is None or previous[row] != value]
+    out = bytearray(FRAME_MESSAGE.pack(kind, frame, status, pa, ioa, len(changed)))
+    for row, value in changed:
+        out += ROW_ENTRY.pack(row, value)
+    return bytes(out)
+
+
+async def read_frame(reader):
+    # (kind, frame, status, pa, ioa, [(row, value), ...]) for the next message
+    header = await reader.readexactly(FRAME_MESSAGE.size)
+    kind, frame, status, pa, ioa, count = FRAME_MESSAGE.unpack(header)
+    pairs = await reader.readexactly(ROW_ENTRY.size * count)
+    return kind, frame, status, pa, ioa, list(ROW_ENTRY.iter_unpack(pairs))
+
+
+class FrameServer:
+    def __init__(self, queue_frames=FRAME_QUEUE):
+        self.queue_frames = queue_frames
+        self.clients = set()
+        self.server = None
+        self.current = (0, (0,) * DISPLAY_ROWS, 0, 0, STATUS_RUNNING)
+        self.resyncs = 0    # times a viewer's queue was dropped for a keyframe
+
+    async def start(self, host, port):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def keyframe(self):
+        frame, rows, pa, ioa, status = self.current
+        return encode_frame(KEYFRAME, frame, rows, pa, ioa, status)
+
+    async def handle(self, reader, writer):
+        queue = asyncio.Queue(self.queue_frames)
+        queue.put_nowait(self.keyframe())
+        self.clients.add(queue)
+        try:
+            while True:
+                writer.write(await queue.get())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(queue)
+            writer.close()
+
+    def publish(self, frame, rows, pa, ioa, status):
+        previous = self.current
+        self.current = (frame, rows, pa, ioa, status)
+        if previous[1:] == self.current[1:]:
+            return      # nothing for a viewer to draw
+        delta = encode_frame(DELTA, frame, rows, pa, ioa, status, previous[1])
+        for queue in self.clients:
+            if queue.full():
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.keyframe())
+                self.resyncs += 1
+            else:
+                queue.put_nowait(delta)
+
+
+# === Running ===
+
+async def serve(emu, share, server, fps=30, frames=None):
+    # run emu frame by frame at fps (0: as fast as possible), taking inputs
+    # from share and publishing to share and server. Returns the halt
+    # message, or None if the frame budget ran out.
+    loop = asyncio.get_running_loop()
+    period = 1 / fps if fps else 0
+    deadline = loop.time()
+    while frames is None or emu.frame_count < frames:
+        keys, ioa = share.inputs()
+        emu.regs[IOA] = ioa
+        error = None
+        try:
+            emu.frame(keys)
+        except (ValueError, IndexError) as e:
+            error = str(e)
+        rows = tuple(parta2.display_row(emu.memory, y) for y in range(DISPLAY_ROWS))
+        status = STATUS_HALTED if error else STATUS_RUNNING
+        regs = emu.regs
+        share.publish(emu.frame_count, rows, regs[PA] & 0xF, regs[IOA] & 0xF, status)
+        server.publish(emu.frame_count, rows, regs[PA] & 0xF, regs[IOA] & 0xF, status)
+        if error:
+            return error
+        deadline += period
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+    return None
+
+
+def format_rows(rows):
+    # bit x of a row lights column x
+    return '\n'.join(''.join('#' if value >> x & 1 else '.' for x in range(DISPLAY_COLS))
+                     for value in rows)
+
+
+async def view(host, port, frames=None, out=sys.stdout):
+    reader, writer = await asyncio.open_connection(host, port)
+    rows = [0] * DISPLAY_ROWS
+    seen = 0
+    clear = '\x1b[H\x1b[2J' if out.isatty() else ''
+    try:
+        while frames is None or seen < frames:
+            kind, frame, status, pa, ioa, changed = await read_frame(reader)
+            for row, value in changed:
+                rows[row] = value
+            seen += 1
+            state = 'halted' if status == STATUS_HALTED else 'running'
+            print(f"{clear}frame {frame} ({state}) PA={pa:X} IOA={ioa:X} "
+                  f"{'keyframe' if kind == KEYFRAME else f'{len(changed)} rows changed'}", file=out)
+            print(format_rows(rows), file=out, flush=True)
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Share a headless Arch-242 emulator with other processes")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('serve', help="run a program, publish frames to shared memory and a socket")
+    run.add_argument('program', help="machine code (.bin) or assembly source (.asm) to load")
+    run.add_argument('--name', default=DEFAULT_NAME, help="shared memory block name")
+    run.add_argument('--host', default='127.0.0.1')
+    run.add_argument('--port', type=int, default=4242, help="frame stream port (0 picks one)")
+    run.add_argument('--fps', type=float, default=30, help="frames per second, 0 for as fast as possible")
+    run.add_argument('--frames', type=int, default=None, help="stop after this many frames")
+    run.add_argument('--seed', type=int, default=None, help="food RNG seed")
+    run.add_argument('--harvard', action='store_true', help="separate instruction ROM (see parta2.py)")
+    watch = commands.add_parser('view', help="print the frames streamed by a server")
+    watch.add_argument('--host', default='127.0.0.1')
+    watch.add_argument('--port', type=int, default=4242)
+    watch.add_argument('--frames', type=int, default=None, help="stop after this many messages")
+    press = commands.add_parser('keys', help="set the keys held on a running server")
+    press.add_argument('keys', nargs='*', help=f"keys to hold ({', '.join(KEY_BITS)}), none to release")
+    press.add_argument('--name', default=DEFAULT_NAME)
+    press.add_argument('--ioa', type=int, default=None, help="also set the IOA port")
+    args = parser.parse_args()
+
+    if args.command == 'view':
+        try:
+            asyncio.run(view(args.host, args.port, args.frames))
+        except (OSError, KeyboardInterrupt) as e:
+            if isinstance(e, OSError):
+                print(e)
+                sys.exit(1)
+        return
+
+    if args.command == 'keys':
+        unknown = [key for key in args.keys if key not in KEY_BITS]
+        if unknown:
+            parser.error(f"unknown key {unknown[0]!r}, expected one of {', '.join(KEY_BITS)}")
+        try:
+            share = SharedFrame.attach(args.name)
+        except (ValueError, OSError) as e:
+            print(e)
+            sys.exit(1)
+        share.set_keys(args.keys)
+        if args.ioa is not None:
+            share.set_ioa(args.ioa)
+        share.close()
+        return
+
+    try:
+        program, _ = parta2.load_program_file(args.program)
+        emu = parta2.Arch242Emulator(program, seed=args.seed, harvard=args.harvard)
+        share = SharedFrame.create(args.name)
+    except FileExistsError:
+        print(f"Shared memory {args.name!r} already exists; pick another --name")
+        sys.exit(1)
+    except (ValueError, OSError) as e:
+        print(e)
+        sys.exit(1)
+
+    async def run_server():
+        server = FrameServer()
+        port = await server.start(args.host, args.port)
+        print(f"serving {args.program}: shared memory {args.name!r}, frames on {args.host}:{port}", flush=True)
+        try:
+            return await serve(emu, share, server, fps=args.fps, frames=args.frames), server
+        finally:
+            await server.close()
+
+    start = time.perf_counter()
+    error = server = None
+    try:
+        error, server = asyncio.run(run_server())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        share.close()
+    elapsed = time.perf_counter() - start
+    status = f"halted: {error}" if error else "ok"
+    print(f"status: {status}")
+    print(f"frames: {emu.frame_count} cycles: {emu.cycles} in {elapsed:.3f}s"
+          + (f", {server.resyncs} viewer resyncs" if server else ""))
+
+
+if __name__ == '__main__':
+    main()
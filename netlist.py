@@ -0,0 +1,809 @@
+import re
+import sys
+import argparse
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+import parta2
+
+# === Netlist simulator for partb.circ ===
+# The Logisim file is parsed into circuits, every subcircuit instance is
+# flattened into one netlist, and the combinational cells are sorted into
+# evaluation order and compiled into a single Python function (the same
+# trick as parta2.compile_block). Registers and the data RAM are the only
+# state; one call to step() is one clock, which in this CPU is one whole
+# instruction.
+#
+# Logisim stores no pin coordinates, only each component's anchor and
+# attributes, so port positions are recomputed below for every component
+# kind partb.circ uses (facing east, then rotated). check() reports any
+# port that lands on nothing, which is how the table was validated.
+
+TOP_CIRCUIT = 'main'
+IGNORED = {'Text', 'Probe', 'LED'}
+WIRING = {'Tunnel', 'Pin'}
+
+
+def parse_point(text):
+    x, y = text.strip('()').split(',')
+    return int(x), int(y)
+
+
+class Component:
+    def __init__(self, kind, loc, attrs):
+        self.kind = kind
+        self.loc = loc
+        self.attrs = attrs
+
+    def attr(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def int_attr(self, name, default):
+        return int(self.attrs.get(name, default), 0)
+
+    def width(self):
+        return self.int_attr('width', '1')
+
+    @property
+    def label(self):
+        return self.attrs.get('label', '')
+
+    def __repr__(self):
+        return f"{self.kind}{self.loc}" + (f" '{self.label}'" if self.label else '')
+
+
+class Circuit:
+    def __init__(self, name, components, wires):
+        self.name = name
+        self.components = components
+        self.wires = wires
+
+    def pins(self):
+        return [comp for comp in self.components if comp.kind == 'Pin']
+
+
+def load_circuits(path):
+    root = ET.parse(path).getroot()
+    circuits = {}
+    for node in root.iter('circuit'):
+        components = []
+        for comp in node.findall('comp'):
+            attrs = {a.get('name'): a.get('val', a.text) for a in comp.findall('a')}
+            components.append(Component(comp.get('name'), parse_point(comp.get('loc')), attrs))
+        wires = [(parse_point(w.get('from')), parse_point(w.get('to'))) for w in node.findall('wire')]
+        circuits[node.get('name')] = Circuit(node.get('name'), components, wires)
+    return circuits
+
+
+# === Port geometry ===
+# Offsets are for a component facing east; place() turns them the way
+# Logisim's Location.translate(facing, dx, dy) does.
+
+def place(comp, dx, dy, facing=None):
+    facing = facing or comp.attr('facing', 'east')
+    x, y = comp.loc
+    if facing == 'west':
+        return (x - dx, y - dy)
+    if facing == 'north':
+        return (x + dy, y - dx)
+    if facing == 'south':
+        return (x - dy, y + dx)
+    return (x + dx, y + dy)
+
+
+def gate_input_offset(size, inputs, index):
+    # AbstractGate.getInputOffset: inputs fan out around the output's axis
+    if inputs <= 3:
+        if size < 40:
+            start, step, gap = -5, 10, 10
+        elif size < 60 or inputs <= 2:
+            start, step, gap = -10, 20, 20
+        else:
+            start, step, gap = -15, 30, 30
+    elif inputs == 4 and size >= 60:
+        start, step, gap = -5, 20, 0
+    else:
+        start, step, gap = -5, 10, 10
+    if inputs % 2:
+        return start * (inputs - 1) + step * index
+    dy = start * inputs + step * index
+    return dy + gap if index >= inputs // 2 else dy
+
+
+def splitter_ends(comp):
+    # end i of bit b is bit_end[b]; absent bitN attributes mean end N
+    incoming = comp.int_attr('incoming', '2')
+    fanout = comp.int_attr('fanout', '2')
+    bit_end = []
+    for bit in range(incoming):
+        value = comp.attr(f'bit{bit}', str(bit))
+        bit_end.append(None if value == 'none' else int(value))
+    return incoming, fanout, bit_end
+
+
+def mux_inputs(comp):
+    return 1 << comp.int_attr('select', '1')
+
+
+def subcircuit_sides(circuit):
+    # logisim_evolution appearance: inputs down the west edge and outputs
+    # down the east edge, each in (y, x) order of the pins inside
+    pins = sorted(circuit.pins(), key=lambda pin: (pin.loc[1], pin.loc[0]))
+    inputs = [pin for pin in pins if pin.attr('output') != 'true']
+    outputs = [pin for pin in pins if pin.attr('output') == 'true']
+    return inputs, outputs
+
+
+def component_ports(comp, circuits, width=0):
+    # [(name, point, direction)] with direction 'in' or 'out'
+    kind = comp.kind
+    at = lambda dx, dy: place(comp, dx, dy)
+    if kind == 'Tunnel':
+        return [('io', comp.loc, 'io')]
+    if kind in ('Constant', 'Clock'):
+        return [('out', comp.loc, 'out')]
+    if kind == 'Pin':
+        return [('io', comp.loc, 'out' if comp.attr('output') != 'true' else 'in')]
+    if kind in ('AND Gate', 'OR Gate', 'XOR Gate', 'NAND Gate', 'NOR Gate', 'XNOR Gate'):
+        size = comp.int_attr('size', '50')
+        inputs = comp.int_attr('inputs', '2')
+        # the XOR family's extra curve pushes its inputs out by 10
+        depth = size + 10 if kind.startswith('X') else size
+        ports = [(f'in{i}', at(-depth, gate_input_offset(size, inputs, i)), 'in') for i in range(inputs)]
+        return ports + [('out', comp.loc, 'out')]
+    if kind == 'NOT Gate':
+        size = 20 if comp.attr('size') == '20' else 30
+        return [('in', at(-size, 0), 'in'), ('out', comp.loc, 'out')]
+    if kind == 'Controlled Buffer':
+        control = -10 if comp.attr('control') == 'left' else 10
+        return [('in', at(-20, 0), 'in'), ('control', at(-10, control), 'in'), ('out', comp.loc, 'out')]
+    if kind == 'Splitter':
+        # ends run top to bottom (left to right) from end 0 whichever way
+        # the splitter faces, so west and south are not plain rotations
+        incoming, fanout, bit_end = splitter_ends(comp)
+        flipped = comp.attr('facing', 'east') in ('west', 'south')
+        offsets = [(20, 10 * (i + 1) - 10 * fanout - 10) if not flipped else (20, -10 * (i + 1))
+                   for i in range(fanout)]
+        ports = [('combined', comp.loc, 'io')]
+        return ports + [(f'end{i}', at(dx, dy), 'io') for i, (dx, dy) in enumerate(offsets)]
+    if kind == 'Multiplexer':
+        inputs = mux_inputs(comp)
+        if inputs == 2:
+            ports = [('in0', at(-30, -10), 'in'), ('in1', at(-30, 10), 'in'),
+                     ('select', at(-20, 20), 'in')]
+            enable = at(-10, 15)
+        else:
+            half = inputs // 2
+            ports = [(f'in{i}', at(-40, 10 * (i - half)), 'in') for i in range(inputs)]
+            ports.append(('select', at(-20, 10 * half), 'in'))
+            enable = at(-10, 10 * half - 5)
+        if comp.attr('enable') == 'true':
+            ports.append(('enable', enable, 'in'))
+        return ports + [('out', comp.loc, 'out')]
+    if kind == 'Decoder':
+        # the anchor is the select input on the bottom edge
+        outputs = mux_inputs(comp)
+        if outputs == 2:
+            ports = [('out0', at(10, -30), 'out'), ('out1', at(10, -10), 'out')]
+        else:
+            ports = [(f'out{i}', at(20, 10 * (i - outputs)), 'out') for i in range(outputs)]
+        return ports + [('select', comp.loc, 'in'), ('enable', at(-10, 0), 'in')]
+    if kind == 'Priority Encoder':
+        inputs = 1 << comp.int_attr('select', '3')
+        half = inputs // 2
+        ports = [(f'in{i}', at(-40, 10 * (i - half + 1)), 'in') for i in range(inputs)]
+        return ports + [('out', comp.loc, 'out'), ('enable_in', at(-20, 10 * half + 10), 'in'),
+                        ('enable_out', at(-20, -10 * half), 'out'), ('group', at(0, 10), 'out')]
+    if kind in ('Adder', 'Subtractor'):
+        return [('a', at(-40, -10), 'in'), ('b', at(-40, 10), 'in'), ('carry_in', at(-20, -20), 'in'),
+                ('out', comp.loc, 'out'), ('carry_out', at(-20, 20), 'out')]
+    if kind == 'Comparator':
+        return [('a', at(-40, -10), 'in'), ('b', at(-40, 10), 'in'), ('gt', at(0, -10), 'out'),
+                ('eq', comp.loc, 'out'), ('lt', at(0, 10), 'out')]
+    if kind == 'Bit Extender':
+        return [('in', at(-40, 0), 'in'), ('out', comp.loc, 'out')]
+    if kind == 'Register':
+        return [('d', at(0, 30), 'in'), ('enable', at(0, 50), 'in'), ('clock', at(0, 70), 'in'),
+                ('clear', at(30, 90), 'in'), ('q', at(60, 30), 'out')]
+    if kind == 'ROM':
+        return [('addr', at(0, 10), 'in'), ('data', at(240, 60), 'out')]
+    if kind == 'RAM':
+        return [('addr', at(0, 10), 'in'), ('store', at(0, 50), 'in'), ('load', at(0, 60), 'in'),
+                ('clock', at(0, 70), 'in'), ('data_in', at(0, 90), 'in'), ('data', at(240, 90), 'out')]
+    if kind in circuits:
+        # the anchor is the first output; the box width is not in the file
+        # (Logisim sizes it from the label text), see subcircuit_width()
+        inputs, outputs = subcircuit_sides(circuits[kind])
+        ports = [(pin, at(-width, 20 * i), 'in') for i, pin in enumerate(inputs)]
+        return ports + [(pin, at(0, 20 * i), 'out') for i, pin in enumerate(outputs)]
+    raise ValueError(f"No port geometry for {kind}")
+
+
+def circuit_points(circuit, circuits):
+    # every point something in the circuit touches, subcircuits aside
+    points = set()
+    for a, b in circuit.wires:
+        points.update((a, b))
+    for comp in circuit.components:
+        if comp.kind not in IGNORED and comp.kind not in circuits:
+            points.update(point for _, point, _ in component_ports(comp, circuits))
+    return points
+
+
+def subcircuit_width(comp, circuits, points):
+    # the width that lands the most input ports on something
+    inputs, _ = subcircuit_sides(circuits[comp.kind])
+    hits = lambda width: sum(place(comp, -width, 20 * i) in points for i in range(len(inputs)))
+    return max(range(10, 1010, 10), key=hits)
+
+
+def check(circuits):
+    # ports that touch no wire and no other port, per circuit; expected for
+    # unused outputs and inputs Logisim leaves floating, suspicious elsewhere
+    report = []
+    for circuit in circuits.values():
+        points = circuit_points(circuit, circuits)
+        touches = defaultdict(int)
+        for a, b in circuit.wires:
+            touches[a] += 1
+            touches[b] += 1
+        ports = []
+        probes = set()
+        for comp in circuit.components:
+            if comp.kind in IGNORED:
+                probes.add(comp.loc)
+                continue
+            width = subcircuit_width(comp, circuits, points) if comp.kind in circuits else 0
+            for name, point, _ in component_ports(comp, circuits, width):
+                ports.append((comp, name, point))
+                touches[point] += 1
+        port_points = {point for _, _, point in ports}
+        for comp, name, point in ports:
+            if touches[point] < 2:
+                name = name.label if isinstance(name, Component) else name
+                report.append(f"{circuit.name}: {comp} port {name} at {point} is unconnected")
+        for point, count in sorted(touches.items()):
+            if count == 1 and point not in port_points and point not in probes:
+                report.append(f"{circuit.name}: wire end at {point} touches nothing")
+    return report
+
+
+# === Flattening ===
+# Nets are found with a union-find over (instance path, point) keys: wire
+# ends, same-label tunnels, and a subcircuit's pins joined to the ports of
+# the instance that uses it. What is left is a flat list of cells, each
+# with its ports mapped to net numbers.
+
+class Cell:
+    def __init__(self, comp, path, ports):
+        self.comp = comp
+        self.kind = comp.kind
+        self.path = path
+        self.ports = ports          # name -> net
+        self.directions = {}        # name -> 'in' / 'out' / 'io'
+        self.mode = None            # splitters: 'split' or 'merge'
+
+    @property
+    def name(self):
+        return f"{self.path}/{self.comp.label or self.comp.kind}{self.comp.loc}"
+
+    def __repr__(self):
+        return self.name
+
+
+class Netlist:
+    def __init__(self, circuits, top=TOP_CIRCUIT):
+        if top not in circuits:
+            raise ValueError(f"No circuit named {top}")
+        self.circuits = circuits
+        self.parent = {}
+        pending = []
+        self.signals = {}           # 'path/label' of every pin and tunnel -> key
+        self.instantiate(top, top, pending)
+
+        numbers = {}
+        for cell, ports in pending:
+            for name, key in ports.items():
+                root = self.find(key)
+                cell.ports[name] = numbers.setdefault(root, len(numbers))
+        self.cells = [cell for cell, _ in pending]
+        # signals nothing drives or reads get no number
+        self.signals = {name: numbers[self.find(key)] for name, key in self.signals.items()
+                        if self.find(key) in numbers}
+        self.net_count = len(numbers)
+        self.parent = None
+
+    def find(self, key):
+        parent = self.parent
+        parent.setdefault(key, key)
+        root = key
+        while parent[root] != root:
+            root = parent[root]
+        while parent[key] != root:
+            parent[key], key = root, parent[key]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[a] = b
+
+    def instantiate(self, name, path, pending):
+        # returns {pin: net key} for the circuit's pins
+        circuit = self.circuits[name]
+        points = circuit_points(circuit, self.circuits)
+        for a, b in circuit.wires:
+            self.union((path, a), (path, b))
+        pins = {}
+        for comp in circuit.components:
+            key = (path, comp.loc)
+            if comp.kind in IGNORED:
+                continue
+            if comp.kind == 'Tunnel':
+                self.union(key, (path, 'tunnel', comp.label))
+                self.signals[f"{path}/{comp.label}"] = key
+            elif comp.kind == 'Pin':
+                pins[comp] = key
+                self.signals[f"{path}/{comp.label}"] = key
+            elif comp.kind in self.circuits:
+                width = subcircuit_width(comp, self.circuits, points)
+                inner = self.instantiate(comp.kind, f"{path}/{comp.kind}{comp.loc}", pending)
+                for pin, point, _ in component_ports(comp, self.circuits, width):
+                    self.union((path, point), inner[pin])
+            else:
+                cell = Cell(comp, path, {})
+                ports = {}
+                for port, point, direction in component_ports(comp, self.circuits):
+                    ports[port] = (path, point)
+                    cell.directions[port] = direction
+                pending.append((cell, ports))
+        return pins
+
+    def find_cells(self, kind, label=None):
+        return [cell for cell in self.cells
+                if cell.kind == kind and (label is None or cell.comp.label == label)]
+
+
+# === Compiling ===
+# Splitters are bidirectional in Logisim; each one is given a direction
+# from which side is driven. Cells are then sorted so every net is written
+# before it is read, and the whole settle pass becomes one generated
+# function of (register state, clock level). Memories are plain lists and
+# bytearrays: every net is a scalar int per cycle, which Python ints do
+# faster than NumPy scalars would.
+
+STATEFUL = {'Register'}
+SINK_PORTS = {'Register': ('d', 'enable', 'clock', 'clear'), 'RAM': ('addr', 'store', 'clock', 'data_in')}
+# what a floating input reads as
+FLOATING = {'enable': 1, 'enable_in': 1}
+
+
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z_0-9]*')
+PURE_NAMES = {'int', 'if', 'else', 'and', 'or', 'not', 'bit_length'}
+
+
+def mask(width):
+    return (1 << width) - 1
+
+
+def signed(expr, width):
+    return f"({expr} - (({expr} >> {width - 1}) << {width}))"
+
+
+def splitter_bits(cell):
+    # end index -> the combined bits it carries, low bit first
+    incoming, fanout, bit_end = splitter_ends(cell.comp)
+    ends = [[] for _ in range(fanout)]
+    for bit, end in enumerate(bit_end):
+        if end is not None:
+            ends[end].append(bit)
+    return ends
+
+
+def gather(expr, bits):
+    # the listed bits of expr packed from bit 0 up
+    if bits == list(range(bits[0], bits[0] + len(bits))):
+        shifted = f"({expr} >> {bits[0]})" if bits[0] else expr
+        return f"({shifted} & {mask(len(bits))})"
+    return " | ".join(f"((({expr} >> {bit}) & 1) << {i})" for i, bit in enumerate(bits))
+
+
+def scatter(expr, bits):
+    # inverse of gather: bit i of expr goes to bits[i]
+    if bits == list(range(bits[0], bits[0] + len(bits))):
+        return f"({expr} << {bits[0]})" if bits[0] else expr
+    return " | ".join(f"((({expr} >> {i}) & 1) << {bit})" for i, bit in enumerate(bits))
+
+
+def resolve_splitters(cells):
+    # a splitter splits when its combined end is driven and merges when
+    # one of its fanned-out ends is; repeat until nothing changes
+    driven = set()
+    for cell in cells:
+        if cell.kind != 'Splitter':
+            driven.update(net for name, net in cell.ports.items() if cell.directions[name] == 'out')
+    pending = [cell for cell in cells if cell.kind == 'Splitter']
+    changed = True
+    while changed:
+        changed = False
+        for cell in pending:
+            if cell.mode:
+                continue
+            ends = [cell.ports[f'end{i}'] for i, bits in enumerate(splitter_bits(cell)) if bits]
+            if cell.ports['combined'] in driven:
+                cell.mode = 'split'
+                driven.update(ends)
+                changed = True
+            elif any(net in driven for net in ends):
+                cell.mode = 'merge'
+                driven.add(cell.ports['combined'])
+                changed = True
+    for cell in pending:
+        directions = cell.directions
+        for name in directions:
+            is_combined = name == 'combined'
+            directions[name] = 'in' if is_combined == (cell.mode == 'split') else 'out'
+    return [cell for cell in cells if cell.kind != 'Splitter' or cell.mode]
+
+
+class Compiled:
+    # the generated settle() plus the layout of its results
+    def __init__(self, netlist):
+        self.netlist = netlist
+        cells = resolve_splitters(netlist.cells)
+        self.registers = [cell for cell in cells if cell.kind == 'Register']
+        self.rams = [cell for cell in cells if cell.kind == 'RAM']
+        self.roms = [cell for cell in cells if cell.kind == 'ROM']
+        self.sinks = self.registers + self.rams
+
+        self.drivers = defaultdict(list)
+        for cell in cells:
+            for name, net in cell.ports.items():
+                if cell.directions[name] == 'out':
+                    self.drivers[net].append((cell, name))
+        self.order = self.schedule([cell for cell in cells if cell.kind not in STATEFUL])
+        sinks = [(cell, port) for cell in self.sinks for port in SINK_PORTS[cell.kind]]
+        clocks = [(cell, 'clock') for cell in self.sinks]
+        self.source = self.generate('settle_high', 1, sinks) + self.generate('clocks_low', 0, clocks)
+        self.code = compile(self.source, "<partb.circ netlist>", "exec")
+
+    def schedule(self, cells):
+        # Kahn's algorithm over nets: a cell is ready once every driver of
+        # every net it reads has run; register outputs are ready at the start
+        waiting = {}
+        readers = defaultdict(list)
+        pending = {}
+        for net, drivers in self.drivers.items():
+            pending[net] = sum(1 for cell, _ in drivers if cell.kind not in STATEFUL)
+        ready = []
+        for cell in cells:
+            inputs = {net for name, net in cell.ports.items()
+                      if cell.directions[name] == 'in' and name not in SINK_PORTS.get(cell.kind, ())
+                      and pending.get(net)}
+            if cell.kind == 'RAM':
+                inputs = {cell.ports['addr']} if pending.get(cell.ports['addr']) else set()
+            waiting[cell] = len(inputs)
+            for net in inputs:
+                readers[net].append(cell)
+            if not inputs:
+                ready.append(cell)
+        order = []
+        while ready:
+            cell = ready.pop()
+            order.append(cell)
+            for name, net in cell.ports.items():
+                if cell.directions[name] != 'out':
+                    continue
+                pending[net] -= 1
+                if pending[net] == 0:
+                    for reader in readers[net]:
+                        waiting[reader] -= 1
+                        if waiting[reader] == 0:
+                            ready.append(reader)
+        if len(order) != len(cells):
+            stuck = sorted(str(cell) for cell in cells if waiting[cell])
+            raise ValueError(f"Combinational loop through {len(stuck)} cells, e.g. {stuck[:5]}")
+        return order
+
+    def generate(self, name, clock, outputs):
+        # settle with the clock net fixed at `clock`, returning the listed
+        # sink ports. Expressions whose inputs are all constant are folded
+        # and assignments nothing reads are dropped, so the clock-low pass
+        # shrinks to the few nets that gate the clock.
+        body = []                   # (variable, expression)
+        constants = {}
+        shared = {net for net, drivers in self.drivers.items() if len(drivers) > 1}
+        parts = defaultdict(list)
+
+        def value(expr):
+            names = set(IDENTIFIER.findall(expr)) - PURE_NAMES
+            if names:
+                return None
+            return eval(expr, {'__builtins__': {}, 'int': int})
+
+        def assign(var, expr):
+            folded = value(expr)
+            if folded is not None:
+                constants[var] = folded
+            else:
+                body.append((var, expr))
+
+        def read(cell, port):
+            net = cell.ports.get(port)
+            if net is None or net not in self.drivers:
+                return str(FLOATING.get(port, 0))
+            return str(constants.get(f"n{net}", f"n{net}"))
+
+        def write(cell, port, expr):
+            net = cell.ports.get(port)
+            if net is None:
+                return
+            if net not in shared:
+                assign(f"n{net}", expr)
+                return
+            # several drivers (tri-state buffers): disabled ones drive 0
+            var = f"n{net}_{len(parts[net])}"
+            assign(var, expr)
+            parts[net].append(str(constants.get(var, var)))
+            if len(parts[net]) == len(self.drivers[net]):
+                assign(f"n{net}", " | ".join(parts[net]))
+
+        def temp(expr):
+            var = f"t{len(body)}"
+            assign(var, expr)
+            return str(constants.get(var, var))
+
+        for i, cell in enumerate(self.registers):
+            write(cell, 'q', f"st[{i}]")
+        for cell in self.order:
+            self.emit(cell, read, write, temp, clock)
+        results = [read(cell, port) for cell, port in outputs]
+
+        needed = set(IDENTIFIER.findall(" ".join(results)))
+        kept = []
+        for var, expr in reversed(body):
+            if var in needed:
+                kept.append(f"    {var} = {expr}")
+                needed.update(IDENTIFIER.findall(expr))
+        lines = [f"def {name}(st):"] + kept[::-1] + [f"    return ({', '.join(results)},)"]
+        return "\n".join(lines) + "\n"
+
+    def emit(self, cell, read, write, temp, clock):
+        comp = cell.comp
+        kind = cell.kind
+        width = comp.width()
+        m = mask(width)
+        if kind == 'Constant':
+            write(cell, 'out', str(comp.int_attr('value', '0x1') & m))
+        elif kind == 'Clock':
+            write(cell, 'out', str(clock))
+        elif kind.endswith(' Gate') and kind != 'NOT Gate':
+            inputs = [read(cell, f'in{i}') for i in range(comp.int_attr('inputs', '2'))]
+            op = {'AND': ' & ', 'NAND': ' & ', 'OR': ' | ', 'NOR': ' | ', 'XOR': ' ^ ', 'XNOR': ' ^ '}
+            expr = op[kind.split()[0]].join(inputs)
+            write(cell, 'out', f"~({expr}) & {m}" if kind[0] == 'N' or kind.startswith('XN') else expr)
+        elif kind == 'NOT Gate':
+            write(cell, 'out', f"~{read(cell, 'in')} & {m}")
+        elif kind == 'Controlled Buffer':
+            write(cell, 'out', f"{read(cell, 'in')} if {read(cell, 'control')} else 0")
+        elif kind == 'Multiplexer':
+            inputs = ", ".join(read(cell, f'in{i}') for i in range(mux_inputs(comp)))
+            expr = f"({inputs})[{read(cell, 'select')}]"
+            if 'enable' in cell.ports:
+                expr = f"{expr} if {read(cell, 'enable')} else 0"
+            write(cell, 'out', expr)
+        elif kind == 'Decoder':
+            select, enable = read(cell, 'select'), read(cell, 'enable')
+            for i in range(mux_inputs(comp)):
+                write(cell, f'out{i}', f"int({select} == {i} and {enable} != 0)")
+        elif kind == 'Priority Encoder':
+            # the highest numbered input that is set wins
+            inputs = 1 << comp.int_attr('select', '3')
+            bits = " | ".join(f"({read(cell, f'in{i}')} << {i})" for i in range(inputs))
+            var = temp(f"({bits}) if {read(cell, 'enable_in')} else 0")
+            write(cell, 'out', f"{var}.bit_length() - 1 if {var} else 0")
+            write(cell, 'enable_out', f"int({read(cell, 'enable_in')} != 0 and not {var})")
+            write(cell, 'group', f"int({var} != 0)")
+        elif kind in ('Adder', 'Subtractor'):
+            sign = '+' if kind == 'Adder' else '-'
+            a, b, carry = read(cell, 'a'), read(cell, 'b'), read(cell, 'carry_in')
+            var = temp(f"{a} {sign} {b} {sign} {carry}")
+            write(cell, 'out', f"{var} & {m}")
+            write(cell, 'carry_out', f"{var} >> {width}" if kind == 'Adder' else f"int({var} < 0)")
+        elif kind == 'Comparator':
+            a, b = read(cell, 'a'), read(cell, 'b')
+            if comp.attr('mode', 'twosComplement') != 'unsigned':
+                a, b = signed(a, width), signed(b, width)
+            for name, op in (('gt', '>'), ('eq', '=='), ('lt', '<')):
+                write(cell, name, f"int({a} {op} {b})")
+        elif kind == 'Bit Extender':
+            value = read(cell, 'in')
+            in_width = comp.int_attr('in_width', '8')
+            extra = mask(comp.int_attr('out_width', '16')) ^ mask(in_width)
+            mode = comp.attr('type', 'sign')
+            if mode == 'zero':
+                write(cell, 'out', value)
+            elif mode == 'one':
+                write(cell, 'out', f"{value} | {extra}")
+            else:
+                write(cell, 'out', f"{value} | {extra} if {value} >> {in_width - 1} else {value}")
+        elif kind == 'Splitter':
+            ends = splitter_bits(cell)
+            if cell.mode == 'split':
+                combined = read(cell, 'combined')
+                for i, bits in enumerate(ends):
+                    if bits:
+                        write(cell, f'end{i}', gather(combined, bits))
+            else:
+                parts = [scatter(read(cell, f'end{i}'), bits) for i, bits in enumerate(ends) if bits]
+                write(cell, 'combined', " | ".join(parts))
+        elif kind == 'ROM':
+            index = self.roms.index(cell)
+            addr = mask(comp.int_attr('addrWidth', '8'))
+            write(cell, 'data', f"ROM{index}[{read(cell, 'addr')} & {addr}]")
+        elif kind == 'RAM':
+            index = self.rams.index(cell)
+            write(cell, 'data', f"RAM{index}[{read(cell, 'addr')}]")
+        else:
+            raise ValueError(f"No simulation model for {kind} ({cell})")
+
+
+# === Simulation ===
+
+class NetlistCPU:
+    # One machine built from a Compiled netlist. step() is one clock: the
+    # clock inputs are read with the clock low, everything is settled with
+    # it high, then each register and memory that saw a rising edge latches.
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.state = [0] * len(compiled.registers)
+        self.masks = [mask(cell.comp.width()) for cell in compiled.registers]
+        self.ram = [[0] * (1 << cell.comp.int_attr('addrWidth', '8')) for cell in compiled.rams]
+        self.rom = [bytearray(1 << cell.comp.int_attr('addrWidth', '8')) for cell in compiled.roms]
+        namespace = {}
+        for i, memory in enumerate(self.ram):
+            namespace[f'RAM{i}'] = memory
+        for i, memory in enumerate(self.rom):
+            namespace[f'ROM{i}'] = memory
+        exec(compiled.code, namespace)
+        self.settle_high = namespace['settle_high']
+        self.clocks_low = namespace['clocks_low']
+        self.index = {cell.comp.label: i for i, cell in enumerate(compiled.registers) if cell.comp.label}
+        self.cycles = 0
+
+    def load_program(self, program):
+        # both instruction ROMs hold the whole image (instrmem reads the
+        # second byte of an instruction from the second ROM)
+        for rom in self.rom:
+            rom[:len(program)] = bytes(program)
+
+    def load_data(self, data):
+        for ram in self.ram:
+            ram[:len(data)] = [value & 0xF for value in data]
+
+    def register(self, label):
+        return self.state[self.index[label]]
+
+    def step(self):
+        # returns False when no register was clocked (clock gated off)
+        state = self.state
+        low = self.clocks_low(state)
+        high = self.settle_high(state)
+        clocked = False
+        for i in range(len(state)):
+            d, enable, clock, clear = high[4 * i:4 * i + 4]
+            if clear:
+                state[i] = 0
+            elif clock and not low[i] and enable:
+                state[i] = d & self.masks[i]
+                clocked = True
+        sink = 4 * len(state)
+        for i, ram in enumerate(self.ram):
+            addr, store, clock, data = high[sink:sink + 4]
+            if store and clock and not low[len(state) + i]:
+                ram[addr] = data
+            sink += 4
+        self.cycles += 1
+        return clocked
+
+
+# === Lockstep against the Python emulator ===
+ARCH_REGISTERS = ('PC', 'ACC', 'CF', 'TEMP', 'RA', 'RB', 'RC', 'RD', 'RE')
+
+
+def differences(cpu, emu):
+    # (field, hardware value, emulator value) for every mismatch
+    found = []
+    for name in ARCH_REGISTERS:
+        hardware = cpu.register(name)
+        if name == 'PC':
+            hardware &= 0xFF            # the emulator PC wraps at 8 bits
+        if hardware != emu.regs[parta2.REG_INDEX[name]]:
+            found.append((name, hardware, emu.regs[parta2.REG_INDEX[name]]))
+    ram = cpu.ram[0]
+    for addr in range(min(len(ram), parta2.MEM_SIZE)):
+        if ram[addr] != emu.memory[addr] & 0xF:
+            found.append((f"MEM[{addr:02X}]", ram[addr], emu.memory[addr] & 0xF))
+    return found
+
+
+def lockstep(compiled, program, steps):
+    # Run program on the netlist and on Arch242Emulator one instruction at a
+    # time. Returns a report dict; 'mismatch' is None if they never differed.
+    emu = parta2.Arch242Emulator(program)
+    cpu = NetlistCPU(compiled)
+    cpu.load_program(program)
+    cpu.load_data(emu.memory)
+    report = {'steps': 0, 'status': 'ok', 'mismatch': None}
+    for step in range(steps):
+        pc, cycle = emu.regs[parta2.PC], emu.cycles
+        if pc < len(program) and emu.memory[pc] != program[pc]:
+            # the emulator fetches from data memory, the circuit from ROM, so
+            # code overwritten by a store only changes the emulator
+            report['mismatch'] = {'step': step, 'cycle': cycle, 'pc': pc, 'opcode': program[pc],
+                                  'fields': [('INSTR', program[pc], emu.memory[pc])]}
+            break
+        try:
+            emu.step()
+        except (ValueError, IndexError) as e:
+            report['status'] = f'emulator halted: {e}'
+            break
+        if not cpu.step():
+            report['status'] = f'hardware halted at PC={cpu.register("PC"):02X}'
+            break
+        report['steps'] = step + 1
+        found = differences(cpu, emu)
+        if found:
+            report['mismatch'] = {'step': step, 'cycle': cycle, 'pc': pc, 'opcode': program[pc],
+                                  'fields': found}
+            break
+    report['clocks'] = cpu.cycles
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run partb.circ as a compiled netlist, in lockstep with parta2.py")
+    parser.add_argument('circuit', help="Logisim file (partb.circ)")
+    parser.add_argument('program', nargs='?', help="machine code (.bin) to run")
+    parser.add_argument('-s', '--symbols', help="symbol map from `parta1.py -s`, for source lines")
+    parser.add_argument('--steps', type=int, default=100000, help="instructions to run")
+    parser.add_argument('--check', action='store_true', help="list ports and wire ends that connect to nothing")
+    parser.add_argument('--source', action='store_true', help="print the generated settle functions")
+    args = parser.parse_args()
+
+    try:
+        circuits = load_circuits(args.circuit)
+        compiled = Compiled(Netlist(circuits, TOP_CIRCUIT))
+    except (ValueError, OSError, ET.ParseError) as e:
+        print(e)
+        sys.exit(1)
+    print(f"{len(compiled.netlist.cells)} cells, {compiled.netlist.net_count} nets, "
+          f"{len(compiled.registers)} registers", file=sys.stderr)
+    if args.check:
+        for line in check(circuits):
+            print(line)
+    if args.source:
+        print(compiled.source)
+    if not args.program:
+        return
+
+    from profiler import Symbols
+    with open(args.program, 'rb') as f:
+        program = f.read()
+    symbols = Symbols.load(args.symbols)
+    report = lockstep(compiled, program, args.steps)
+    print(f"status: {report['status']}")
+    print(f"instructions: {report['steps']}  clocks: {report['clocks']}")
+    mismatch = report['mismatch']
+    if mismatch is None:
+        print("no differences")
+        return
+    print(f"first difference at instruction {mismatch['step']} (emulator cycle {mismatch['cycle']}):")
+    print(f"  [{mismatch['pc']:02X}] op {mismatch['opcode']:02X}  {symbols.line(mismatch['pc'])}")
+    for name, hardware, emulator in mismatch['fields']:
+        print(f"  {name:8} hardware {hardware:X}  emulator {emulator:X}")
+    sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
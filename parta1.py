@@ -1,5 +1,6 @@
 import sys
-import re
+import json
+import argparse
 
 # Define instruction encodings
 # instruction_set = {
@@ -29,6 +30,9 @@ instruction_set = {
     'ret': 0x2E,
     'from-ioa': 0x32, 'inc': 0x31,
     'bcd': 0x36, 'shutdown': [0x37, 0x3E],
+    # timer-start is 0x38 in the ISA, but the emulator runs 0x38 as to-pc
+    'timer-start': 0x35, 'timer-end': 0x39,
+    'from-timerl': 0x3A, 'from-timerh': 0x3B, 'to-timerl': 0x3C, 'to-timerh': 0x3D,
     'nop': 0x3E, 'dec': 0x3F,
 }
 
@@ -41,7 +45,7 @@ regs = {'r0': 0b000, 'r1': 0b001, 'r2': 0b010, 'r3': 0b011, 'r4': 0b100, 'r5': 0
 #     'add': 0x40, 'sub': 0x41, 'and': 0x42, 'xor': 0x43, 'or': 0x44, 'timer': 0x47
 # }
 imm_ops = {
-    'add': 0x40, 'sub': 0x41, 'and': 0x42, 'xor': 0x43, 'or': 0x44
+    'add': 0x40, 'sub': 0x41, 'and': 0x42, 'xor': 0x43, 'or': 0x44, 'timer': 0x47
 }
 
 
@@ -53,7 +57,7 @@ imm_ops = {
 # }
 branch_ops = {
     'b-bit': 0x80, 'bnz-a': 0xA0, 'bnz-b': 0xA8, 'beqz': 0xB0, 'bnez': 0xB8,
-    'beqz-cf': 0xC0, 'bnez-cf': 0xC8, 'bnz-d': 0xD8,
+    'beqz-cf': 0xC0, 'bnez-cf': 0xC8, 'b-timer': 0xD0, 'bnz-d': 0xD8,
     'b': 0xE0, 'call': 0xF0
 }
 
@@ -80,12 +84,8 @@ def parse_operand(operand):
     except ValueError:
         raise ValueError(f"Could not parse operand: {operand}")
 
-def assemble_line(line):
-    line = line.split(';')[0].strip()
-    if not line:
-        return []
-
-    tokens = re.split(r'\s+', line)
+def encode(tokens):
+    # machine code for one tokenized instruction, e.g. ['add', '3']
     instr = tokens[0].lower()
     code = []
 
@@ -106,6 +106,8 @@ def assemble_line(line):
         if len(tokens) < 2:
             raise ValueError(f"Missing operand for: {instr}")
         operand = tokens[1].lower()
+        if operand in regs and instr == 'timer':
+            raise ValueError("timer takes an immediate (use to-timerl / to-timerh for ACC)")
         if operand in regs:
             code.append(reg_ops['from-reg'] | (regs[operand] << 1))
             code.append(imm_ops[instr])
@@ -114,7 +116,8 @@ def assemble_line(line):
         else:
             imm = parse_operand(operand)
             code.append(imm_ops[instr])
-            code.append(imm & 0x0F)
+            # timer loads all 8 bits of TIMER, the ALU ops a nibble
+            code.append(imm & (0xFF if instr == 'timer' else 0x0F))
             return code
 
     elif instr == 'acc':
@@ -141,10 +144,7 @@ def assemble_line(line):
             base_opcode = branch_ops[instr]
             high_bits = (imm_bin >> 8) & 0x07
             low_byte = imm_bin & 0xFF
-            if instr == 'b':
-                code.append(base_opcode)
-            else:
-                code.append(base_opcode | high_bits)
+            code.append(base_opcode | high_bits)
             code.append(low_byte)
         return code
 
@@ -162,56 +162,850 @@ def assemble_line(line):
     else:
         raise ValueError(f"Unknown instruction: {instr}")
 
-def assemble(input_file, output_file):
-    labels = {}
-    addr = 0
-    with open(input_file, 'r') as fin:
-        for line in fin:
-            line_clean = line.split(';')[0].strip()
-            if not line_clean:
-                continue
+def assemble_line(line):
+    line = line.split(';')[0].strip()
+    if not line:
+        return []
+    return encode(line.split())
+
+
+# === Single-pass assembly ===
+# The source is tokenized once into a list of Label / Instruction items.
+# Instructions are encoded in order; a branch to a label that is not known
+# yet is encoded with a placeholder target and patched from the fixup table
+# once every label is known.
+
+class Label:
+    __slots__ = ('name', 'lineno')
+
+    def __init__(self, name, lineno):
+        self.name = name
+        self.lineno = lineno
+
+
+class Instruction:
+    __slots__ = ('tokens', 'lineno', 'text')
+
+    def __init__(self, tokens, lineno, text):
+        self.tokens = tokens      # mnemonic first, as written
+        self.lineno = lineno
+        self.text = text          # source without the comment
+
+    @property
+    def mnemonic(self):
+        return self.tokens[0].lower()
+
+
+class Directive:
+    __slots__ = ('name', 'args', 'lineno', 'text')
+
+    def __init__(self, name, args, lineno, text):
+        self.name = name          # e.g. '.global'
+        self.args = args
+        self.lineno = lineno
+        self.text = text
+
+
+class Assembly:
+    # result of assembling a program or object
+    def __init__(self):
+        self.code = bytearray()
+        self.labels = {}          # label -> address
+        self.lines = []           # (address, Instruction, bytes)
+        self.globals = []         # labels exported with .global
+        self.externs = []         # symbols imported with .extern
+        self.relocations = []     # (offset, tokens, operand index, symbol)
+
+
+def parse_source(text):
+    items = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line_clean = line.split(';')[0].strip()
+        if not line_clean:
+            continue
+        if line_clean.endswith(':'):
+            items.append(Label(line_clean[:-1].strip(), lineno))
+        elif line_clean.startswith('.'):
+            tokens = line_clean.split()
+            items.append(Directive(tokens[0].lower(), tokens[1:], lineno, line_clean))
+        else:
+            items.append(Instruction(line_clean.split(), lineno, line_clean))
+    return items
+
+
+def label_operand(tokens):
+    # index of the branch target or rarb/rcrd operand if it names a
+    # label, else None
+    instr = tokens[0].lower()
+    if instr == 'b-bit':
+        index = 2
+    elif instr in branch_ops or instr in ('rarb', 'rcrd'):
+        index = 1
+    else:
+        return None
+    if len(tokens) <= index:
+        return None
+    try:
+        parse_operand(tokens[index])
+        return None
+    except ValueError:
+        return index
+
+
+def line_error(item, message):
+    return ValueError(f"[Line {item.lineno}] Error: {message} -> \"{item.text}\"")
 
-            if line_clean.endswith(':'):
-                label = line_clean[:-1].strip()
-                labels[label] = addr
+
+def assemble_items(items, relocatable=False):
+    # relocatable: every label operand becomes a relocation entry instead of
+    # being resolved here, and .extern symbols are allowed (object files)
+    asm = Assembly()
+    code = asm.code
+    fixups = []   # (offset, label operand index, Instruction)
+    for item in items:
+        if isinstance(item, Label):
+            asm.labels[item.name] = len(code)
+            continue
+        if isinstance(item, Directive):
+            if item.name == '.global':
+                asm.globals.extend(item.args)
+            elif item.name == '.extern':
+                asm.externs.extend(item.args)
+            else:
+                raise line_error(item, f"Unknown directive: {item.name}")
+            continue
+        tokens = item.tokens
+        ref = label_operand(tokens)
+        if ref is not None:
+            label = tokens[ref]
+            if relocatable:
+                asm.relocations.append((len(code), item.tokens, ref, label))
+                fixups.append((len(code), ref, item))
+                tokens = tokens[:ref] + ['0'] + tokens[ref + 1:]
+            elif label in asm.labels:
+                tokens = tokens[:ref] + [str(asm.labels[label])] + tokens[ref + 1:]
             else:
-                try:
-                    code = assemble_line(line_clean)
-                    addr += len(code)
-                except ValueError as e:
-                    if 'Could not parse operand' in str(e) or 'Missing' in str(e):
-                        continue
-                    else:
-                        print(f"[Warning] Skipping invalid instruction: {line_clean}")
-
-    with open(input_file, 'r') as fin, open(output_file, 'wb') as fout:
-        for lineno, line in enumerate(fin, 1):
-            line_clean = line.split(';')[0].strip()
-            if not line_clean or line_clean.endswith(':'):
+                fixups.append((len(code), ref, item))
+                tokens = tokens[:ref] + ['0'] + tokens[ref + 1:]
+        try:
+            machine_code = encode(tokens)
+        except ValueError as e:
+            raise line_error(item, e) from e
+        asm.lines.append((len(code), item, len(machine_code)))
+        code.extend(machine_code)
+
+    for offset, ref, item in fixups:
+        label = item.tokens[ref]
+        if relocatable:
+            if label not in asm.labels and label not in asm.externs:
+                raise line_error(item, f"Undefined label: {label} (declare it with .extern)")
+            continue
+        if label not in asm.labels:
+            raise line_error(item, f"Undefined label: {label}")
+        patched = relocate(item.tokens, ref, asm.labels[label])
+        code[offset:offset + len(patched)] = patched
+
+    for label in asm.globals:
+        if label not in asm.labels:
+            raise ValueError(f"Undefined global: {label}")
+
+    asm.lines = [(addr, item, bytes(code[addr:addr + size])) for addr, item, size in asm.lines]
+    return asm
+
+
+def relocate(tokens, ref, address):
+    # re-encode an instruction with its label operand replaced by address
+    return encode(tokens[:ref] + [str(address)] + tokens[ref + 1:])
+
+
+def assemble_program(text, optimize=False, profile=None):
+    items = parse_source(text)
+    if optimize:
+        items, _ = optimize_items(items)
+    if profile is not None:
+        items, _ = layout_items(items, profile)
+    return assemble_items(items)
+
+
+def assemble_source(text):
+    # assemble .asm source text to machine code, no file I/O
+    return bytes(assemble_program(text).code)
+
+
+# === Peephole optimizer ===
+# Optional pass over the parsed items (-O). The code is split into basic
+# blocks at labels and branches, and liveness of ACC, CF and RA..RE is
+# solved over the branch graph. Then, until nothing changes:
+#   - a branch to a `b` goes straight to its target, a branch to the next
+#     line is dropped, and unlabeled code after a `b` or `ret` is removed
+#   - a load of a value the destination already holds is dropped
+#   - an instruction whose only effect is on registers nobody reads before
+#     they are written again is dropped (dead `acc` loads, `sub 0` ahead
+#     of a `beqz` while CF is dead)
+#   - acc / to-reg runs that set RA:RB or RC:RD to constants become one
+#     rarb / rcrd
+# The program must not read or write its own code. parta1 has no to-pc,
+# so every jump target is a label.
+
+ALL_LOCATIONS = frozenset(('acc', 'cf', 'ra', 'rb', 'rc', 'rd', 're', 'mem', 'io', 'temp'))
+REGISTER_LOCATIONS = frozenset(('acc', 'cf', 'ra', 'rb', 'rc', 'rd', 're'))
+REG_LOCATIONS = {'r0': 'ra', 'r1': 'rb', 'r2': 'rc', 'r3': 'rd', 'r4': 're'}
+PAIR_OPS = {('ra', 'rb'): 'rarb', ('rc', 'rd'): 'rcrd'}
+
+# mnemonic -> (reads, writes). A location an instruction may or may not
+# write (CF on the logic ops, ACC and CF on rarb/rcrd in partb.circ) is
+# listed as both read and written, which keeps liveness safe either way.
+EFFECTS = {
+    'rot-r': ('acc', 'acc'), 'rot-l': ('acc', 'acc'),
+    'rot-rc': ('acc cf', 'acc cf'), 'rot-lc': ('acc cf', 'acc cf'),
+    'from-mba': ('ra rb mem', 'acc'), 'to-mba': ('acc ra rb', 'mem'),
+    'from-mdc': ('rc rd mem', 'acc'), 'to-mdc': ('acc rc rd', 'mem'),
+    'addc-mba': ('acc cf ra rb mem', 'acc cf'), 'add-mba': ('acc ra rb mem', 'acc cf'),
+    'subc-mba': ('acc cf ra rb mem', 'acc cf'), 'sub-mba': ('acc ra rb mem', 'acc cf'),
+    'inc*-mba': ('ra rb mem', 'mem'), 'dec*-mba': ('ra rb mem', 'mem'),
+    'inc*-mdc': ('rc rd mem', 'mem'), 'dec*-mdc': ('rc rd mem', 'mem'),
+    'clr-cf': ('', 'cf'), 'set-cf': ('', 'cf'), 'nop': ('', ''),
+    'from-ioa': ('io', 'acc'), 'inc': ('acc', 'acc'), 'dec': ('acc', 'acc'),
+    'acc': ('', 'acc'),
+    'add': ('acc cf', 'acc cf'), 'sub': ('acc', 'acc cf'), 'and': ('acc cf', 'acc cf'),
+    'xor': ('acc cf', 'acc cf'), 'or': ('acc cf', 'acc cf'),
+    'rarb': ('acc cf', 'ra rb acc cf'), 'rcrd': ('acc cf', 'rc rd acc cf'),
+}
+# immediate that leaves ACC unchanged, per op
+IDENTITY_IMMEDIATES = {'add': 0, 'sub': 0, 'or': 0, 'xor': 0, 'and': 0xF}
+CONDITIONS = {'beqz': 'acc', 'bnez': 'acc', 'beqz-cf': 'cf', 'bnez-cf': 'cf',
+              'bnz-a': 'ra', 'bnz-b': 'rb', 'bnz-d': 'rd', 'b-bit': 'acc mem'}
+BLOCK_ENDS = set(branch_ops) | {'ret'}
+
+
+def immediate(ins, index=1):
+    # the operand at index as a number, None for a label or register
+    if len(ins.tokens) <= index:
+        return None
+    try:
+        value = parse_operand(ins.tokens[index])
+    except ValueError:
+        return None
+    return value if isinstance(value, int) else None
+
+
+def effects(ins):
+    # (reads, writes) as sets of locations; None for anything not modelled,
+    # which is treated as reading and writing everything
+    name = ins.mnemonic
+    operand = ins.tokens[1].lower() if len(ins.tokens) > 1 else None
+    if name in reg_ops:
+        reg = REG_LOCATIONS.get(operand)
+        if reg is None:
+            return None     # r5 encodings are clr-cf / set-cf
+        if name == 'to-reg':
+            return {'acc'}, {reg}
+        if name == 'from-reg':
+            return {reg}, {'acc'}
+        return {reg}, {reg}
+    if name in CONDITIONS:
+        return set(CONDITIONS[name].split()), set()
+    if name == 'b':
+        return set(), set()
+    if name not in EFFECTS:
+        return None
+    reads, writes = (set(names.split()) for names in EFFECTS[name])
+    if name in imm_ops:
+        if operand in REG_LOCATIONS:
+            reads.add(REG_LOCATIONS[operand])     # from-reg + op
+        elif immediate(ins) is not None and immediate(ins) & 0xF == IDENTITY_IMMEDIATES[name]:
+            writes.discard('acc')
+    return reads, writes
+
+
+def instruction_size(ins):
+    ref = label_operand(ins.tokens)
+    tokens = ins.tokens if ref is None else ins.tokens[:ref] + ['0'] + ins.tokens[ref + 1:]
+    return len(encode(tokens))
+
+
+def branch_target(ins):
+    # label a branch goes to, None if it is not a branch to a label
+    if ins.mnemonic not in branch_ops:
+        return None
+    ref = label_operand(ins.tokens)
+    return ins.tokens[ref] if ref is not None else None
+
+
+def basic_blocks(items):
+    # [(labels, [Instruction])] in program order; directives are skipped
+    blocks = [([], [])]
+    for item in items:
+        labels, body = blocks[-1]
+        if isinstance(item, Label):
+            if body:
+                blocks.append(([], []))
+            blocks[-1][0].append(item.name)
+        elif isinstance(item, Instruction):
+            body.append(item)
+            if item.mnemonic in BLOCK_ENDS:
+                blocks.append(([], []))
+    return [block for block in blocks if block[0] or block[1]]
+
+
+def successors(blocks, index, where):
+    # block indices control can go to next; None stands for "anywhere"
+    labels, body = blocks[index]
+    last = body[-1] if body else None
+    following = [index + 1] if index + 1 < len(blocks) else [None]
+    if last is None or last.mnemonic not in BLOCK_ENDS:
+        return following
+    if last.mnemonic == 'ret':
+        return [None]
+    target = where.get(branch_target(last))
+    return [target] if last.mnemonic == 'b' else [target] + following
+
+
+def transfer(body, live):
+    for ins in reversed(body):
+        found = effects(ins)
+        if found is None:
+            live = set(ALL_LOCATIONS)
+        else:
+            reads, writes = found
+            live = (live - writes) | reads
+    return live
+
+
+def liveness(blocks):
+    # live-out set per block
+    where = {name: i for i, (labels, _) in enumerate(blocks) for name in labels}
+    live_in = [set() for _ in blocks]
+    live_out = [set() for _ in blocks]
+    changed = True
+    while changed:
+        changed = False
+        for i in reversed(range(len(blocks))):
+            out = set()
+            for succ in successors(blocks, i, where):
+                out |= ALL_LOCATIONS if succ is None else live_in[succ]
+            new_in = transfer(blocks[i][1], out)
+            if out != live_out[i] or new_in != live_in[i]:
+                live_out[i], live_in[i] = out, new_in
+                changed = True
+    return live_out
+
+
+class Optimizer:
+    def __init__(self, items):
+        self.items = list(items)
+        self.changes = []       # (line number, description, bytes saved, cycles saved)
+
+    def note(self, ins, text, size, cycles):
+        self.changes.append((ins.lineno, text, size, cycles))
+
+    def replace(self, old, new):
+        # old: list of instructions (consecutive), new: their replacement
+        start = self.items.index(old[0])
+        end = self.items.index(old[-1]) + 1
+        kept = [item for item in self.items[start:end] if item not in old]
+        self.items[start:end] = kept + new
+
+    def run(self, max_passes=20):
+        for _ in range(max_passes):
+            changed = False
+            for pass_ in (self.thread_branches, self.drop_redundant, self.drop_dead, self.fuse_pairs):
+                changed |= pass_()
+            if not changed:
+                break
+        return self.items
+
+    def thread_branches(self):
+        blocks = basic_blocks(self.items)
+        where = {name: i for i, (labels, _) in enumerate(blocks) for name in labels}
+
+        def final(label, seen):
+            # follow labels whose first instruction is a `b`
+            index = where.get(label)
+            if index is None or label in seen:
+                return label
+            body = blocks[index][1]
+            if body and body[0].mnemonic == 'b' and branch_target(body[0]) is not None:
+                return final(branch_target(body[0]), seen | {label})
+            return label
+
+        changed = False
+        for i, (labels, body) in enumerate(blocks):
+            if not body:
                 continue
+            last = body[-1]
+            target = branch_target(last)
+            if target is None:
+                continue
+            ref = label_operand(last.tokens)
+            threaded = final(target, set())
+            if threaded != target:
+                new = Instruction(last.tokens[:ref] + [threaded] + last.tokens[ref + 1:], last.lineno,
+                                  ' '.join(last.tokens[:ref] + [threaded] + last.tokens[ref + 1:]))
+                self.replace([last], [new])
+                self.note(last, f"{last.text} -> {threaded} (threaded)", 0, 2)
+                return True
+            following = blocks[i + 1][0] if i + 1 < len(blocks) else []
+            # a call still has to set TEMP, even to the next line
+            if target in following and last.mnemonic in branch_ops and last.mnemonic != 'call':
+                self.replace([last], [])
+                self.note(last, f"{last.text} (branch to next line)", 2, 2)
+                return True
+            if last.mnemonic in ('b', 'ret') and i + 1 < len(blocks) and not blocks[i + 1][0]:
+                dead = blocks[i + 1][1]
+                size = sum(instruction_size(ins) for ins in dead)
+                self.replace(dead, [])
+                self.note(dead[0], f"{len(dead)} unreachable instructions", size, 0)
+                # blocks is stale now, so start over from the new items
+                return True
+        return False
+
+    def drop_redundant(self):
+        # forward through each block with the value each register is known
+        # to hold: an int, or a token for "whatever was there at step n"
+        changed = False
+        for labels, body in basic_blocks(self.items):
+            values = {}
+            for step, ins in enumerate(body):
+                name = ins.mnemonic
+                operand = ins.tokens[1].lower() if len(ins.tokens) > 1 else None
+                reg = REG_LOCATIONS.get(operand)
+                acc = values.get('acc')
+                redundant = False
+                if name == 'acc':
+                    redundant = acc == immediate(ins) & 0xF
+                elif name in ('to-reg', 'from-reg') and reg is not None:
+                    redundant = acc is not None and values.get(reg) == acc
+                elif name in ('clr-cf', 'set-cf'):
+                    redundant = values.get('cf') == (1 if name == 'set-cf' else 0)
+                if redundant:
+                    self.replace([ins], [])
+                    self.note(ins, f"{ins.text} (value already there)", instruction_size(ins),
+                              instruction_size(ins))
+                    changed = True
+                    continue
+                found = effects(ins)
+                if found is None:
+                    values = {}
+                    continue
+                for loc in found[1]:
+                    values[loc] = ('?', step, loc)
+                if name == 'acc':
+                    values['acc'] = immediate(ins) & 0xF
+                elif name == 'to-reg' and reg is not None:
+                    values[reg] = acc if acc is not None else values[reg]
+                    values['acc'] = values[reg]
+                elif name == 'from-reg' and reg is not None:
+                    values['acc'] = values.setdefault(reg, values['acc'])
+                elif name in ('inc', 'dec') and isinstance(acc, int):
+                    values['acc'] = (acc + (1 if name == 'inc' else -1)) & 0xF
+                elif name in ('clr-cf', 'set-cf'):
+                    values['cf'] = 1 if name == 'set-cf' else 0
+                elif name in ('rarb', 'rcrd') and immediate(ins) is not None:
+                    first, second = ('ra', 'rb') if name == 'rarb' else ('rc', 'rd')
+                    values[first], values[second] = immediate(ins) >> 4 & 0xF, immediate(ins) & 0xF
+        return changed
+
+    def drop_dead(self):
+        blocks = basic_blocks(self.items)
+        changed = False
+        for (labels, body), live in zip(blocks, liveness(blocks)):
+            live = set(live)
+            for ins in reversed(body):
+                found = effects(ins)
+                if found is None:
+                    live = set(ALL_LOCATIONS)
+                    continue
+                reads, writes = found
+                if writes and writes <= REGISTER_LOCATIONS and not writes & live \
+                        and ins.mnemonic not in branch_ops:
+                    self.replace([ins], [])
+                    self.note(ins, f"{ins.text} (result never read)", instruction_size(ins),
+                              instruction_size(ins))
+                    changed = True
+                    continue
+                live = (live - writes) | reads
+        return changed
+
+    def fuse_pairs(self):
+        blocks = basic_blocks(self.items)
+        for (labels, body), live_out in zip(blocks, liveness(blocks)):
+            # live after each instruction of the block
+            after = [None] * len(body)
+            live = set(live_out)
+            for i in reversed(range(len(body))):
+                after[i] = set(live)
+                found = effects(body[i])
+                live = set(ALL_LOCATIONS) if found is None else (live - found[1]) | found[0]
+            for start in range(len(body)):
+                for length in (4, 3):
+                    window = body[start:start + length]
+                    fused = self.fused(window, after[start + length - 1] if len(window) == length else None)
+                    if fused is not None:
+                        size = sum(instruction_size(ins) for ins in window)
+                        saved = size - sum(instruction_size(ins) for ins in fused)
+                        self.replace(window, fused)
+                        self.note(window[0], f"{'; '.join(ins.text for ins in window)} -> "
+                                             f"{'; '.join(ins.text for ins in fused)}", saved, saved)
+                        return True
+        return False
+
+    def fused(self, window, live):
+        # the rarb/rcrd (plus an acc load if ACC is still needed) doing the
+        # same as window, or None if it is not an acc/to-reg run or saves nothing
+        if live is None or not window or window[0].mnemonic != 'acc' or immediate(window[0]) is None:
+            return None
+        acc = None
+        set_regs = {}
+        for ins in window:
+            if ins.mnemonic == 'acc' and immediate(ins) is not None:
+                acc = immediate(ins) & 0xF
+            elif ins.mnemonic == 'to-reg' and REG_LOCATIONS.get(ins.tokens[1].lower()) in ('ra', 'rb', 'rc', 'rd'):
+                set_regs[REG_LOCATIONS[ins.tokens[1].lower()]] = acc
+            else:
+                return None
+        pair = tuple(sorted(set_regs))
+        if pair not in PAIR_OPS or 'cf' in live:
+            return None
+        first, second = pair
+        op = PAIR_OPS[pair]
+        text = f"{op} 0x{set_regs[first] << 4 | set_regs[second]:02X}"
+        fused = [Instruction(text.split(), window[0].lineno, text)]
+        if 'acc' in live:
+            fused.append(Instruction(['acc', str(acc)], window[-1].lineno, f"acc {acc}"))
+        if sum(map(instruction_size, fused)) >= sum(map(instruction_size, window)):
+            return None
+        return fused
+
+
+def optimize_items(items):
+    # (items, changes); changes are (line, description, bytes saved,
+    # estimated cycles saved per run of that line)
+    optimizer = Optimizer(items)
+    return optimizer.run(), optimizer.changes
+
+
+def format_changes(changes):
+    saved = sum(size for _, _, size, _ in changes)
+    cycles = sum(c for _, _, _, c in changes)
+    out = [f"[Line {lineno}] {text}" for lineno, text, _, _ in sorted(changes)]
+    out.append(f"optimizer: {saved} bytes saved, about {cycles} cycles (each changed line run once)")
+    return '\n'.join(out)
+
+
+# === Profile-guided layout ===
+# Optional pass (-p) that reorders basic blocks by a profile from
+# `profiler.py --json`, taken on this source built the same way without -p.
+# Branches to a block that is only a `b` go straight to its target. Blocks
+# are then joined into chains along the hottest edges (Pettis-Hansen): a
+# block goes right after the block that most often continues into it, so
+# the `b` between them disappears. The entry block stays first, hot chains
+# follow by heat and chains that never ran go last in source order. A fall
+# through that got separated gets a `b`. A branch costs its two bytes
+# whether taken or not, so the saving is the `b`s no longer executed and
+# conditional branches are left as they are (inverting a beqz would only
+# need a bnez, which the emulator does not run). If the profile shows no
+# gain the order is kept.
+
+
+def load_profile(path):
+    with open(path, 'r') as f:
+        profile = json.load(f)
+    if 'pc_counts' not in profile or 'branches' not in profile:
+        raise ValueError(f"{path}: not a profile from `profiler.py --json`")
+    return profile
+
+
+def profile_counts(items, profile):
+    # execution count and taken count per instruction, read off the
+    # addresses the items assemble to; a register-operand ALU form is
+    # from-reg plus the immediate op, two emulator steps, so its count at
+    # addr+1 is credited to it as well
+    asm = assemble_items(items)
+    counts, taken = {}, {}
+    owner = {}
+    for addr, ins, data in asm.lines:
+        counts[ins] = profile['pc_counts'][addr]
+        taken[ins] = 0
+        for step in ([addr, addr + 1] if len(data) == 3 else [addr]):
+            owner[step] = ins
+    for addr, count in enumerate(profile['pc_counts'][:len(asm.code)]):
+        if count and addr not in owner:
+            raise ValueError(f"Profile does not match this program: 0x{addr:02X} ran but starts no "
+                             f"instruction (build without -p, with the same -O, and profile that)")
+    for addr, (took, _) in profile['branches'].items():
+        if int(addr) in owner:
+            taken[owner[int(addr)]] += took
+    return counts, taken
+
+
+def layout_items(items, profile):
+    # (items, changes); changes are (line, description, bytes saved,
+    # cycles saved over the profiled run)
+    counts, taken = profile_counts(items, profile)
+    directives = [item for item in items if isinstance(item, Directive)]
+    blocks = basic_blocks(items)
+    where = {name: i for i, (labels, _) in enumerate(blocks) for name in labels}
+    names = set(where)
+    for labels, body in blocks:
+        for ins in body:
+            if ins.mnemonic in branch_ops and branch_target(ins) is None:
+                raise line_error(ins, "Layout needs every branch target to be a label")
+
+    # every block gets a label up front, a moved block may need one
+    for index, (labels, _) in enumerate(blocks):
+        if not labels:
+            name = f'_layout_{index}'
+            while name in names:
+                name += '_'
+            labels.append(name)
+            names.add(name)
+
+    def label_of(index):
+        return blocks[index][0][0]
 
-            tokens = re.split(r'\s+', line_clean)
-            instr = tokens[0].lower()
+    def final(index, seen=()):
+        # follow blocks that are only a `b`
+        body = blocks[index][1]
+        if len(body) == 1 and body[0].mnemonic == 'b' and index not in seen:
+            return final(where[branch_target(body[0])], seen + (index,))
+        return index
 
-            if instr in branch_ops and len(tokens) >= 2:
-                label = tokens[1]
-                if label in labels:
-                    print(f"[Assembler] Resolved label '{label}' -> {labels[label]:02X}")
-                    tokens[1] = str(labels[label])
-                    line_clean = ' '.join(tokens)
+    # what still reaches each block once branches are threaded. A block
+    # that is only a `b` and that nothing reaches any more is dropped: its
+    # old count would otherwise keep it in the hot region
+    reached = {0}
+    for i, (labels, body) in enumerate(blocks):
+        for ins in body:
+            ref = label_operand(ins.tokens)
+            if ref is not None and ins.tokens[ref] in where:
+                target = where[ins.tokens[ref]]
+                threaded = ins.mnemonic in branch_ops and ins.mnemonic != 'call'
+                reached.add(final(target) if threaded else target)
+        if (not body or body[-1].mnemonic not in ('b', 'ret')) and i + 1 < len(blocks):
+            reached.add(i + 1)
+    for directive in directives:
+        reached.update(where[arg] for arg in directive.args if arg in where)
+    dead = {i for i, (_, body) in enumerate(blocks)
+            if i not in reached and len(body) == 1 and body[0].mnemonic == 'b'}
 
-            try:
-                machine_code = assemble_line(line_clean)
-                fout.write(bytearray(machine_code))
-                print(f"[0x{addr:04X}] {line_clean:<30} -> HEX: {[f'{b:02X}' for b in machine_code]}  BIN: {[f'{b:08b}' for b in machine_code]}")
-                addr += len(machine_code)
+    # (weight, source, destination): what placing destination right after
+    # source saves, in executions of a `b`
+    # the last block may run off the end of the program, then it stays last
+    last_block = len(blocks) - 1
+    runs_off = not blocks[-1][1] or blocks[-1][1][-1].mnemonic not in ('b', 'ret')
+    edges = []
+    for i, (labels, body) in enumerate(blocks):
+        last = body[-1] if body else None
+        name = last.mnemonic if last else None
+        if i in dead or i == last_block and runs_off:
+            continue
+        if name == 'b':
+            edges.append((counts[last], i, final(where[branch_target(last)])))
+        elif name in branch_ops and name != 'call':
+            if i + 1 < len(blocks):
+                edges.append((counts[last] - taken[last], i, i + 1))
+        elif name != 'ret' and i + 1 < len(blocks):
+            edges.append((counts[last] if last else 0, i, i + 1))
+    edges.sort(key=lambda edge: (-edge[0], edge[1]))
+
+    chains = {i: [i] for i in range(len(blocks))}   # head -> blocks
+    chain_of = list(range(len(blocks)))              # block -> head
+    for weight, src, dst in edges:
+        head = chain_of[src]
+        if dst == 0 or chain_of[dst] != dst or chains[head][-1] != src or head == dst:
+            continue
+        chains[head].extend(chains.pop(dst))
+        for index in chains[head]:
+            chain_of[index] = head
+
+    def heat(chain):
+        return max((counts[blocks[i][1][0]] for i in chain if blocks[i][1]), default=0)
+
+    final_chain = chain_of[last_block] if runs_off else None
+    if final_chain == chain_of[0] and len(chains) > 1:
+        return items, []
+    rest = [chain for head, chain in chains.items() if head not in (chain_of[0], final_chain)]
+    hot = sorted((chain for chain in rest if heat(chain)), key=lambda chain: (-heat(chain), chain[0]))
+    cold = sorted((chain for chain in rest if not heat(chain)), key=lambda chain: chain[0])
+    order = chains[chain_of[0]] + [i for chain in hot + cold for i in chain]
+    if final_chain is not None and final_chain != chain_of[0]:
+        order += chains[final_chain]
+
+    changes = [(blocks[i][1][0].lineno, f"{blocks[i][1][0].text} (unreachable once threaded)", 2, 0)
+               for i in sorted(dead)]
+    order = [i for i in order if i not in dead]
+    out = list(directives)
+    for position, i in enumerate(order):
+        labels, body = blocks[i]
+        body = list(body)
+        after = order[position + 1] if position + 1 < len(order) else None
+        last = body[-1] if body else None
+        name = last.mnemonic if last else None
+        falls_to = None
+        if name in branch_ops and name not in ('b', 'call'):
+            target = final(where[branch_target(last)])
+            if target != where[branch_target(last)]:
+                body[-1] = rewrite_branch(last, label_of(target))
+                changes.append((last.lineno, f"{last.text} -> {label_of(target)} (threaded)", 0,
+                                2 * taken[last]))
+            falls_to = (i + 1, counts[last] - taken[last])
+        elif name == 'b':
+            target = final(where[branch_target(last)])
+            if after == target:
+                body.pop()
+                changes.append((last.lineno, f"{last.text} (falls into {label_of(target)})", 2, 2 * counts[last]))
+            elif target != where[branch_target(last)]:
+                body[-1] = rewrite_branch(last, label_of(target))
+                changes.append((last.lineno, f"{last.text} -> {label_of(target)} (threaded)", 0,
+                                2 * counts[last]))
+        elif name != 'ret' and i + 1 < len(blocks):
+            falls_to = (i + 1, counts[last])
+        if falls_to is not None and after != falls_to[0]:
+            # only the last block can be empty, and it falls through nowhere
+            jump = Instruction(['b', label_of(falls_to[0])], last.lineno, f"b {label_of(falls_to[0])}")
+            body.append(jump)
+            changes.append((last.lineno, f"{jump.text} added after {last.text}", -2, -2 * falls_to[1]))
+        out.extend(Label(label, body[0].lineno if body else 0) for label in labels)
+        out.extend(body)
+
+    if sum(cycles for _, _, _, cycles in changes) <= 0:
+        return items, []
+    return out, changes
+
+
+def rewrite_branch(ins, label):
+    tokens = list(ins.tokens)
+    ref = label_operand(tokens)
+    tokens[ref] = label
+    return Instruction(tokens, ins.lineno, ' '.join(tokens))
+
+
+def format_layout(changes):
+    saved = sum(size for _, _, size, _ in changes)
+    cycles = sum(c for _, _, _, c in changes)
+    out = [f"[Line {lineno}] {text}" for lineno, text, _, _ in sorted(changes)]
+    out.append(f"layout: {len(changes)} branches changed, {saved} bytes saved, "
+               f"{cycles} cycles saved over the profiled run")
+    return '\n'.join(out)
+
+
+# === Object files ===
+# A relocatable object is a JSON document: code with placeholder operands,
+# local labels as offsets, .global exports, .extern imports and one
+# relocation per label operand (the instruction tokens are kept so the
+# linker can re-encode branch and rarb/rcrd operands with relocate()).
+
+OBJECT_FORMAT = 'arch242-obj'
+OBJECT_VERSION = 1
+
+
+def assemble_object(text, name='<source>', optimize=False):
+    items = parse_source(text)
+    if optimize:
+        items, _ = optimize_items(items)
+    asm = assemble_items(items, relocatable=True)
+    return {
+        'format': OBJECT_FORMAT,
+        'version': OBJECT_VERSION,
+        'name': name,
+        'code': asm.code.hex(),
+        'labels': asm.labels,
+        'globals': asm.globals,
+        'externs': asm.externs,
+        'relocations': [{'offset': offset, 'tokens': tokens, 'operand': ref, 'symbol': label}
+                        for offset, tokens, ref, label in asm.relocations],
+    }
+
+
+def write_object(path, obj):
+    with open(path, 'w') as f:
+        json.dump(obj, f, indent=1)
+
+
+def read_object(path):
+    with open(path, 'r') as f:
+        obj = json.load(f)
+    if obj.get('format') != OBJECT_FORMAT or obj.get('version') != OBJECT_VERSION:
+        raise ValueError(f"{path}: not an Arch-242 object file (version {OBJECT_VERSION})")
+    return obj
+
+
+def format_listing(asm):
+    out = []
+    for addr, item, machine_code in asm.lines:
+        out.append(f"[0x{addr:04X}] {item.text:<30} -> HEX: {[f'{b:02X}' for b in machine_code]}"
+                   f"  BIN: {[f'{b:08b}' for b in machine_code]}")
+    return '\n'.join(out)
+
+
+def symbol_map(asm, source='<source>'):
+    # label -> address and address -> source line, for the profiler and
+    # anything else that wants to name addresses
+    return {
+        'source': source,
+        'labels': asm.labels,
+        'lines': [{'addr': addr, 'size': len(machine_code), 'line': item.lineno, 'text': item.text}
+                  for addr, item, machine_code in asm.lines],
+    }
+
+
+def write_symbols(path, symbols):
+    with open(path, 'w') as f:
+        json.dump(symbols, f, indent=1)
+
+
+def assemble(input_file, output_file, listing=False, symbols_file=None, optimize=False, profile=None):
+    with open(input_file, 'r') as fin:
+        items = parse_source(fin.read())
+    if optimize:
+        items, changes = optimize_items(items)
+        print(format_changes(changes) if listing else format_changes(changes).splitlines()[-1],
+              file=sys.stderr)
+    if profile is not None:
+        items, changes = layout_items(items, profile)
+        print(format_layout(changes) if listing else format_layout(changes).splitlines()[-1],
+              file=sys.stderr)
+    asm = assemble_items(items)
+    with open(output_file, 'wb') as fout:
+        fout.write(asm.code)
+    if listing:
+        print(format_listing(asm))
+    if symbols_file:
+        write_symbols(symbols_file, symbol_map(asm, input_file))
+    return asm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arch-242 assembler")
+    parser.add_argument('input', help="assembly source (.asm)")
+    parser.add_argument('output', help="machine code to write (.bin), or object file with -c")
+    parser.add_argument('-l', '--listing', action='store_true',
+                        help="print the address/HEX/BIN listing")
+    parser.add_argument('-c', '--object', action='store_true',
+                        help="write a relocatable object file for linker.py instead of a .bin")
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help="run the peephole optimizer (with -l, list every change)")
+    parser.add_argument('-s', '--symbols', metavar='FILE',
+                        help="also write a symbol map (labels, address -> source line) as JSON")
+    parser.add_argument('-p', '--profile', metavar='FILE',
+                        help="lay out blocks by a `profiler.py --json` profile of this program built without -p")
+    args = parser.parse_args()
+    if args.object and args.profile:
+        parser.error("-p lays out a whole program, it cannot be used with -c")
+    try:
+        profile = load_profile(args.profile) if args.profile else None
+        if args.object:
+            with open(args.input, 'r') as fin:
+                write_object(args.output, assemble_object(fin.read(), name=args.input,
+                                                          optimize=args.optimize))
+        else:
+            assemble(args.input, args.output, listing=args.listing, symbols_file=args.symbols,
+                     optimize=args.optimize, profile=profile)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
 
-            except ValueError as e:
-                print(f"[Line {lineno}] Error: {e} -> \"{line.strip()}\"")
-                raise e
 
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print("Usage: python assembler.py <input.asm> <output.bin>")
-    else:
-        assemble(sys.argv[1], sys.argv[2])
\ No newline at end of file
+    main()
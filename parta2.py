@@ -1,78 +1,1425 @@
-import pyxel
+import os
 import sys
+import atexit
+import queue
+import threading
+import copy
+import time
+import hashlib
 import random
+import struct
+import heapq
+from array import array
+from collections import deque
+import argparse
+
+import linker
+
+try:
+    import pyxel
+except ImportError:  # only needed for the windowed frontend
+    pyxel = None
+
+# === Machine state ===
+# Memory and registers live in one bytearray: MEM_SIZE bytes of memory
+# followed by the register file as 16-bit slots, indexed by the constants
+# below (bit widths in the comments).
+MEM_SIZE = 256
+
+# Harvard mode (Arch242CPU(harvard=True)): code lives in its own ROM, as
+# large as the 11-bit branch field reaches, and memory holds data only
+ROM_SIZE = 2048
+ROM_PC_MASK = ROM_SIZE - 1
+
+# memory-mapped LED matrix: one byte per row, bit x lights column x. A
+# byte only holds columns 0-7, so columns 8-9 sit in a bank after the rows,
+# two bits per row and four rows per byte (row y: bits 2*(y%4) of byte y//4)
+DISPLAY_BASE = 0x80
+DISPLAY_ROWS = 20
+DISPLAY_COLS = 10
+DISPLAY_HIGH_BASE = DISPLAY_BASE + DISPLAY_ROWS      # 0x94-0x98
+DISPLAY_END = DISPLAY_HIGH_BASE + DISPLAY_ROWS // 4
+ALL_ROWS_DIRTY = (1 << DISPLAY_ROWS) - 1
+# display address -> the rows it holds, as dirty_rows bits
+DISPLAY_DIRTY = {DISPLAY_BASE + y: 1 << y for y in range(DISPLAY_ROWS)}
+DISPLAY_DIRTY.update({DISPLAY_HIGH_BASE + i: 0xF << 4 * i for i in range(DISPLAY_ROWS // 4)})
+
+
+def display_row(memory, y):
+    # the 10-bit column mask of row y
+    high = memory[DISPLAY_HIGH_BASE + y // 4] >> 2 * (y % 4) & 0x3
+    return memory[DISPLAY_BASE + y] | high << 8
 
-class Arch242Emulator:
-    def __init__(self, program):
-        self.memory = [0] * 256
-        self.registers = {
-            # General reg
-            'RA': 0,
-            'RB': 0,
-            'RC': 0,
-            'RD': 0,
-            'RE': 0,
-
-            # Special reg
-            'ACC': 0,     # 4
-            'CF': 0,      # 1
-            'PC': 0,      # 16
-            'TEMP': 0,    # 16
-            # 'TIMER': 0,   # 8
-            # 'EI': 0,      # 1
-            'PA': 0,      # 4
-
-            # I/O reg
-            'IOA': 0,     # 4
-            # 'IOB': 0,     # 4
-            # 'IOC': 0      # 4
-        }
+# General reg
+RA, RB, RC, RD, RE = 0, 1, 2, 3, 4
 
-        self.delay_counter = 0
-        # self.timer_running = False
-        self.load_program(program)
+# Special reg
+ACC = 5     # 4
+CF = 6      # 1
+PC = 7      # 16
+TEMP = 8    # 16
+# TIMER     # 8
+# EI        # 1
+PA = 9      # 4
 
-        # === SnakeGame State ===
-        self.snake = [(5, 10), (4, 10), (3, 10)]
-        self.direction = (1, 0)
-        self.food = self.spawn_food()
-        self.score = 0
-        self.game_over = False
-        # ========================
+# I/O reg
+IOA = 10    # 4
+# IOB       # 4
+# IOC       # 4
+
+# Timer (see op_timer_start)
+TIMER = 11  # 8, ticks to count
+TRUN = 12   # 1, set while the timer runs
+
+NUM_REGS = 13
+STATE_SIZE = MEM_SIZE + 2 * NUM_REGS
+
+REG_INDEX = {
+    'RA': RA, 'RB': RB, 'RC': RC, 'RD': RD, 'RE': RE,
+    'ACC': ACC, 'CF': CF, 'PC': PC, 'TEMP': TEMP, 'PA': PA, 'IOA': IOA,
+    'TIMER': TIMER, 'TRUN': TRUN,
+}
+
+# === Event queue ===
+# Peripherals schedule the cycle their state next changes instead of being
+# polled every instruction. The run loops stop at Arch242CPU.next_event and
+# fire what is due before the next instruction starts, so an event lands on
+# the same instruction boundary on every engine, and an idle CPU can be
+# fast-forwarded straight to it (see ClockScheduler).
+
+NEVER = float('inf')     # next_event when nothing is scheduled
+EVENT_TIMER = 0          # the timer ran out
+TIMER_PRESCALE = 16      # cycles per timer tick
+
+
+class EventQueue:
+    # heap of (cycle, kind)
+    __slots__ = ('heap',)
+
+    def __init__(self, pending=()):
+        self.heap = sorted(pending)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, cycle, kind):
+        heapq.heappush(self.heap, (cycle, kind))
+
+    def cancel(self, kind):
+        self.heap = [event for event in self.heap if event[1] != kind]
+        heapq.heapify(self.heap)
+
+    def next_cycle(self):
+        return self.heap[0][0] if self.heap else NEVER
+
+    def pop_due(self, cycle):
+        heap = self.heap
+        due = []
+        while heap and heap[0][0] <= cycle:
+            due.append(heapq.heappop(heap))
+        return due
+
+    def pending(self):
+        return sorted(self.heap)
+
+
+def timer_expired(emu, cycle):
+    emu.regs[TRUN] = 0
+    emu.timer_expiries += 1
+
+
+EVENT_HANDLERS = {EVENT_TIMER: timer_expired}
+
+
+# === Opcode handlers ===
+# Each handler takes (emu, arg). For 1-byte instructions arg is the operand
+# decoded from the opcode itself (register index, immediate nibble, address
+# source); for 2-byte instructions it is the second instruction byte.
+
+# address sources: (upper nibble reg, lower nibble reg)
+MBA = (RB, RA)
+MDC = (RD, RC)
+
+
+def get_addr(emu, src):
+    reg_high, reg_low = src
+    r = emu.regs
+    return ((r[reg_high] & 0x0F) << 4) | (r[reg_low] & 0x0F)
+
+
+# rot-r 0x00: rotate ACC right by 1 bit
+def op_rot_r(emu, arg):
+    acc = emu.regs[ACC]
+    emu.regs[ACC] = ((acc >> 1) | ((acc & 1) << 3)) & 0xF
+
+
+# rot-l 0x01: rotate ACC left by 1 bit
+def op_rot_l(emu, arg):
+    acc = emu.regs[ACC]
+    emu.regs[ACC] = ((acc << 1) | ((acc >> 3) & 1)) & 0xF
+
+
+# rot-rc 0x02: rotate CF:ACC right by 1 bit
+def op_rot_rc(emu, arg):
+    r = emu.regs
+    combined = (r[CF] << 4) | r[ACC]
+    combined = ((combined >> 1) | ((combined & 1) << 4)) & 0x1F
+    r[CF] = (combined >> 4) & 1
+    r[ACC] = combined & 0xF
+
+
+# rot-lc 0x03: rotate CF:ACC left by 1 bit
+def op_rot_lc(emu, arg):
+    r = emu.regs
+    combined = (r[CF] << 4) | r[ACC]
+    combined = ((combined << 1) | ((combined >> 4) & 1)) & 0x1F
+    r[CF] = (combined >> 4) & 1
+    r[ACC] = combined & 0xF
+
+
+# from-mba 0x04 / from-mdc 0x06: ACC = MEM[src]
+def op_from_mem(emu, src):
+    emu.regs[ACC] = emu.memory[get_addr(emu, src)] & 0xF
+
+
+# to-mba 0x05 / to-mdc 0x07: MEM[src] = ACC
+def op_to_mem(emu, src):
+    addr = get_addr(emu, src)
+    emu.memory[addr] = emu.regs[ACC] & 0xF
+    if emu.watch[addr]:
+        emu.watched_write(addr)
+
+
+# addc-mba 0x08: ACC = ACC + MEM[RB:RA] + CF
+def op_addc_mba(emu, arg):
+    r = emu.regs
+    total = r[ACC] + (emu.memory[get_addr(emu, MBA)] & 0xF) + r[CF]
+    r[ACC] = total & 0xF
+    r[CF] = 1 if total > 0xF else 0
+
+
+# add-mba 0x09: ACC = ACC + MEM[RB:RA]
+def op_add_mba(emu, arg):
+    r = emu.regs
+    total = r[ACC] + (emu.memory[get_addr(emu, MBA)] & 0xF)
+    r[ACC] = total & 0xF
+    r[CF] = 1 if total > 0xF else 0
+
+
+# subc-mba 0x0A: ACC = ACC - MEM[RB:RA] + CF
+def op_subc_mba(emu, arg):
+    r = emu.regs
+    diff = r[ACC] - (emu.memory[get_addr(emu, MBA)] & 0xF) + r[CF]
+    r[CF] = 1 if diff < 0 else 0  # underflow
+    r[ACC] = diff & 0xF
+
+
+# sub-mba 0x0B: ACC = ACC - MEM[RB:RA]
+def op_sub_mba(emu, arg):
+    r = emu.regs
+    diff = r[ACC] - (emu.memory[get_addr(emu, MBA)] & 0xF)
+    r[CF] = 1 if diff < 0 else 0
+    r[ACC] = diff & 0xF
+
+
+# inc*-mba 0x0C / inc*-mdc 0x0E: MEM[src] += 1 (wrap 4 bits)
+def op_inc_mem(emu, src):
+    addr = get_addr(emu, src)
+    emu.memory[addr] = (emu.memory[addr] + 1) & 0xF
+    if emu.watch[addr]:
+        emu.watched_write(addr)
+
+
+# dec*-mba 0x0D / dec*-mdc 0x0F: MEM[src] -= 1 (wrap 4 bits)
+def op_dec_mem(emu, src):
+    addr = get_addr(emu, src)
+    emu.memory[addr] = (emu.memory[addr] - 1) & 0xF
+    if emu.watch[addr]:
+        emu.watched_write(addr)
+
+
+# inc*-reg 0x10 to 0x14
+def op_inc_reg(emu, reg):
+    emu.regs[reg] = (emu.regs[reg] + 1) & 0xF
+
+
+# dec*-reg 0x15
+def op_dec_reg(emu, reg):
+    emu.regs[reg] = (emu.regs[reg] - 1) & 0xF
+
+
+# to-reg 0x20 to 0x28 (0010RRR0): REG[RRR] = ACC
+def op_to_reg(emu, reg):
+    emu.regs[reg] = emu.regs[ACC] & 0xF
+
+
+# from-reg 0x21 to 0x29 (0010RRR1): ACC = REG[RRR]
+def op_from_reg(emu, reg):
+    emu.regs[ACC] = emu.regs[reg] & 0xF
+
+
+# clr-cf 0x2A
+def op_clr_cf(emu, arg):
+    emu.regs[CF] = 0
+
+
+# set-cf 0x2B
+def op_set_cf(emu, arg):
+    emu.regs[CF] = 1
+
+
+# ret 0x2E
+def op_ret(emu, arg):
+    r = emu.regs
+    r[PC] = (r[PC] & 0xF000) | (r[TEMP] & 0x0FFF)
+    r[TEMP] = 0
+
+
+# retc 0x2F
+def op_retc(emu, arg):
+    r = emu.regs
+    r[PC] = (r[PC] & 0xF000) | (r[TEMP] & 0x0FFF)
+    r[CF] = (r[TEMP] >> 12) & 1
+    r[TEMP] = 0
+
+
+# from-pa 0x30
+def op_from_pa(emu, arg):
+    emu.regs[ACC] = emu.regs[PA] & 0xF
+
+
+# inc 0x31
+def op_inc(emu, arg):
+    emu.regs[ACC] = (emu.regs[ACC] + 1) & 0xF
+
+
+# from-ioa 0x32
+def op_from_ioa(emu, arg):
+    emu.regs[ACC] = emu.regs[IOA] & 0xF
+
+
+# timer-start 0x35: run the timer for TIMER ticks of TIMER_PRESCALE cycles
+# (256 ticks if TIMER is 0), counted from the end of this instruction. TRUN
+# stays set until then; starting a running timer starts the count again.
+# The ISA's 0x38 is to-pc in this emulator, so timer-start moved here.
+def op_timer_start(emu, arg):
+    emu.cancel(EVENT_TIMER)
+    emu.regs[TRUN] = 1
+    ticks = (emu.regs[TIMER] & 0xFF) or 256
+    emu.schedule(emu.cycles + 1 + ticks * TIMER_PRESCALE, EVENT_TIMER)
+
+
+# to-pc 0x38
+def op_to_pc(emu, arg):
+    emu.regs[PC] = emu.regs[ACC]
+
+
+# timer-end 0x39: stop the timer without it expiring
+def op_timer_end(emu, arg):
+    emu.cancel(EVENT_TIMER)
+    emu.regs[TRUN] = 0
+
+
+# from-timerl 0x3A
+def op_from_timerl(emu, arg):
+    emu.regs[ACC] = emu.regs[TIMER] & 0x0F
+
+
+# from-timerh 0x3B
+def op_from_timerh(emu, arg):
+    emu.regs[ACC] = (emu.regs[TIMER] >> 4) & 0x0F
+
+
+# to-timerl 0x3C
+def op_to_timerl(emu, arg):
+    r = emu.regs
+    r[TIMER] = (r[TIMER] & 0xF0) | (r[ACC] & 0x0F)
+
+
+# to-timerh 0x3D
+def op_to_timerh(emu, arg):
+    r = emu.regs
+    r[TIMER] = ((r[ACC] & 0x0F) << 4) | (r[TIMER] & 0x0F)
+
+
+# nop 0x3E
+def op_nop(emu, arg):
+    pass
+
+
+# dec 0x3F
+def op_dec(emu, arg):
+    emu.regs[ACC] = (emu.regs[ACC] - 1) & 0xF
+
+
+# add <imm> 0x40
+def op_add_imm(emu, imm):
+    emu.regs[ACC] = (emu.regs[ACC] + (imm & 0x0F)) & 0xF
 
-        pyxel.init(80, 80, title="Arch-242 Snake Game")
-        pyxel.run(self.update, self.draw)
+
+# sub <imm> 0x41
+def op_sub_imm(emu, imm):
+    r = emu.regs
+    diff = r[ACC] - (imm & 0x0F)
+    r[CF] = 1 if diff < 0 else 0
+    r[ACC] = diff & 0xF
+
+
+# and <imm> 0x42
+def op_and_imm(emu, imm):
+    emu.regs[ACC] = emu.regs[ACC] & (imm & 0x0F)
+
+
+# xor <imm> 0x43
+def op_xor_imm(emu, imm):
+    emu.regs[ACC] = emu.regs[ACC] ^ (imm & 0x0F)
+
+
+# or <imm> 0x44
+def op_or_imm(emu, imm):
+    emu.regs[ACC] = emu.regs[ACC] | (imm & 0x0F)
+
+
+# timer <imm> 0x47 [2-byte instruction]: the whole operand byte goes to TIMER
+def op_timer_imm(emu, imm):
+    emu.regs[TIMER] = imm
+
+
+# call 0x4C [2-byte instruction]
+def op_call(emu, addr):
+    r = emu.regs
+    r[TEMP] = r[PC] + 2  # save return address
+    r[PC] = addr
+
+
+# reti 0x4D
+def op_reti(emu, arg):
+    r = emu.regs
+    r[PC] = r[TEMP]
+    r[TEMP] = 0
+
+
+# rarb <imm> 0x50 to 0x5F / rcrd <imm> 0x60 to 0x6F [2-byte instruction]:
+# the opcode's low nibble goes to RA (RC), the operand's to RB (RD). The
+# nibble in the opcode makes each of the 32 a handler of its own.
+def load_pair_op(first, second, x):
+    def op_load_pair(emu, imm):
+        r = emu.regs
+        r[first] = x
+        r[second] = imm & 0x0F
+    op_load_pair.__name__ = 'op_rarb' if first == RA else 'op_rcrd'
+    op_load_pair.pair = (first, second, x)
+    return op_load_pair
+
+
+RARB_OPS = [load_pair_op(RA, RB, x) for x in range(16)]
+RCRD_OPS = [load_pair_op(RC, RD, x) for x in range(16)]
+
+
+# acc <imm> 0x70 to 0x7F
+def op_acc_imm(emu, imm):
+    emu.regs[ACC] = imm
+
+
+# beqz <imm> 0xB0 to 0xB7
+def op_beqz(emu, target):
+    if emu.regs[ACC] == 0:
+        emu.regs[PC] = target
+
+
+# b-timer <imm> 0xD0 to 0xD7: branch while the timer runs
+def op_b_timer(emu, target):
+    if emu.regs[TRUN]:
+        emu.regs[PC] = target
+
+
+# b <imm> 0xE0 to 0xEF (8-bit target only)
+def op_b(emu, target):
+    emu.regs[PC] = target
+
+
+# In Harvard mode branches reach the whole ROM: the opcode's low 3 bits are
+# the target's upper bits, so like rarb/rcrd each opcode gets its own handler
+def far_branch_op(handler, high):
+    def op_far_branch(emu, low):
+        handler(emu, high | low)
+    op_far_branch.__name__ = handler.__name__
+    op_far_branch.far = (handler, high)
+    return op_far_branch
+
+
+FAR_BEQZ_OPS = [far_branch_op(op_beqz, high << 8) for high in range(8)]
+FAR_B_OPS = [far_branch_op(op_b, high << 8) for high in range(8)]
+FAR_B_TIMER_OPS = [far_branch_op(op_b_timer, high << 8) for high in range(8)]
+
+
+def op_unknown(emu, opcode):
+    raise ValueError(f"Unknown opcode: 0x{opcode:02X}")
+
+
+def build_decode_table(harvard=False):
+    # 256 entries of (handler, arg, length), indexed by opcode; harvard
+    # gives b and beqz their 11-bit targets
+    table = [(op_unknown, opcode, 1) for opcode in range(256)]
+
+    def put(opcode, handler, arg=None, length=1):
+        table[opcode] = (handler, arg, length)
+
+    put(0x00, op_rot_r)
+    put(0x01, op_rot_l)
+    put(0x02, op_rot_rc)
+    put(0x03, op_rot_lc)
+    put(0x04, op_from_mem, MBA)
+    put(0x05, op_to_mem, MBA)
+    put(0x06, op_from_mem, MDC)
+    put(0x07, op_to_mem, MDC)
+    put(0x08, op_addc_mba)
+    put(0x09, op_add_mba)
+    put(0x0A, op_subc_mba)
+    put(0x0B, op_sub_mba)
+    put(0x0C, op_inc_mem, MBA)
+    put(0x0D, op_dec_mem, MBA)
+    put(0x0E, op_inc_mem, MDC)
+    put(0x0F, op_dec_mem, MDC)
+
+    # inc*-reg matches every opcode in 0x10-0x14 (odd ones included),
+    # leaving only 0x15 for dec*-reg
+    for opcode in range(0x10, 0x15):
+        put(opcode, op_inc_reg, (opcode >> 1) & 0x7)
+    put(0x15, op_dec_reg, (0x15 >> 1) & 0x7)
+
+    for opcode in range(0x20, 0x2A):
+        reg = (opcode >> 1) & 0x7
+        put(opcode, op_from_reg if opcode & 1 else op_to_reg, reg)
+
+    put(0x2A, op_clr_cf)
+    put(0x2B, op_set_cf)
+    put(0x2E, op_ret)
+    put(0x2F, op_retc)
+    put(0x30, op_from_pa)
+    put(0x31, op_inc)
+    put(0x32, op_from_ioa)
+    put(0x35, op_timer_start)
+    put(0x38, op_to_pc)
+    put(0x39, op_timer_end)
+    put(0x3A, op_from_timerl)
+    put(0x3B, op_from_timerh)
+    put(0x3C, op_to_timerl)
+    put(0x3D, op_to_timerh)
+    put(0x3E, op_nop)
+    put(0x3F, op_dec)
+
+    put(0x40, op_add_imm, length=2)
+    put(0x41, op_sub_imm, length=2)
+    put(0x42, op_and_imm, length=2)
+    put(0x43, op_xor_imm, length=2)
+    put(0x44, op_or_imm, length=2)
+    put(0x47, op_timer_imm, length=2)
+    put(0x4C, op_call, length=2)
+    put(0x4D, op_reti)
+
+    for x in range(16):
+        put(0x50 | x, RARB_OPS[x], length=2)
+        put(0x60 | x, RCRD_OPS[x], length=2)
+    for opcode in range(0x70, 0x80):
+        put(opcode, op_acc_imm, opcode & 0x0F)
+    for opcode in range(0xB0, 0xB8):
+        put(opcode, FAR_BEQZ_OPS[opcode & 0x07] if harvard else op_beqz, length=2)
+    for opcode in range(0xD0, 0xD8):
+        put(opcode, FAR_B_TIMER_OPS[opcode & 0x07] if harvard else op_b_timer, length=2)
+    # 0xE8-0xEF alias 0xE0-0xE7 in Harvard mode
+    for opcode in range(0xE0, 0xF0):
+        put(opcode, FAR_B_OPS[opcode & 0x07] if harvard else op_b, length=2)
+
+    return table
+
+
+DECODE_TABLE = build_decode_table()
+HARVARD_DECODE_TABLE = build_decode_table(harvard=True)
+
+# handlers that can write memory, and those that end a basic block
+STORE_HANDLERS = {op_to_mem, op_inc_mem, op_dec_mem}
+BRANCH_HANDLERS = {op_b, op_beqz, op_b_timer, op_call, op_ret, op_retc, op_reti, op_to_pc,
+                   op_unknown, *FAR_BEQZ_OPS, *FAR_B_OPS, *FAR_B_TIMER_OPS}
+# handlers that read the cycle count or change the event queue. They end a
+# block, and run() steps such a block instead of dispatching it, so
+# emu.cycles is exact (the start of the instruction) when they run
+CYCLE_HANDLERS = {op_timer_start, op_timer_end}
+BLOCK_END_HANDLERS = BRANCH_HANDLERS | CYCLE_HANDLERS
+
+# flags in Arch242CPU.watch, one byte per memory address
+WATCH_CODE = 1      # covered by a cached block
+WATCH_DISPLAY = 2   # LED matrix row, see Arch242CPU.dirty_rows
+
+MAX_BLOCK_INSTRUCTIONS = 64
+JIT_THRESHOLD = 16    # block entries before the JIT compiles it
+SPIN_PROBE_LIMIT = 64    # instructions one trip round an idle loop may take
+
+
+class Block:
+    # A translated run of straight-line code starting at start, up to and
+    # including the first branch. The body is split into segments after
+    # each store so a self-modifying write can stop the block right there.
+    __slots__ = ('start', 'covered', 'segments', 'body_cycles', 'end_pc',
+                 'terminal', 'terminal_cycles', 'cycles', 'run_cycles',
+                 'entries', 'compiled', 'source')
+
+    def __init__(self, start):
+        self.start = start
+        self.covered = ()         # every memory address the block was decoded from
+        self.segments = []        # (ops, PC after the segment, body cycles so far)
+        self.body_cycles = 0
+        self.end_pc = start       # PC once the body has run
+        self.terminal = None      # (handler, arg) of the closing branch, if any
+        self.terminal_cycles = 0
+        self.cycles = 0
+        self.run_cycles = 0       # budget run() needs to dispatch it whole
+        self.entries = 0          # times run by the block interpreter
+        self.compiled = None      # JIT function, once the block is hot
+        self.source = None        # its generated Python source
+
+
+def translate_block(memory, start, table=DECODE_TABLE, pc_mask=0xFF):
+    # memory is where code is fetched from: the CPU's memory, or its ROM in
+    # Harvard mode (with the Harvard table and an 11-bit PC)
+    block = Block(start)
+    covered = []
+    ops = []
+    pc = start
+    cycles = 0
+    for _ in range(MAX_BLOCK_INSTRUCTIONS):
+        opcode = memory[pc]
+        handler, arg, length = table[opcode]
+        covered.append(pc)
+        if length == 2:
+            arg = memory[(pc + 1) & pc_mask]
+            covered.append((pc + 1) & pc_mask)
+        wrapped = pc + length > pc_mask
+        pc = (pc + length) & pc_mask
+        if handler in BLOCK_END_HANDLERS:
+            block.terminal = (handler, arg)
+            block.terminal_cycles = length
+            break
+        ops.append((handler, arg))
+        cycles += length
+        if handler in STORE_HANDLERS:
+            block.segments.append((tuple(ops), pc, cycles))
+            ops = []
+        if wrapped:
+            break
+    if ops:
+        block.segments.append((tuple(ops), pc, cycles))
+    block.covered = tuple(covered)
+    block.end_pc = pc
+    block.body_cycles = cycles
+    block.cycles = cycles + block.terminal_cycles
+    # a CYCLE_HANDLER needs emu.cycles exact, so run() always steps that block
+    timed = block.terminal is not None and block.terminal[0] in CYCLE_HANDLERS
+    block.run_cycles = NEVER if timed else block.cycles
+    return block
+
+
+# === JIT tier ===
+# Hot blocks are turned into Python source with registers held in locals,
+# register values known at compile time folded to constants, and compiled
+# with compile(). The generated code has the same effect as execute_block,
+# cycle counts and self-modifying stores included.
+
+JIT_LOCALS = ['ra', 'rb', 'rc', 'rd', 're', 'acc', 'cf', 'pc', 'temp', 'pa', 'ioa', 'timer', 'trun']
+
+
+def addr_expr(src):
+    reg_high, reg_low = src
+    return f"((({{{JIT_LOCALS[reg_high]}}} & 0x0F) << 4) | ({{{JIT_LOCALS[reg_low]}}} & 0x0F))"
+
+
+def rotate_c_lines(shift):
+    return [
+        "t = ({cf} << 4) | {acc}",
+        shift,
+        "cf = (t >> 4) & 1",
+        "acc = t & 0xF",
+    ]
+
+
+def store_lines(src, update):
+    return [f"a = {addr_expr(src)}", update, "STORE"]
+
+
+# handler -> spec(arg) returning (registers read, registers written, source
+# lines). Lines are str.format()ed with the read registers, so known values
+# are substituted as literals. A "STORE" line marks the watch check after a
+# memory write at address a.
+JIT_SPECS = {
+    op_rot_r: lambda arg: ((ACC,), (ACC,), ["acc = (({acc} >> 1) | (({acc} & 1) << 3)) & 0xF"]),
+    op_rot_l: lambda arg: ((ACC,), (ACC,), ["acc = (({acc} << 1) | (({acc} >> 3) & 1)) & 0xF"]),
+    op_rot_rc: lambda arg: ((ACC, CF), (ACC, CF),
+                            rotate_c_lines("t = ((t >> 1) | ((t & 1) << 4)) & 0x1F")),
+    op_rot_lc: lambda arg: ((ACC, CF), (ACC, CF),
+                            rotate_c_lines("t = ((t << 1) | ((t >> 4) & 1)) & 0x1F")),
+    op_from_mem: lambda src: (src, (ACC,), [f"acc = mem[{addr_expr(src)}] & 0xF"]),
+    op_to_mem: lambda src: (src + (ACC,), (), store_lines(src, "mem[a] = {acc} & 0xF")),
+    op_addc_mba: lambda arg: ((RB, RA, ACC, CF), (ACC, CF), [
+        f"t = {{acc}} + (mem[{addr_expr(MBA)}] & 0xF) + {{cf}}",
+        "acc = t & 0xF",
+        "cf = 1 if t > 0xF else 0",
+    ]),
+    op_add_mba: lambda arg: ((RB, RA, ACC), (ACC, CF), [
+        f"t = {{acc}} + (mem[{addr_expr(MBA)}] & 0xF)",
+        "acc = t & 0xF",
+        "cf = 1 if t > 0xF else 0",
+    ]),
+    op_subc_mba: lambda arg: ((RB, RA, ACC, CF), (ACC, CF), [
+        f"t = {{acc}} - (mem[{addr_expr(MBA)}] & 0xF) + {{cf}}",
+        "cf = 1 if t < 0 else 0",
+        "acc = t & 0xF",
+    ]),
+    op_sub_mba: lambda arg: ((RB, RA, ACC), (ACC, CF), [
+        f"t = {{acc}} - (mem[{addr_expr(MBA)}] & 0xF)",
+        "cf = 1 if t < 0 else 0",
+        "acc = t & 0xF",
+    ]),
+    op_inc_mem: lambda src: (src, (), store_lines(src, "mem[a] = (mem[a] + 1) & 0xF")),
+    op_dec_mem: lambda src: (src, (), store_lines(src, "mem[a] = (mem[a] - 1) & 0xF")),
+    op_inc_reg: lambda reg: ((reg,), (reg,), [f"{JIT_LOCALS[reg]} = ({{{JIT_LOCALS[reg]}}} + 1) & 0xF"]),
+    op_dec_reg: lambda reg: ((reg,), (reg,), [f"{JIT_LOCALS[reg]} = ({{{JIT_LOCALS[reg]}}} - 1) & 0xF"]),
+    op_to_reg: lambda reg: ((ACC,), (reg,), [f"{JIT_LOCALS[reg]} = {{acc}} & 0xF"]),
+    op_from_reg: lambda reg: ((reg,), (ACC,), [f"acc = {{{JIT_LOCALS[reg]}}} & 0xF"]),
+    op_clr_cf: lambda arg: ((), (CF,), ["cf = 0"]),
+    op_set_cf: lambda arg: ((), (CF,), ["cf = 1"]),
+    op_from_pa: lambda arg: ((PA,), (ACC,), ["acc = {pa} & 0xF"]),
+    op_inc: lambda arg: ((ACC,), (ACC,), ["acc = ({acc} + 1) & 0xF"]),
+    op_from_ioa: lambda arg: ((IOA,), (ACC,), ["acc = {ioa} & 0xF"]),
+    op_from_timerl: lambda arg: ((TIMER,), (ACC,), ["acc = {timer} & 0x0F"]),
+    op_from_timerh: lambda arg: ((TIMER,), (ACC,), ["acc = ({timer} >> 4) & 0x0F"]),
+    op_to_timerl: lambda arg: ((TIMER, ACC), (TIMER,), ["timer = ({timer} & 0xF0) | ({acc} & 0x0F)"]),
+    op_to_timerh: lambda arg: ((TIMER, ACC), (TIMER,), ["timer = (({acc} & 0x0F) << 4) | ({timer} & 0x0F)"]),
+    op_nop: lambda arg: ((), (), []),
+    op_dec: lambda arg: ((ACC,), (ACC,), ["acc = ({acc} - 1) & 0xF"]),
+    op_add_imm: lambda imm: ((ACC,), (ACC,), [f"acc = ({{acc}} + {imm & 0x0F}) & 0xF"]),
+    op_sub_imm: lambda imm: ((ACC,), (ACC, CF), [
+        f"t = {{acc}} - {imm & 0x0F}",
+        "cf = 1 if t < 0 else 0",
+        "acc = t & 0xF",
+    ]),
+    op_and_imm: lambda imm: ((ACC,), (ACC,), [f"acc = {{acc}} & {imm & 0x0F}"]),
+    op_xor_imm: lambda imm: ((ACC,), (ACC,), [f"acc = {{acc}} ^ {imm & 0x0F}"]),
+    op_or_imm: lambda imm: ((ACC,), (ACC,), [f"acc = {{acc}} | {imm & 0x0F}"]),
+    op_acc_imm: lambda imm: ((), (ACC,), [f"acc = {imm}"]),
+    op_timer_imm: lambda imm: ((), (TIMER,), [f"timer = {imm}"]),
+
+    # terminals; PC already holds the address after the branch
+    op_b: lambda target: ((), (PC,), [f"pc = {target}"]),
+    op_beqz: lambda target: ((ACC, PC), (PC,), [f"pc = {target} if {{acc}} == 0 else {{pc}}"]),
+    op_b_timer: lambda target: ((TRUN, PC), (PC,), [f"pc = {target} if {{trun}} else {{pc}}"]),
+    op_call: lambda addr: ((PC,), (PC, TEMP), ["temp = {pc} + 2", f"pc = {addr}"]),
+    op_ret: lambda arg: ((PC, TEMP), (PC, TEMP), ["pc = ({pc} & 0xF000) | ({temp} & 0x0FFF)", "temp = 0"]),
+    op_retc: lambda arg: ((PC, TEMP), (PC, TEMP, CF), [
+        "pc = ({pc} & 0xF000) | ({temp} & 0x0FFF)",
+        "cf = ({temp} >> 12) & 1",
+        "temp = 0",
+    ]),
+    op_reti: lambda arg: ((TEMP,), (PC, TEMP), ["pc = {temp}", "temp = 0"]),
+    op_to_pc: lambda arg: ((ACC,), (PC,), ["pc = {acc}"]),
+}
+
+
+def load_pair_spec(first, second, x):
+    return lambda imm: ((), (first, second), [f"{JIT_LOCALS[first]} = {x}",
+                                              f"{JIT_LOCALS[second]} = {imm & 0x0F}"])
+
+
+def far_branch_spec(handler, high):
+    return lambda low: JIT_SPECS[handler](high | low)
+
+
+for _op in RARB_OPS + RCRD_OPS:
+    JIT_SPECS[_op] = load_pair_spec(*_op.pair)
+for _op in FAR_BEQZ_OPS + FAR_B_OPS + FAR_B_TIMER_OPS:
+    JIT_SPECS[_op] = far_branch_spec(*_op.far)
+
+
+class FoldRegs:
+    # stand-in emu for running a handler on known register values
+    def __init__(self, known):
+        self.regs = [known.get(i, 0) for i in range(NUM_REGS)]
+
+
+def compile_block(block):
+    known = {}      # register -> value known at this point in the block
+    used = set()
+    written = set()
+    body = []
+
+    def emit(handler, arg, exit_pc, exit_cycles):
+        reads, writes, lines = JIT_SPECS[handler](arg)
+        used.update(reads)
+        written.update(writes)
+        folds = "STORE" not in lines and not any("mem[" in line for line in lines)
+        if folds and all(reg in known for reg in reads):
+            # every input is known: run the real handler and keep the results
+            emu = FoldRegs(known)
+            handler(emu, arg)
+            for reg in writes:
+                known[reg] = emu.regs[reg]
+                body.append(f"{JIT_LOCALS[reg]} = {emu.regs[reg]}")
+            return
+        values = {JIT_LOCALS[reg]: known.get(reg, JIT_LOCALS[reg]) for reg in reads}
+        for line in lines:
+            if line == "STORE":
+                body.extend([
+                    "if watch[a]:",
+                    "    emu.smc_hit = False",
+                    "    emu.watched_write(a)",
+                    "    if emu.smc_hit:",
+                    "        WRITEBACK",
+                    f"        r[{PC}] = {exit_pc}",
+                    f"        emu.cycles += {exit_cycles}",
+                    "        return",
+                ])
+            else:
+                body.append(line.format(**values))
+        for reg in writes:
+            known.pop(reg, None)
+
+    for ops, next_pc, cycles in block.segments:
+        for handler, arg in ops:
+            emit(handler, arg, next_pc, cycles)
+
+    # PC is never loaded: it is block.start on entry and end_pc before the
+    # terminal runs
+    known[PC] = block.end_pc
+    handler, arg = block.terminal or (None, None)
+    if handler is op_unknown:
+        body.extend([
+            "WRITEBACK",
+            f"r[{PC}] = {block.end_pc}",
+            f"emu.cycles += {block.body_cycles}",
+            f"raise ValueError({f'Unknown opcode: 0x{arg:02X}'!r})",
+        ])
+    else:
+        if handler is not None:
+            emit(handler, arg, None, None)
+        body.extend([
+            "WRITEBACK",
+            f"r[{PC}] = {known.get(PC, 'pc')}",
+            f"emu.cycles += {block.cycles}",
+        ])
+
+    # every register written is loaded up front, so the locals are always
+    # current and the same write-back works at every exit
+    loads = sorted((used | written) - {PC})
+    writeback = [f"r[{reg}] = {JIT_LOCALS[reg]}" for reg in sorted(written - {PC})]
+    lines = [f"def block_{block.start:02X}(emu):",
+             "    r = emu.regs",
+             "    mem = emu.memory",
+             "    watch = emu.watch"]
+    lines += [f"    {JIT_LOCALS[reg]} = r[{reg}]" for reg in loads if reg != PC]
+    for line in body:
+        indent = "    " + " " * (len(line) - len(line.lstrip()))
+        if line.strip() == "WRITEBACK":
+            lines += [indent + wb for wb in writeback]
+        else:
+            lines.append("    " + line)
+    source = "\n".join(lines) + "\n"
+
+    namespace = {}
+    exec(compile(source, f"<arch242 block 0x{block.start:02X}>", "exec"), namespace)
+    block.source = source
+    block.compiled = namespace[f"block_{block.start:02X}"]
+    return block.compiled
+
+
+# === Profiling ===
+# Opt-in: a CPU with a profile or an execution trace attached swaps in
+# step_instrumented/run_instrumented, so the normal step() and block/JIT
+# run() carry no instrumentation at all.
+
+RETURN_HANDLERS = {op_ret, op_retc, op_reti}
+
+
+class ExecutionProfile:
+    def __init__(self):
+        self.pc_counts = [0] * MEM_SIZE      # instructions executed per PC
+        self.pc_cycles = [0] * MEM_SIZE
+        self.pc_mask = 0xFF
+        self.opcode_counts = [0] * 256
+        self.branches = {}        # pc -> [taken, not taken]
+        self.stacks = {}          # (call target, ..., pc) -> cycles
+        self.call_stack = ()      # call targets, innermost last
+        self.frame_cycles = []    # filled by Arch242Emulator.frame()
+
+    def attach(self, cpu):
+        # one counter per code address: 256, or the whole ROM in Harvard mode
+        grow = len(cpu.code) - len(self.pc_counts)
+        if grow > 0:
+            self.pc_counts += [0] * grow
+            self.pc_cycles += [0] * grow
+        self.pc_mask = cpu.pc_mask
+
+    def record(self, pc, opcode, handler, length, next_pc):
+        self.pc_counts[pc] += 1
+        self.pc_cycles[pc] += length
+        self.opcode_counts[opcode] += 1
+        key = self.call_stack + (pc,)
+        self.stacks[key] = self.stacks.get(key, 0) + length
+        if handler in BRANCH_HANDLERS:
+            counts = self.branches.get(pc)
+            if counts is None:
+                counts = self.branches[pc] = [0, 0]
+            counts[next_pc == (pc + length) & self.pc_mask] += 1
+            if handler is op_call:
+                self.call_stack += (next_pc,)
+            elif handler in RETURN_HANDLERS and self.call_stack:
+                self.call_stack = self.call_stack[:-1]
+
+    def total_cycles(self):
+        return sum(self.pc_cycles)
+
+    def to_dict(self):
+        return {
+            'pc_counts': self.pc_counts,
+            'pc_cycles': self.pc_cycles,
+            'opcode_counts': self.opcode_counts,
+            'branches': {str(pc): counts for pc, counts in self.branches.items()},
+            'stacks': [[list(key), cycles] for key, cycles in self.stacks.items()],
+            'frame_cycles': self.frame_cycles,
+        }
+
+
+# === Execution trace ===
+# One fixed-width EXEC_RECORD per instruction, after a 32-byte header. The
+# CPU packs records into an in-memory chunk; full chunks go to a writer
+# thread through a bounded queue. If the disk falls behind and the queue is
+# full, the chunk is dropped and counted instead of blocking the CPU, and
+# the header's dropped count says so. exectrace.py reads the file back.
+
+EXEC_MAGIC = b'A24X'
+EXEC_VERSION = 1
+EXEC_HEADER = struct.Struct('<4sBxH8xQQ')    # magic, version, record size, records, dropped
+EXEC_RECORD = struct.Struct('<QHBBBBBBBBBBBBHHB5x')
+# cycle (before the instruction), pc, opcode, operand (2-byte ops), length,
+# then after it: acc, cf, ra, rb, rc, rd, re, pa, ioa, temp, then the memory
+# write address (EXEC_NO_WRITE if none) and value
+EXEC_NO_WRITE = 0xFFFF
+EXEC_CHUNK_RECORDS = 4096
+EXEC_QUEUE_CHUNKS = 64
+
+
+class ExecTraceWriter:
+    def __init__(self, path, chunk_records=EXEC_CHUNK_RECORDS, queue_chunks=EXEC_QUEUE_CHUNKS):
+        self.file = open(path, 'wb')
+        self.file.write(bytes(EXEC_HEADER.size))    # rewritten by close()
+        self.chunk_size = chunk_records * EXEC_RECORD.size
+        self.chunk = bytearray(self.chunk_size)
+        self.offset = 0
+        self.records = 0
+        self.dropped = 0
+        self.queue = queue.Queue(maxsize=queue_chunks)
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+        self.thread.start()
+
+    def drain(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            self.file.write(chunk)
+
+    def record(self, cpu, cycle, pc, opcode, operand, length, write_addr):
+        r = cpu.regs
+        if write_addr is None:
+            write_addr, value = EXEC_NO_WRITE, 0
+        else:
+            value = cpu.memory[write_addr]
+        EXEC_RECORD.pack_into(self.chunk, self.offset, cycle, pc, opcode, operand, length,
+                              r[ACC], r[CF], r[RA], r[RB], r[RC], r[RD], r[RE], r[PA], r[IOA],
+                              r[TEMP], write_addr, value)
+        self.offset += EXEC_RECORD.size
+        if self.offset == self.chunk_size:
+            self.flush_chunk()
+
+    def flush_chunk(self):
+        chunk = bytes(self.chunk[:self.offset])
+        count = self.offset // EXEC_RECORD.size
+        self.offset = 0
+        try:
+            self.queue.put_nowait(chunk)
+            self.records += count
+        except queue.Full:
+            self.dropped += count
+
+    def close(self):
+        if self.offset:
+            self.flush_chunk()
+        self.queue.put(None)
+        self.thread.join()
+        self.file.seek(0)
+        self.file.write(EXEC_HEADER.pack(EXEC_MAGIC, EXEC_VERSION, EXEC_RECORD.size,
+                                         self.records, self.dropped))
+        self.file.close()
+
+
+class RegisterFile:
+    # Name-keyed view over the register slots, for code that still says
+    # registers['ACC']. The CPU itself indexes regs[] directly.
+    __slots__ = ('regs',)
+
+    def __init__(self, regs):
+        self.regs = regs
+
+    def __getitem__(self, name):
+        return self.regs[REG_INDEX[name]]
+
+    def __setitem__(self, name, value):
+        self.regs[REG_INDEX[name]] = value
+
+    def __contains__(self, name):
+        return name in REG_INDEX
+
+    def __iter__(self):
+        return iter(REG_INDEX)
+
+    def get(self, name, default=None):
+        index = REG_INDEX.get(name)
+        return default if index is None else self.regs[index]
+
+    def items(self):
+        return [(name, self.regs[index]) for name, index in REG_INDEX.items()]
+
+
+# === Save states ===
+# save_state() is SAVE_HEADER, then memory + registers (STATE_SIZE bytes),
+# a count byte and that many pending events (SAVE_EVENT), then for
+# Arch242Emulator the game section (GAME_HEADER, the snake as one u32 cell
+# per segment, then the RNG's Mersenne Twister words).
+SAVE_MAGIC = b'A242'
+SAVE_VERSION = 2
+SAVE_HEADER = struct.Struct('<4sBBQ')       # magic, version, kind, cycles
+SAVE_EVENT = struct.Struct('<QB')           # cycle, kind
+GAME_HEADER = struct.Struct('<IHbbIBhhHHHI')
+# frame_count, delay_counter, direction, score, game_over, food (-1 if none),
+# board width, height, top, snake length
+RNG_HEADER = struct.Struct('<BBd')          # version, has gauss_next, gauss_next
+
+
+class Arch242CPU:
+    # Headless CPU core: memory, registers and the fetch/execute loop.
+    # Nothing here touches Pyxel, so it can run without a display.
+    SAVE_KIND = 0
+    def __init__(self, program=None, use_blocks=True, use_jit=True,
+                 jit_threshold=JIT_THRESHOLD, profile=None, harvard=False):
+        # memory and the register file share one buffer (see STATE_SIZE)
+        self.state = bytearray(STATE_SIZE)
+        view = memoryview(self.state)
+        self.memory = view[:MEM_SIZE]
+        self.regs = view[MEM_SIZE:].cast('H')
+        self.registers = RegisterFile(self.regs)
+        self.cycles = 0   # one cycle per instruction byte fetched
+
+        # code is fetched from self.code: memory itself, or in Harvard mode
+        # a separate ROM with an 11-bit PC. Data writes never reach the ROM,
+        # so its translated blocks stay valid until another program loads.
+        self.harvard = harvard
+        self.rom = bytearray(ROM_SIZE) if harvard else None
+        self.code = self.rom if harvard else self.memory
+        self.decode_table = HARVARD_DECODE_TABLE if harvard else DECODE_TABLE
+        self.pc_mask = ROM_PC_MASK if harvard else 0xFF
+
+        # peripheral events by cycle; next_event caches the earliest
+        self.events = EventQueue()
+        self.next_event = NEVER
+        self.timer_expiries = 0    # times the timer ran out, for frame pacing
+
+        # translation cache: run() executes whole blocks when use_blocks is set
+        self.use_blocks = use_blocks
+        self.use_jit = use_jit            # compile hot blocks to Python
+        self.jit_threshold = jit_threshold
+        self.block_cache = {}
+        self.watch = bytearray(MEM_SIZE)   # WATCH_* flags per address
+        self.smc_hit = False
+
+        # bit y set when display row y was written since the last render
+        self.dirty_rows = ALL_ROWS_DIRTY
+        for addr in DISPLAY_DIRTY:
+            self.watch[addr] |= WATCH_DISPLAY
+
+        self.profile = None
+        self.exec_trace = None
+        if profile is not None:
+            self.set_profile(profile)
+
+        if program is not None:
+            self.load_program(program)
+
+    def set_profile(self, profile):
+        # attach an ExecutionProfile (or None to detach)
+        self.profile = profile
+        if profile is not None:
+            profile.attach(self)
+        self.update_instrumentation()
+
+    def set_exec_trace(self, writer):
+        # attach an ExecTraceWriter (or None to detach)
+        self.exec_trace = writer
+        self.update_instrumentation()
+
+    def update_instrumentation(self):
+        # while anything is attached, step() and run() are the
+        # instrumented versions below
+        if self.profile is None and self.exec_trace is None:
+            self.__dict__.pop('step', None)
+            self.__dict__.pop('run', None)
+        else:
+            self.step = self.step_instrumented
+            self.run = self.run_instrumented
 
     def load_program(self, program):
-        for i, byte in enumerate(program):
-            self.memory[i] = byte
+        if self.harvard:
+            if len(program) > ROM_SIZE:
+                raise ValueError(f"Program is {len(program)} bytes, the ROM holds {ROM_SIZE}")
+            # a new ROM, a fork may still be running the old one
+            self.rom = bytearray(ROM_SIZE)
+            self.rom[:len(program)] = bytes(program)
+            self.code = self.rom
+        else:
+            if len(program) > MEM_SIZE:
+                raise ValueError(f"Program is {len(program)} bytes, memory is {MEM_SIZE} (try Harvard mode)")
+            self.memory[:len(program)] = bytes(program)
+        self.flush_blocks()
+        self.dirty_rows = ALL_ROWS_DIRTY
+
+    def replace_code(self, code, old_size=0):
+        # hot reload: the new program is written over the old one from
+        # address 0 (the tail of a longer old program is cleared). Memory
+        # past both, and the registers, are left as they are.
+        if self.harvard:
+            self.load_program(code)
+            return
+        end = max(len(code), old_size)
+        self.memory[:end] = bytes(code) + bytes(end - len(code))
+        self.flush_blocks()
+        self.dirty_rows = ALL_ROWS_DIRTY
+
+    def schedule(self, cycle, kind):
+        self.events.schedule(cycle, kind)
+        self.next_event = self.events.next_cycle()
+
+    def cancel(self, kind):
+        self.events.cancel(kind)
+        self.next_event = self.events.next_cycle()
+
+    def set_events(self, pending):
+        # replace the queue with pending, a list of (cycle, kind)
+        self.events = EventQueue(pending)
+        self.next_event = self.events.next_cycle()
+
+    def fire_events(self):
+        # run the handler of every event due by now
+        for cycle, kind in self.events.pop_due(self.cycles):
+            EVENT_HANDLERS[kind](self, cycle)
+        self.next_event = self.events.next_cycle()
+
+    def poke(self, addr, value):
+        # memory write from outside the CPU (frontend, loaders); keeps the
+        # translation cache coherent
+        self.memory[addr] = value
+        if self.watch[addr]:
+            self.watched_write(addr)
+
+    def watched_write(self, addr):
+        flags = self.watch[addr]
+        if flags & WATCH_DISPLAY:
+            self.dirty_rows |= DISPLAY_DIRTY[addr]
+        if flags & WATCH_CODE:
+            self.invalidate_code(addr)
+
+    def invalidate_code(self, addr):
+        # drop every cached block decoded from addr
+        cache = self.block_cache
+        stale = [block for block in cache.values() if addr in block.covered]
+        cleared = set()
+        for block in stale:
+            del cache[block.start]
+            cleared.update(block.covered)
+        watch = self.watch
+        for a in cleared:
+            watch[a] &= ~WATCH_CODE
+        for block in cache.values():
+            for a in block.covered:
+                if a in cleared:
+                    watch[a] |= WATCH_CODE
+        self.smc_hit = True
+
+    def flush_blocks(self):
+        self.block_cache.clear()
+        watch = self.watch
+        for a in range(MEM_SIZE):
+            watch[a] &= ~WATCH_CODE
+
+    def translate(self, pc):
+        block = translate_block(self.code, pc, self.decode_table, self.pc_mask)
+        self.block_cache[pc] = block
+        if not self.harvard:
+            watch = self.watch
+            for a in block.covered:
+                watch[a] |= WATCH_CODE
+        return block
+
+    def execute_block(self, block):
+        # run a translated block as one dispatch; same effect as stepping
+        # through it, including stopping right after a store into cached code
+        r = self.regs
+        self.smc_hit = False
+        for ops, next_pc, cycles in block.segments:
+            for handler, arg in ops:
+                handler(self, arg)
+            if self.smc_hit:
+                r[PC] = next_pc
+                self.cycles += cycles
+                return
+        self.cycles += block.body_cycles
+        r[PC] = block.end_pc
+        if block.terminal is not None:
+            handler, arg = block.terminal
+            handler(self, arg)
+            self.cycles += block.terminal_cycles
+
+    def state_view(self):
+        # zero-copy view of memory + registers, valid for the CPU's lifetime
+        return memoryview(self.state)
+
+    def snapshot(self):
+        return bytes(self.state)
+
+    def restore(self, snapshot, events=()):
+        # in-place, so memory/regs views stay valid; a snapshot of the
+        # wrong size raises instead of resizing the buffer. The snapshot
+        # holds no events: pending ones (cycle, kind) are passed separately.
+        if len(snapshot) != STATE_SIZE:
+            raise ValueError(f"Snapshot is {len(snapshot)} bytes, expected {STATE_SIZE}")
+        self.state[:] = snapshot
+        self.set_events(events)
+        if not self.harvard:
+            self.flush_blocks()
+        self.dirty_rows = ALL_ROWS_DIRTY
+
+    def state_hash(self):
+        return hashlib.blake2b(self.state, digest_size=16).hexdigest()
+
+    def save_state(self):
+        # compact binary save: header, cycles, memory + registers, events
+        pending = self.events.pending()
+        out = bytearray(SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, self.SAVE_KIND, self.cycles))
+        out += self.state
+        out.append(len(pending))
+        for cycle, kind in pending:
+            out += SAVE_EVENT.pack(cycle, kind)
+        return bytes(out)
+
+    def load_state(self, data):
+        # returns the bytes after the CPU section, for subclasses
+        if len(data) < SAVE_HEADER.size + STATE_SIZE + 1:
+            raise ValueError("Save state is truncated")
+        magic, version, kind, cycles = SAVE_HEADER.unpack_from(data)
+        if magic != SAVE_MAGIC or version != SAVE_VERSION:
+            raise ValueError(f"Not an Arch-242 save state (version {SAVE_VERSION})")
+        if kind != self.SAVE_KIND:
+            raise ValueError(f"Save state is for a different machine (kind {kind}, expected {self.SAVE_KIND})")
+        end = SAVE_HEADER.size + STATE_SIZE
+        count = data[end]
+        events_end = end + 1 + count * SAVE_EVENT.size
+        if len(data) < events_end:
+            raise ValueError("Save state is truncated")
+        pending = [SAVE_EVENT.unpack_from(data, end + 1 + i * SAVE_EVENT.size) for i in range(count)]
+        self.restore(data[SAVE_HEADER.size:end], pending)
+        self.cycles = cycles
+        return data[events_end:]
+
+    def fork(self):
+        # independent copy of a running machine. The translation cache is
+        # shared by reference until either side invalidates a block, so
+        # the fork starts hot.
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.state = bytearray(self.state)
+        view = memoryview(clone.state)
+        clone.memory = view[:MEM_SIZE]
+        clone.regs = view[MEM_SIZE:].cast('H')
+        clone.registers = RegisterFile(clone.regs)
+        if not self.harvard:
+            clone.code = clone.memory
+        clone.block_cache = dict(self.block_cache)
+        clone.watch = bytearray(self.watch)
+        clone.events = EventQueue(self.events.pending())
+        clone.profile = None
+        clone.set_exec_trace(None)
+        return clone
 
     def fetch(self):
-        pc = self.registers['PC']
-        opcode = self.memory[pc]
-        self.registers['PC'] = (self.registers['PC'] + 1) & 0xFF
+        pc = self.regs[PC]
+        opcode = self.code[pc]
+        self.regs[PC] = (pc + 1) & self.pc_mask
         return opcode
     
     def fetch_next_byte(self):
-        pc = self.registers['PC']
-        byte = self.memory[pc]
-        self.registers['PC'] = (pc + 1) & 0xFF  # PC is 8-bit for 256-byte memory
+        pc = self.regs[PC]
+        byte = self.code[pc]
+        self.regs[PC] = (pc + 1) & self.pc_mask  # PC is 8-bit for 256-byte memory, 11-bit for the ROM
         return byte
 
-    def spawn_food(self):
-        while True:
-            food = (random.randint(0, 9), random.randint(2, 18))
-            if food not in self.snake:
-                return food
-
-    def reset_snake_game(self):
-        self.snake = [(5, 10), (4, 10), (3, 10)]
-        self.direction = (1, 0)
-        self.food = self.spawn_food()
-        self.score = 0
-        self.game_over = False
-
     def execute(self, opcode):
+        handler, arg, length = self.decode_table[opcode]
+        if length == 2:
+            arg = self.fetch_next_byte()
+        handler(self, arg)
+
+    def step(self):
+        # execute one instruction, returns the cycles it took
+        if self.cycles >= self.next_event:
+            self.fire_events()
+        r = self.regs
+        pc = r[PC]
+        opcode = self.code[pc]
+        r[PC] = (pc + 1) & self.pc_mask
+        handler, arg, length = self.decode_table[opcode]
+        if length == 2:
+            arg = self.fetch_next_byte()
+        handler(self, arg)
+        self.cycles += length
+        return length
+
+    def step_instrumented(self):
+        r = self.regs
+        code = self.code
+        pc = r[PC]
+        opcode = code[pc]
+        handler, arg, length = self.decode_table[opcode]
+        cycle = self.cycles
+        # store address before the registers it comes from change
+        write_addr = get_addr(self, arg) if handler in STORE_HANDLERS else None
+        length = Arch242CPU.step(self)
+        if self.profile is not None:
+            self.profile.record(pc, opcode, handler, length, r[PC])
+        if self.exec_trace is not None:
+            operand = code[(pc + 1) & self.pc_mask] if length == 2 else 0
+            self.exec_trace.record(self, cycle, pc, opcode, operand, length, write_addr)
+        return length
+
+    def run_instrumented(self, max_cycles):
+        # one instruction at a time so every PC is seen
+        start = self.cycles
+        end = start + max_cycles
+        step = self.step_instrumented
+        while self.cycles < end:
+            step()
+        return self.cycles - start
+
+    def run(self, max_cycles):
+        # run until at least max_cycles have elapsed, returns cycles run
+        if not self.use_blocks:
+            return self.run_interpreted(max_cycles)
+        r = self.regs
+        cache = self.block_cache
+        start = self.cycles
+        end = start + max_cycles
+        while self.cycles < end:
+            if self.cycles >= self.next_event:
+                self.fire_events()
+            # whole blocks up to the next event; only a block ending in a
+            # CYCLE_HANDLER can schedule one, and that block is stepped
+            limit = self.next_event if self.next_event < end else end
+            while self.cycles < limit:
+                pc = r[PC]
+                block = cache.get(pc)
+                if block is None:
+                    block = self.translate(pc)
+                if self.cycles + block.run_cycles > limit:
+                    # not enough budget for the whole block, an event falls
+                    # inside it, or it ends in a CYCLE_HANDLER: step through
+                    # it, up to the limit exactly
+                    stop = min(limit, self.cycles + block.cycles)
+                    while self.cycles < stop:
+                        self.step()
+                    break
+                if block.compiled is not None:
+                    block.compiled(self)
+                    continue
+                block.entries += 1
+                if self.use_jit and block.entries >= self.jit_threshold:
+                    compile_block(block)
+                self.execute_block(block)
+        return self.cycles - start
+
+    def run_interpreted(self, max_cycles):
+        # one instruction per dispatch, no translation cache
+        code = self.code
+        pc_mask = self.pc_mask
+        r = self.regs
+        table = self.decode_table
+        fetch_next_byte = self.fetch_next_byte
+        start = self.cycles
+        cycles = start
+        end = start + max_cycles
+        try:
+            while cycles < end:
+                if cycles >= self.next_event:
+                    self.cycles = cycles
+                    self.fire_events()
+                limit = self.next_event if self.next_event < end else end
+                while cycles < limit:
+                    pc = r[PC]
+                    opcode = code[pc]
+                    r[PC] = (pc + 1) & pc_mask
+                    handler, arg, length = table[opcode]
+                    if length == 2:
+                        arg = fetch_next_byte()
+                    if handler in CYCLE_HANDLERS:
+                        # it reads the cycle count and may move next_event
+                        self.cycles = cycles
+                        handler(self, arg)
+                        cycles += length
+                        break
+                    handler(self, arg)
+                    cycles += length
+        finally:
+            self.cycles = cycles
+        return cycles - start
+
+    def run_until(self, pc=None, predicate=None, max_cycles=None):
+        # run until PC reaches pc or predicate(cpu) is true, checked before
+        # each instruction. Returns False if max_cycles ran out first.
+        r = self.regs
+        end = None if max_cycles is None else self.cycles + max_cycles
+        while True:
+            if pc is not None and r[PC] == pc:
+                return True
+            if predicate is not None and predicate(self):
+                return True
+            if end is not None and self.cycles >= end:
+                return False
+            self.step()
+
+    def spin_loop_cycles(self, limit=SPIN_PROBE_LIMIT, until=NEVER):
+        # Step until PC comes back to where it started. If the whole machine
+        # state is then unchanged (a self-branch, or a poll loop on from-ioa /
+        # from-pa that only new input can break), the CPU is idle: returns the
+        # cycles one trip takes. Otherwise 0. The probe itself really runs,
+        # and like run() it stops on the first boundary at or past `until`.
+        start_pc = self.regs[PC]
+        before = bytes(self.state)
+        start = self.cycles
+        for _ in range(limit):
+            if self.cycles >= until:
+                return 0
+            self.step()
+            if self.regs[PC] == start_pc:
+                return self.cycles - start if self.state == before else 0
+        return 0
+
+    # Original if/elif decoder, kept as the reference implementation for
+    # benchmarks and for checking the decode table against
+    def execute_reference(self, opcode):
         # helper to get memory address from 2 registers: upper nibble first
         def get_addr(reg_high, reg_low):
             return ((self.registers[reg_high] & 0x0F) << 4) | (self.registers[reg_low] & 0x0F)
@@ -321,6 +1668,18 @@ class Arch242Emulator:
         elif opcode == 0x3F:
             self.registers['ACC'] = (self.registers['ACC'] - 1) & 0xF
 
+        # rarb <imm> (0x50–0x5F): RA = opcode low nibble, RB = operand
+        elif 0x50 <= opcode <= 0x5F:
+            imm = self.fetch_next_byte() & 0x0F
+            self.registers['RA'] = opcode & 0x0F
+            self.registers['RB'] = imm
+
+        # rcrd <imm> (0x60–0x6F): RC = opcode low nibble, RD = operand
+        elif 0x60 <= opcode <= 0x6F:
+            imm = self.fetch_next_byte() & 0x0F
+            self.registers['RC'] = opcode & 0x0F
+            self.registers['RD'] = imm
+
         # acc <imm>
         elif 0x70 <= opcode <= 0x7F:
             self.registers['ACC'] = opcode & 0x0F
@@ -337,65 +1696,340 @@ class Arch242Emulator:
             self.registers['PC'] = target
             # print(f"b <imm>: Jumping to {target:02X}")
 
-        # # timer-start 0x38
-        # elif opcode == 0x38:
-        #     self.timer_running = True
+        # timer-start 0x35 (0x38 is to-pc above)
+        elif opcode == 0x35:
+            self.cancel(EVENT_TIMER)
+            self.registers['TRUN'] = 1
+            ticks = (self.registers['TIMER'] & 0xFF) or 256
+            self.schedule(self.cycles + 1 + ticks * TIMER_PRESCALE, EVENT_TIMER)
 
-        # # timer-end 0x39
-        # elif opcode == 0x39:
-        #     self.timer_running = False
+        # timer-end 0x39
+        elif opcode == 0x39:
+            self.cancel(EVENT_TIMER)
+            self.registers['TRUN'] = 0
 
-        # # from-timerl 0x3A
-        # elif opcode == 0x3A:
-        #     self.registers['ACC'] = self.registers['TIMER'] & 0x0F
+        # from-timerl 0x3A
+        elif opcode == 0x3A:
+            self.registers['ACC'] = self.registers['TIMER'] & 0x0F
 
-        # # from-timerh 0x3B
-        # elif opcode == 0x3B:
-        #     self.registers['ACC'] = (self.registers['TIMER'] >> 4) & 0x0F
+        # from-timerh 0x3B
+        elif opcode == 0x3B:
+            self.registers['ACC'] = (self.registers['TIMER'] >> 4) & 0x0F
 
-        # # to-timerl 0x3C
-        # elif opcode == 0x3C:
-        #     self.registers['TIMER'] = (self.registers['TIMER'] & 0xF0) | (self.registers['ACC'] & 0x0F)
+        # to-timerl 0x3C
+        elif opcode == 0x3C:
+            self.registers['TIMER'] = (self.registers['TIMER'] & 0xF0) | (self.registers['ACC'] & 0x0F)
 
-        # # to-timerh 0x3D
-        # elif opcode == 0x3D:
-        #     self.registers['TIMER'] = ((self.registers['ACC'] & 0x0F) << 4) | (self.registers['TIMER'] & 0x0F)
+        # to-timerh 0x3D
+        elif opcode == 0x3D:
+            self.registers['TIMER'] = ((self.registers['ACC'] & 0x0F) << 4) | (self.registers['TIMER'] & 0x0F)
 
-        # # timer <imm> 0x47
-        # elif opcode == 0x47:
-        #     imm = self.fetch_next_byte() & 0x0F
-        #     self.registers['TIMER'] = imm
+        # timer <imm> 0x47
+        elif opcode == 0x47:
+            self.registers['TIMER'] = self.fetch_next_byte()
 
-        # # b-timer <imm> 0xD0–0xD7
-        # elif 0xD0 <= opcode <= 0xD7:
-        #     target = self.fetch_next_byte()
-        #     if self.timer_running:
-        #         self.registers['PC'] = target
+        # b-timer <imm> 0xD0–0xD7
+        elif 0xD0 <= opcode <= 0xD7:
+            target = self.fetch_next_byte()  # 8-bit only
+            if self.registers['TRUN']:
+                self.registers['PC'] = target
 
         else:
             raise ValueError(f"Unknown opcode: 0x{opcode:02X}")
 
-    def update(self):
-        # if self.timer_running:
-        #     if not hasattr(self, 'timer_tick_counter'):
-        #         self.timer_tick_counter = 0
-        #     self.timer_tick_counter += 1
-        #     if self.timer_tick_counter >= 4:
-        #         self.timer_tick_counter = 0
-        #         self.registers['TIMER'] = (self.registers['TIMER'] + 1) & 0xFF
-        #         self.registers['PC'] = 0x04  # Reset PC to 0x04 when timer ticks
 
-        if pyxel.btnp(pyxel.KEY_R):
-            self.registers['PC'] = 0
-            self.delay_counter = 0
+# === Clock scheduling ===
+# A frontend calls ClockScheduler.run_frame() once per host frame instead of
+# stepping a fixed instruction count. Cycles run in slices; between slices
+# the machine state (minus PC) is compared with the previous slice, and if it
+# has not moved, spin_loop_cycles() confirms an idle loop and the rest of the
+# frame, or the cycles up to the next timer event if that comes first, is
+# skipped in whole loop trips. Nothing else can change before the next
+# frame's input, so skipping is exact: every frame ends on the same cycle
+# and state as with skip_idle=False. A frame that ends past its budget (a
+# 2-byte instruction across the boundary) has the next frame owe that much
+# less.
+
+DEFAULT_CLOCK_HZ = 600     # about the old 10 instructions per 30 fps frame
+SCHEDULER_SLICE = 64       # most cycles between idle checks
+SLICES_PER_FRAME = 4       # fewer on slow clocks, so a frame still gets checks
+MIN_SLICE = 4
+PC_OFFSET = MEM_SIZE + 2 * PC   # PC's bytes in Arch242CPU.state
+
+
+class ClockScheduler:
+    def __init__(self, clock_hz=DEFAULT_CLOCK_HZ, fps=30, host_share=0.5,
+                 max_backlog_frames=2, realtime=True, clock=time.perf_counter,
+                 skip_idle=True):
+        self.clock_hz = clock_hz
+        self.cycles_per_frame = clock_hz / fps
+        self.slice = max(MIN_SLICE, min(SCHEDULER_SLICE, int(self.cycles_per_frame) // SLICES_PER_FRAME))
+        self.skip_idle = skip_idle
+        self.host_budget = host_share / fps     # seconds of host time per frame
+        self.max_backlog = int(max_backlog_frames * self.cycles_per_frame)
+        self.realtime = realtime    # False: never consult the host clock
+        self.clock = clock
+        self.credit = 0.0           # fractional cycles owed
+        self.backlog = 0            # cycles carried into the next frame, < 0 if overrun
+        # totals
+        self.frames = 0
+        self.cycles_run = 0
+        self.idle_cycles = 0        # fast-forwarded through idle loops
+        self.late_cycles = 0        # ran one or more frames late
+        self.dropped_cycles = 0     # over max_backlog, never run
+
+    def run_frame(self, cpu):
+        self.credit += self.cycles_per_frame
+        owed = int(self.credit)
+        self.credit -= owed
+        late = max(0, self.backlog)
+        owed += self.backlog
+
+        deadline = self.clock() + self.host_budget if self.realtime else None
+        state = cpu.state
+        start = cpu.cycles
+        end = start + owed
+        last = bytes(state)
+        while cpu.cycles < end:
+            cpu.run(min(self.slice, end - cpu.cycles))
+            if cpu.cycles >= end:
+                break
+            if deadline is not None and self.clock() > deadline:
+                break
+            if not self.skip_idle:
+                continue
+            now = bytes(state)
+            if now[:PC_OFFSET] == last[:PC_OFFSET] \
+                    and now[PC_OFFSET + 2:] == last[PC_OFFSET + 2:]:
+                trip = cpu.spin_loop_cycles(until=end)
+                if trip:
+                    # every trip skipped ends by the event, so each branch
+                    # it contains would still have seen the state before it
+                    horizon = min(end, cpu.next_event)
+                    skip = max(0, horizon - cpu.cycles) // trip * trip
+                    cpu.cycles += skip
+                    self.idle_cycles += skip
+                now = bytes(state)
+            last = now
+
+        remaining = end - cpu.cycles
+        self.backlog = min(remaining, self.max_backlog)
+        self.dropped_cycles += max(0, remaining - self.backlog)
+        self.late_cycles += min(late, cpu.cycles - start)
+        self.cycles_run += cpu.cycles - start
+        self.frames += 1
+
+    def stats(self):
+        return {
+            'clock_hz': self.clock_hz,
+            'frames': self.frames,
+            'cycles': self.cycles_run,
+            'idle': self.idle_cycles,
+            'late': self.late_cycles,
+            'dropped': self.dropped_cycles,
+            'backlog': self.backlog,
+        }
+
 
-        for _ in range(10):
-            pc_snapshot = self.registers['PC']
-            opcode = self.fetch()
+# === Snake board ===
+# Cells are numbered row-major from (0, top). The body is a deque (head on
+# the left), occupied[] has one flag per cell and free/slot form an index of
+# the empty cells (swap-remove), so collision checks, moves and food spawns
+# are O(1) whatever the board size or snake length.
+
+BOARD_WIDTH, BOARD_HEIGHT = 10, 17
+BOARD_TOP = 2      # rows above the board are the score bar
+
+
+class SnakeBoard:
+    def __init__(self, width=BOARD_WIDTH, height=BOARD_HEIGHT, top=BOARD_TOP):
+        self.width = width
+        self.height = height
+        self.top = top
+        self.reset()
+
+    def start_body(self):
+        x, y = self.width // 2, self.top + self.height // 2
+        return [((x - i) % self.width, y) for i in range(3)]
+
+    def reset(self, body=None):
+        cells = self.width * self.height
+        self.body = deque()
+        self.occupied = bytearray(cells)
+        self.free = list(range(cells))
+        self.slot = list(range(cells))      # cell -> position in free
+        for x, y in body or self.start_body():
+            self.body.append((x, y))
+            self.occupy(self.cell(x, y))
+
+    def cell(self, x, y):
+        return (y - self.top) * self.width + x
+
+    def occupy(self, cell):
+        self.occupied[cell] = 1
+        free, slot = self.free, self.slot
+        i = slot[cell]
+        last = free.pop()
+        if last != cell:
+            free[i] = last
+            slot[last] = i
+
+    def vacate(self, cell):
+        self.occupied[cell] = 0
+        self.slot[cell] = len(self.free)
+        self.free.append(cell)
+
+    def __contains__(self, pos):
+        return self.occupied[self.cell(*pos)] == 1
+
+    def head(self):
+        return self.body[0]
+
+    def next_head(self, direction):
+        x, y = self.body[0]
+        dx, dy = direction
+        return ((x + dx) % self.width, (y + dy - self.top) % self.height + self.top)
+
+    def push_head(self, pos):
+        self.body.appendleft(pos)
+        self.occupy(self.cell(*pos))
+
+    def pop_tail(self):
+        pos = self.body.pop()
+        self.vacate(self.cell(*pos))
+        return pos
+
+    def random_free(self, rng):
+        # uniform over the empty cells, None when the board is full
+        if not self.free:
+            return None
+        cell = self.free[rng.randrange(len(self.free))]
+        return (cell % self.width, cell // self.width + self.top)
+
+
+class Arch242Emulator(Arch242CPU):
+    # CPU plus the snake game and the per-frame I/O glue. Still headless:
+    # frame() takes the keys held this frame instead of polling Pyxel.
+    SAVE_KIND = 1
+    def __init__(self, program, instructions_per_frame=10, seed=None, scheduler=None,
+                 board_width=BOARD_WIDTH, board_height=BOARD_HEIGHT, **cpu_options):
+        super().__init__(program, **cpu_options)
+        self.instructions_per_frame = instructions_per_frame
+        self.scheduler = scheduler   # ClockScheduler, or None for a fixed instruction count
+        self.frame_count = 0
+        self.delay_counter = 0
+        self.seed = seed
+        self.rng = random.Random(seed)   # food placement
+        self.recording = None            # InputTrace being recorded, see frame()
 
-            self.execute(opcode)
+        # === SnakeGame State ===
+        self.board = SnakeBoard(board_width, board_height)
+        self.direction = (1, 0)
+        self.food = self.spawn_food()
+        self.score = 0
+        self.game_over = False
+        # ========================
+
+    @property
+    def snake(self):
+        # head first
+        return self.board.body
+
+    def game_state(self):
+        # everything the snake logic needs besides the CPU, as plain values
+        board = self.board
+        return (self.frame_count, self.delay_counter, self.direction, self.score,
+                self.game_over, self.food, board.width, board.height, board.top,
+                tuple(board.body))
+
+    def set_game_state(self, game):
+        (self.frame_count, self.delay_counter, self.direction, self.score,
+         self.game_over, self.food, width, height, top, body) = game
+        board = self.board
+        if (board.width, board.height, board.top) != (width, height, top):
+            board = self.board = SnakeBoard(width, height, top)
+        board.reset(body)
+
+    def save_state(self):
+        (frame_count, delay_counter, (dx, dy), score, game_over, food,
+         width, height, top, body) = self.game_state()
+        fx, fy = food if food is not None else (-1, -1)
+        cells = array('I', ((y - top) * width + x for x, y in body))
+        version, words, gauss = self.rng.getstate()
+        return b''.join([
+            super().save_state(),
+            GAME_HEADER.pack(frame_count, delay_counter, dx, dy, score, game_over,
+                             fx, fy, width, height, top, len(cells)),
+            cells.tobytes(),
+            RNG_HEADER.pack(version, gauss is not None, gauss or 0.0),
+            array('I', words).tobytes(),
+        ])
+
+    def load_state(self, data):
+        rest = super().load_state(data)
+        (frame_count, delay_counter, dx, dy, score, game_over,
+         fx, fy, width, height, top, length) = GAME_HEADER.unpack_from(rest)
+        offset = GAME_HEADER.size
+        cells = array('I')
+        cells.frombytes(rest[offset:offset + 4 * length])
+        offset += 4 * length
+        version, has_gauss, gauss = RNG_HEADER.unpack_from(rest, offset)
+        words = array('I')
+        words.frombytes(rest[offset + RNG_HEADER.size:])
+        body = tuple((cell % width, cell // width + top) for cell in cells)
+        food = (fx, fy) if fx >= 0 else None
+        self.set_game_state((frame_count, delay_counter, (dx, dy), score, bool(game_over),
+                             food, width, height, top, body))
+        self.rng.setstate((version, tuple(words), gauss if has_gauss else None))
+        return b''
+
+    def fork(self):
+        clone = super().fork()
+        clone.rng = random.Random()
+        clone.rng.setstate(self.rng.getstate())
+        clone.board = SnakeBoard(self.board.width, self.board.height, self.board.top)
+        clone.board.reset(self.board.body)
+        if self.scheduler is not None:
+            clone.scheduler = copy.copy(self.scheduler)
+        return clone
+
+    def spawn_food(self):
+        return self.board.random_free(self.rng)
+
+    def reset_snake_game(self):
+        self.board.reset()
+        self.direction = (1, 0)
+        self.food = self.spawn_food()
+        self.score = 0
+        self.game_over = False
+
+    def frame(self, keys=()):
+        # keys: held directions ('up', 'down', 'left', 'right') plus
+        # 'reset' on the frame R was pressed
+        start = self.cycles
+        halted = False
+        try:
+            self.update_frame(keys)
+        except (ValueError, IndexError):
+            halted = True
+            raise
+        finally:
+            # recorded even when the CPU halts, so a replay halts too
+            if self.recording is not None:
+                mask = key_mask(keys) | (TRACE_HALTED if halted else 0)
+                self.recording.frames.append((mask, self.cycles - start))
+        self.frame_count += 1
+        if self.profile is not None:
+            self.profile.frame_cycles.append(self.cycles - start)
+
+    def run_fixed_instructions(self):
+        # original pacing: instructions_per_frame instructions, whatever
+        # they cost
+        for _ in range(self.instructions_per_frame):
+            pc_snapshot = self.regs[PC]
+            self.step()
             
-            if pc_snapshot == self.registers['PC']:
+            if pc_snapshot == self.regs[PC]:
                 self.delay_counter += 1
                 if self.delay_counter > 300:
                     # print(f"[Warning] Looping at PC = 0x{pc_snapshot:02X} (likely intentional)")
@@ -403,46 +2037,71 @@ class Arch242Emulator:
             else:
                 self.delay_counter = 0
 
+    def update_frame(self, keys):
+        if 'reset' in keys:
+            self.regs[PC] = 0
+            self.delay_counter = 0
+
+        expiries = self.timer_expiries
+        if self.scheduler is not None:
+            self.scheduler.run_frame(self)
+        else:
+            self.run_fixed_instructions()
+
         # === Python Snake Logic ===
         if self.game_over:
-            if pyxel.btnp(pyxel.KEY_R):
+            if 'reset' in keys:
                 self.reset_snake_game()
             return
 
-        if pyxel.frame_count % 8 != 0:
+        # A program that runs the timer sets the pace in emulated time: one
+        # move per expiry this frame. Otherwise every 8th frame.
+        if self.timer_expiries or self.regs[TRUN]:
+            moves = self.timer_expiries - expiries
+        else:
+            moves = 1 if self.frame_count % 8 == 0 else 0
+        if not moves:
             return
+        for _ in range(moves):
+            if not self.move_snake(keys):
+                return
 
+        self.draw_frame(keys)
+
+    def move_snake(self, keys):
+        # one step of the snake; False once it has run into itself
         dx, dy = self.direction
 
-        if pyxel.btn(pyxel.KEY_RIGHT) and (dx, dy) != (-1, 0):
+        if 'right' in keys and (dx, dy) != (-1, 0):
             self.direction = (1, 0)
-        elif pyxel.btn(pyxel.KEY_LEFT) and (dx, dy) != (1, 0):
+        elif 'left' in keys and (dx, dy) != (1, 0):
             self.direction = (-1, 0)
-        elif pyxel.btn(pyxel.KEY_DOWN) and (dx, dy) != (0, -1):
+        elif 'down' in keys and (dx, dy) != (0, -1):
             self.direction = (0, 1)
-        elif pyxel.btn(pyxel.KEY_UP) and (dx, dy) != (0, 1):
+        elif 'up' in keys and (dx, dy) != (0, 1):
             self.direction = (0, -1)
 
-        head_x, head_y = self.snake[0]
-        dx, dy = self.direction
-        new_head = ((head_x + dx) % 10, (head_y + dy - 2) % 17 + 2)
+        board = self.board
+        new_head = board.next_head(self.direction)
 
-        if new_head in self.snake:
+        if new_head in board:
             self.game_over = True
-            return
+            return False
 
-        self.snake.insert(0, new_head)
+        board.push_head(new_head)
 
         if new_head == self.food:
             self.score += 1
             self.food = self.spawn_food()
         else:
-            self.snake.pop()
+            board.pop_tail()
+        return True
         # ====================
 
-        # Clear frame memory area
-        for row in range(20):
-            self.memory[0x80 + row] = 0
+    def draw_frame(self, keys):
+        # Rebuild the frame memory area, writing only rows that change so
+        # the renderer redraws only those
+        rows = [0] * DISPLAY_ROWS
 
         # Read snake length
         # length = self.memory[0xA1]  # Snake length
@@ -462,23 +2121,387 @@ class Arch242Emulator:
                 break
             x = self.memory[addr_x]
             y = self.memory[addr_y]
-            if 0 <= x < 10 and 0 <= y < 20:
-                self.memory[0x80 + y] |= (1 << x)
+            if 0 <= x < DISPLAY_COLS and 0 <= y < DISPLAY_ROWS:
+                rows[y] |= 1 << x
+
+        # columns 0-7 to the rows, 8-9 packed into the high bank
+        high = [0] * (DISPLAY_ROWS // 4)
+        for row in range(DISPLAY_ROWS):
+            if self.memory[DISPLAY_BASE + row] != rows[row] & 0xFF:
+                self.poke(DISPLAY_BASE + row, rows[row] & 0xFF)
+            high[row // 4] |= (rows[row] >> 8) << 2 * (row % 4)
+        for i, value in enumerate(high):
+            if self.memory[DISPLAY_HIGH_BASE + i] != value:
+                self.poke(DISPLAY_HIGH_BASE + i, value)
 
         direction = 0
-        if pyxel.btn(pyxel.KEY_UP):
+        if 'up' in keys:
             direction = 3
-        elif pyxel.btn(pyxel.KEY_DOWN):
+        elif 'down' in keys:
             direction = 1
-        elif pyxel.btn(pyxel.KEY_LEFT):
+        elif 'left' in keys:
             direction = 2
-        elif pyxel.btn(pyxel.KEY_RIGHT):
+        elif 'right' in keys:
             direction = 0
-        self.memory[0x90] = direction
-        self.registers['PA'] = direction
+        self.poke(0x90, direction)
+        self.regs[PA] = direction
+
+
+class RewindBuffer:
+    # Last `capacity` frames of an Arch242Emulator, oldest dropped first.
+    # Each entry keeps the registers, cycle count, pending events and game
+    # state of its frame plus a backward memory delta (address, old byte
+    # pairs) to the frame before it; full memory is kept only for the newest
+    # frame. Rewinding k frames applies k small deltas through poke(), so
+    # cached blocks for untouched code survive.
+    def __init__(self, emu, capacity=600):
+        self.emu = emu
+        self.entries = deque(maxlen=capacity)
+        self.memory = None          # memory of the newest entry
+        self.rng_state = None       # shared between entries until it changes
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self):
+        # call once per frame, after emu.frame()
+        emu = self.emu
+        memory = bytes(emu.memory)
+        delta = b''
+        if self.memory is not None and memory != self.memory:
+            old = self.memory
+            delta = bytes(b for addr in range(MEM_SIZE) if old[addr] != memory[addr]
+                          for b in (addr, old[addr]))
+        self.memory = memory
+        rng_state = emu.rng.getstate()
+        if rng_state == self.rng_state:
+            rng_state = self.rng_state
+        self.rng_state = rng_state
+        self.entries.append((bytes(emu.state[MEM_SIZE:]), emu.cycles, emu.events.pending(),
+                             emu.game_state(), rng_state, delta))
+
+    def rewind(self, frames=1):
+        # restore the machine to `frames` recordings ago (0 = the newest).
+        # Returns how many frames it went back.
+        frames = min(frames, len(self.entries) - 1)
+        if frames < 0:
+            return 0
+        memory = bytearray(self.memory)
+        for _ in range(frames):
+            delta = self.entries.pop()[5]
+            for i in range(0, len(delta), 2):
+                memory[delta[i]] = delta[i + 1]
+        regs, cycles, events, game, rng_state, _ = self.entries[-1]
+        self.memory = bytes(memory)
+        self.rng_state = rng_state
+
+        emu = self.emu
+        for addr in range(MEM_SIZE):
+            if emu.memory[addr] != memory[addr]:
+                emu.poke(addr, memory[addr])
+        emu.state[MEM_SIZE:] = regs
+        emu.cycles = cycles
+        emu.set_events(events)
+        emu.set_game_state(game)
+        emu.rng.setstate(rng_state)
+        return frames
+
+
+# === Input traces ===
+# A trace is everything outside the CPU that a run depends on: the RNG seed,
+# the program's hash, how frames are paced, and per frame the keys held and
+# the cycles the CPU ran. The keys drive every input write (PA, 0x90 and the
+# snake's direction), so replaying them with the same cycle counts
+# reproduces the run exactly, whatever the host speed was when recording.
+# Frames are run-length encoded as (count, key mask, cycles) varint runs.
+
+TRACE_MAGIC = b'A24T'
+TRACE_VERSION = 2
+TRACE_HEADER = struct.Struct('<4sBQ32sHHHBI')
+# magic, version, seed, program sha256, instructions_per_frame (0 = clock
+# paced), board width, board height, Harvard mode, frames
+KEY_BITS = {'up': 1, 'down': 2, 'left': 4, 'right': 8, 'reset': 16}
+TRACE_HALTED = 0x80     # in the key mask: the CPU halted during this frame
+
+
+def key_mask(keys):
+    mask = 0
+    for key in keys:
+        mask |= KEY_BITS[key]
+    return mask
+
+
+def mask_keys(mask):
+    return frozenset(key for key, bit in KEY_BITS.items() if mask & bit)
+
+
+def put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def get_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class InputTrace:
+    def __init__(self, seed, program_hash, instructions_per_frame, board_width, board_height,
+                 harvard=False):
+        self.seed = seed
+        self.program_hash = program_hash     # sha256 digest, 32 bytes
+        self.instructions_per_frame = instructions_per_frame
+        self.board_width = board_width
+        self.board_height = board_height
+        self.harvard = harvard               # the program ran from the ROM
+        self.frames = []          # (key mask, cycles) per frame
+
+    @classmethod
+    def for_emulator(cls, emu, program):
+        if emu.seed is None:
+            raise ValueError("Recording needs a seeded emulator (seed=...)")
+        paced = 0 if emu.scheduler is not None else emu.instructions_per_frame
+        return cls(emu.seed, hashlib.sha256(bytes(program)).digest(), paced,
+                   emu.board.width, emu.board.height, emu.harvard)
+
+    def to_bytes(self):
+        out = bytearray(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, self.seed, self.program_hash,
+                                          self.instructions_per_frame, self.board_width,
+                                          self.board_height, self.harvard, len(self.frames)))
+        i = 0
+        frames = self.frames
+        while i < len(frames):
+            j = i + 1
+            while j < len(frames) and frames[j] == frames[i]:
+                j += 1
+            mask, cycles = frames[i]
+            put_varint(out, j - i)
+            out.append(mask)
+            put_varint(out, cycles)
+            i = j
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        (magic, version, seed, program_hash, instructions_per_frame,
+         width, height, harvard, count) = TRACE_HEADER.unpack_from(data)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError(f"Not an Arch-242 input trace (version {TRACE_VERSION})")
+        trace = cls(seed, program_hash, instructions_per_frame, width, height, bool(harvard))
+        offset = TRACE_HEADER.size
+        while len(trace.frames) < count:
+            run, offset = get_varint(data, offset)
+            mask = data[offset]
+            cycles, offset = get_varint(data, offset + 1)
+            trace.frames.extend([(mask, cycles)] * run)
+        return trace
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class TracePacer:
+    # Stands in for a ClockScheduler on replay: each frame runs exactly the
+    # cycles the recording ran. run() stops on the first instruction
+    # boundary at or past its budget, which is where the recording stopped.
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = 0
+
+    def run_frame(self, cpu):
+        mask, cycles = self.frames[self.index]
+        self.index += 1
+        if cycles:
+            cpu.run(cycles)
+        if mask & TRACE_HALTED:
+            cpu.step()      # the instruction that halted the recording
+
+
+# === LED framebuffer ===
+# The window draws the display rows straight from emulated memory. Each
+# 10-bit row mask (see display_row) maps to a precomputed scanline, only
+# rows written since the last render are redrawn, and the frontend blits
+# the image once per frame.
+
+CELL_W, CELL_H = 8, 4          # pixels per LED, including a 1-pixel gap
+LED_ON, LED_OFF = 3, 0         # Pyxel palette colours
+LED_HEAD = 11                  # the snake's head, drawn over its LED
+SNAKE_HEAD = 0xA2              # the program's head X, then Y
+
+
+def build_row_lut(on=LED_ON, off=LED_OFF):
+    # row mask -> scanline as hex colour digits, the format Image.set() takes
+    lit = f"{on:x}" * (CELL_W - 1) + f"{off:x}"
+    dark = f"{off:x}" * CELL_W
+    return [''.join(lit if mask >> x & 1 else dark for x in range(DISPLAY_COLS))
+            for mask in range(1 << DISPLAY_COLS)]
+
+
+ROW_LUT = build_row_lut()
+BLANK_SCANLINE = ROW_LUT[0]
+
+
+class LedFramebuffer:
+    # scanlines holds the rendered picture; image, if given (a pyxel.Image),
+    # gets the same rows
+    def __init__(self, cpu, image=None):
+        self.cpu = cpu
+        self.image = image
+        self.scanlines = [BLANK_SCANLINE] * (DISPLAY_ROWS * CELL_H)
+        cpu.dirty_rows = ALL_ROWS_DIRTY
+
+    def render(self):
+        # redraw the dirty rows, returns how many there were
+        cpu = self.cpu
+        dirty = cpu.dirty_rows
+        if not dirty:
+            return 0
+        cpu.dirty_rows = 0
+        memory = cpu.memory
+        count = 0
+        for y in range(DISPLAY_ROWS):
+            if dirty >> y & 1:
+                row = [ROW_LUT[display_row(memory, y)]] * (CELL_H - 1) + [BLANK_SCANLINE]
+                self.scanlines[y * CELL_H:(y + 1) * CELL_H] = row
+                if self.image is not None:
+                    self.image.set(0, y * CELL_H, row)
+                count += 1
+        return count
+
+
+# === Hot reload ===
+# An .asm program is assembled in-process (through linker's content-hash
+# cache) and its file is polled while the window runs. An edit is
+# assembled and swapped into the code region of the running machine; data
+# memory, registers and the game keep going. PC is moved to the same offset
+# from the label it was under, so a running loop carries on in the new code.
+
+RELOAD_POLL_SECONDS = 0.5
+
+
+def load_program_file(path, cache_dir=linker.CACHE_DIR):
+    # (program, labels); labels is empty for a .bin
+    if path.endswith('.asm'):
+        code, labels, _, _ = linker.cached_image(path, cache_dir)
+        return list(code), labels
+    with open(path, 'rb') as f:
+        return list(f.read()), {}
+
+
+def remap_pc(pc, old_labels, new_labels, starts):
+    # pc's address in the new layout: same offset from the nearest label
+    # at or before it, else unchanged, else 0 if that is not an instruction
+    before = [(addr, name) for name, addr in old_labels.items() if addr <= pc]
+    if before:
+        addr, name = max(before)
+        if name in new_labels and new_labels[name] + pc - addr in starts:
+            return new_labels[name] + pc - addr
+    return pc if pc in starts else 0
+
+
+class SourceReloader:
+    def __init__(self, cpu, path, labels, code_size, poll_seconds=RELOAD_POLL_SECONDS,
+                 cache_dir=linker.CACHE_DIR):
+        self.cpu = cpu
+        self.path = path
+        self.cache_dir = cache_dir
+        self.labels = labels
+        self.code_size = code_size
+        self.poll_seconds = poll_seconds
+        self.next_poll = 0.0
+        self.stamp = self.file_stamp()
+
+    def file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def poll(self):
+        # call once per frame; returns a message when something happened
+        now = time.monotonic()
+        if now < self.next_poll:
+            return None
+        self.next_poll = now + self.poll_seconds
+        stamp = self.file_stamp()
+        if stamp is None or stamp == self.stamp:
+            return None
+        self.stamp = stamp
+        try:
+            code, labels, starts, _ = linker.cached_image(self.path, self.cache_dir)
+        except (ValueError, OSError) as e:
+            # keep running the old code until the source assembles again
+            return f"reload failed: {e}"
+        cpu = self.cpu
+        limit = ROM_SIZE if cpu.harvard else MEM_SIZE
+        if len(code) > limit:
+            return f"reload failed: program is {len(code)} bytes, code space is {limit}"
+        pc = remap_pc(cpu.regs[PC], self.labels, labels, starts)
+        cpu.replace_code(code, self.code_size)
+        cpu.regs[PC] = pc
+        self.labels = labels
+        self.code_size = len(code)
+        return f"reloaded {self.path}: {len(code)} bytes, PC={pc:02X}"
+
+
+FRONTEND_FPS = 30
+
+
+class PyxelFrontend:
+    # Thin Pyxel layer over a headless Arch242Emulator: polls the keyboard,
+    # steps one emulator frame per Pyxel frame and draws the board
+    def __init__(self, emu, record_path=None, reloader=None):
+        if pyxel is None:
+            raise RuntimeError("Pyxel is not installed; run with --headless or pip install pyxel")
+        self.emu = emu
+        self.record_path = record_path   # rewritten once a second while recording
+        self.reloader = reloader         # SourceReloader for an .asm program
+        pyxel.init(80, 80, title="Arch-242 Snake Game", fps=FRONTEND_FPS)
+        self.image = pyxel.Image(DISPLAY_COLS * CELL_W, DISPLAY_ROWS * CELL_H)
+        self.framebuffer = LedFramebuffer(emu, self.image)
+
+    def run(self):
+        pyxel.run(self.update, self.draw)
+
+    def update(self):
+        keys = set()
+        if pyxel.btnp(pyxel.KEY_R):
+            keys.add('reset')
+        if pyxel.btn(pyxel.KEY_UP):
+            keys.add('up')
+        if pyxel.btn(pyxel.KEY_DOWN):
+            keys.add('down')
+        if pyxel.btn(pyxel.KEY_LEFT):
+            keys.add('left')
+        if pyxel.btn(pyxel.KEY_RIGHT):
+            keys.add('right')
+        if self.reloader is not None:
+            message = self.reloader.poll()
+            if message:
+                print(message, file=sys.stderr)
+        self.emu.frame(keys)
+        if self.record_path and self.emu.frame_count % FRONTEND_FPS == 0:
+            self.emu.recording.save(self.record_path)
 
     def draw(self):
-        pyxel.cls(0)
+        emu = self.emu
+        self.framebuffer.render()
+        pyxel.blt(0, 0, self.image, 0, 0, DISPLAY_COLS * CELL_W, DISPLAY_ROWS * CELL_H)
 
         # Draw game border
         border_color = 5  # dark gray
@@ -487,28 +2510,147 @@ class Arch242Emulator:
         # pyxel.rect(0, 8, 8, 68, border_color)     # left
         # pyxel.rect(72, 8, 8, 68, border_color)    # right
 
-        # Draw snake
-        if self.snake:
-            head_x, head_y = self.snake[0]
-            pyxel.rect(head_x * 8, head_y * 4, 7, 3, 11)
-            for x, y in self.snake[1:]:
-                pyxel.rect(x * 8, y * 4, 7, 3, 3) 
-
-        # Draw food
-        fx, fy = self.food
-        pyxel.rect(fx * 8, fy * 4, 7, 3, 8)
+        # Snake comes from display memory, its head in its own colour while
+        # that LED is lit; food only exists in Python
+        hx, hy = emu.memory[SNAKE_HEAD], emu.memory[SNAKE_HEAD + 1]
+        if hx < DISPLAY_COLS and hy < DISPLAY_ROWS and display_row(emu.memory, hy) >> hx & 1:
+            pyxel.rect(hx * CELL_W, hy * CELL_H, CELL_W - 1, CELL_H - 1, LED_HEAD)
+        if emu.food is not None:
+            fx, fy = emu.food
+            pyxel.rect(fx * 8, fy * 4, 7, 3, 8)
 
         # Draw score
-        pyxel.text(2, 2, f"Score: {self.score}", 7)
-        if self.game_over:
+        pyxel.text(2, 2, f"Score: {emu.score}", 7)
+        if emu.game_over:
             pyxel.text(16, 40, "Press R to retry", 7)
         # ==========================
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python3 emulator.py <program.bin>")
+def start_recording(emu, program, path):
+    emu.recording = InputTrace.for_emulator(emu, program)
+    # the window can be closed at any point, so also save on exit
+    atexit.register(lambda: emu.recording.save(path))
+
+
+def load_state_file(machine, path):
+    with open(path, 'rb') as f:
+        machine.load_state(f.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arch-242 emulator")
+    parser.add_argument('program', help="machine code (.bin) or assembly source (.asm) to load")
+    parser.add_argument('--no-reload', action='store_true',
+                        help="window: do not reload an .asm program when the file changes")
+    parser.add_argument('--headless', action='store_true',
+                        help="run without a window and print the final state")
+    parser.add_argument('--cycles', type=int, default=None,
+                        help="headless: run the bare CPU for this many cycles")
+    parser.add_argument('--frames', type=int, default=600,
+                        help="headless: emulator frames to run when --cycles is not given")
+    parser.add_argument('--no-jit', action='store_true',
+                        help="headless: run translated blocks without compiling hot ones")
+    parser.add_argument('--no-blocks', action='store_true',
+                        help="headless: plain interpreter, no translation cache")
+    parser.add_argument('--clock-hz', type=int, default=None,
+                        help=f"emulated clock rate (window default {DEFAULT_CLOCK_HZ}; "
+                             "headless frames default to a fixed instruction count)")
+    parser.add_argument('--fixed-steps', action='store_true',
+                        help="window: run a fixed 10 instructions per frame instead of a clock rate")
+    parser.add_argument('--load-state', metavar='FILE',
+                        help="start from a save_state() file instead of power-on")
+    parser.add_argument('--save-state', metavar='FILE',
+                        help="headless: write the final machine state here")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="food RNG seed (random if not given)")
+    parser.add_argument('--exec-trace', metavar='FILE',
+                        help="headless: write a binary per-instruction trace for exectrace.py")
+    parser.add_argument('--record', metavar='FILE',
+                        help="record an input trace for replay.py (starts from power-on)")
+    parser.add_argument('--harvard', action='store_true',
+                        help=f"fetch code from a separate {ROM_SIZE}-byte ROM with an 11-bit PC; memory is data only")
+    args = parser.parse_args()
+
+    try:
+        program, labels = load_program_file(args.program)
+        limit = ROM_SIZE if args.harvard else MEM_SIZE
+        if len(program) > limit:
+            raise ValueError(f"{args.program}: program is {len(program)} bytes, code space is {limit}"
+                             f"{'' if args.harvard else ' (try --harvard)'}")
+    except (ValueError, OSError) as e:
+        print(e)
         sys.exit(1)
-    with open(sys.argv[1], "rb") as f:
-        program = list(f.read())
-    Arch242Emulator(program)
+    reload = args.program.endswith('.asm') and not args.no_reload and not args.headless
+    if args.record and reload:
+        parser.error("--record needs a fixed program; add --no-reload")
+    if args.record and args.load_state:
+        parser.error("--record replays from power-on, so it cannot start from --load-state")
+    if args.record and args.cycles is not None:
+        parser.error("--record needs emulator frames, not --cycles")
+    seed = args.seed
+    if seed is None and args.record:
+        seed = random.getrandbits(63)
+
+    if not args.headless:
+        scheduler = None
+        if not args.fixed_steps:
+            scheduler = ClockScheduler(args.clock_hz or DEFAULT_CLOCK_HZ, fps=FRONTEND_FPS)
+        emu = Arch242Emulator(program, seed=seed, scheduler=scheduler, harvard=args.harvard)
+        if args.load_state:
+            load_state_file(emu, args.load_state)
+        if args.record:
+            start_recording(emu, program, args.record)
+        reloader = SourceReloader(emu, args.program, labels, len(program)) if reload else None
+        PyxelFrontend(emu, record_path=args.record, reloader=reloader).run()
+        return
+
+    if args.cycles is not None:
+        machine = Arch242CPU(program, use_blocks=not args.no_blocks, use_jit=not args.no_jit,
+                             harvard=args.harvard)
+        run = lambda: machine.run(args.cycles)
+    else:
+        scheduler = None
+        if args.clock_hz is not None:
+            # headless frames are not tied to the host clock
+            scheduler = ClockScheduler(args.clock_hz, fps=FRONTEND_FPS, realtime=False)
+        machine = Arch242Emulator(program, seed=seed, scheduler=scheduler, harvard=args.harvard)
+        run = lambda: [machine.frame() for _ in range(args.frames)]
+        if args.record:
+            start_recording(machine, program, args.record)
+    if args.load_state:
+        load_state_file(machine, args.load_state)
+    if args.exec_trace:
+        machine.set_exec_trace(ExecTraceWriter(args.exec_trace))
+
+    start = time.perf_counter()
+    try:
+        run()
+        status = "ok"
+    except (ValueError, IndexError) as e:
+        status = f"halted: {e}"
+    elapsed = time.perf_counter() - start
+    if args.exec_trace:
+        writer = machine.exec_trace
+        writer.close()
+        print(f"exec trace: {writer.records} records, {writer.dropped} dropped")
+    if args.save_state:
+        with open(args.save_state, 'wb') as f:
+            f.write(machine.save_state())
+    if args.record:
+        machine.recording.save(args.record)
+
+    r = machine.registers
+    print(f"status: {status}")
+    print(f"cycles: {machine.cycles} in {elapsed:.3f}s")
+    print(f"PC={r['PC']:02X} ACC={r['ACC']:X} CF={r['CF']} TEMP={r['TEMP']:03X} "
+          f"RA={r['RA']:X} RB={r['RB']:X} RC={r['RC']:X} RD={r['RD']:X} RE={r['RE']:X}")
+    if isinstance(machine, Arch242Emulator):
+        print(f"frames: {machine.frame_count} score: {machine.score}")
+        if machine.scheduler is not None:
+            stats = machine.scheduler.stats()
+            print(f"clock: {stats['clock_hz']} Hz, idle {stats['idle']} "
+                  f"late {stats['late']} dropped {stats['dropped']} cycles")
+
+
+if __name__ == "__main__":
+    main()
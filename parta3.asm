@@ -71,6 +71,9 @@ init:
     inc*-reg r1
     to-mba          ; [0xB1] = 5
 
+    ; frame timer: 10 ticks x 16 cycles, about every 8th frame at 600 Hz
+    timer 10
+    timer-start
     b main
 
 ; === Main Loop ===
@@ -128,8 +131,9 @@ wrap_xmax:
     b store_head
 
 dir_down:
-    inc*-reg r3
-    from-reg r3
+    from-reg r3     ; inc*-reg r3 is not decoded by the emulator
+    inc
+    to-reg r3
     sub 20
     beqz wrap_y
     b store_head
@@ -139,8 +143,9 @@ wrap_y:
     b store_head
 
 dir_up:
-    dec*-reg r3
-    from-reg r3
+    from-reg r3     ; nor is dec*-reg r3
+    dec
+    to-reg r3
     sub 2
     beqz wrap_ymax
     b store_head
@@ -165,14 +170,14 @@ store_head:
     to-reg r0
     from-reg r3
     to-reg r1
-    from-reg r2
-    to-reg r4        ; bit loop counter
     acc 1
 
+    ; count X down in r2 itself: dec*-reg r2 (0x15) is the only dec*-reg
+    ; the emulator decodes
 bitloop:
-    from-reg r4
+    from-reg r2
     beqz setpixel
-    dec*-reg r4
+    dec*-reg r2
     add 1
     b bitloop
 
@@ -181,12 +186,9 @@ setpixel:
     b wait
 
 wait:
-    from-ioa
-    to-reg r5
-    from-reg r5
-    sub 0
-    bnez main
-    b wait
+    b-timer wait    ; idle until the frame timer runs out
+    timer-start     ; next frame, same count
+    b main
 
 ; === Eat Food Routine ===
 eat_food:
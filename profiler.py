@@ -0,0 +1,163 @@
+import json
+import bisect
+import argparse
+
+import parta2
+
+
+class Symbols:
+    # Names addresses using a symbol map from `parta1.py -s`. Without one,
+    # addresses are shown as hex.
+    def __init__(self, symbol_map=None):
+        symbol_map = symbol_map or {'source': None, 'labels': {}, 'lines': []}
+        self.source = symbol_map['source']
+        labels = sorted((addr, name) for name, addr in symbol_map['labels'].items())
+        self.label_addrs = [addr for addr, _ in labels]
+        self.label_names = [name for _, name in labels]
+        self.lines = {}
+        for entry in symbol_map['lines']:
+            for addr in range(entry['addr'], entry['addr'] + entry['size']):
+                self.lines[addr] = (entry['line'], entry['text'])
+
+    @classmethod
+    def load(cls, path):
+        if path is None:
+            return cls()
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    def label(self, addr):
+        # innermost label at or before addr
+        i = bisect.bisect_right(self.label_addrs, addr) - 1
+        if i < 0:
+            return '(start)' if self.label_addrs else f'0x{addr:02X}'
+        return self.label_names[i]
+
+    def address(self, text):
+        # a number (0xA1, 161) or a label from the symbol map
+        try:
+            return int(text, 0)
+        except ValueError:
+            if text not in self.label_names:
+                raise ValueError(f"Unknown label: {text}")
+            return self.label_addrs[self.label_names.index(text)]
+
+    def line(self, addr):
+        if addr not in self.lines:
+            return f'0x{addr:02X}'
+        lineno, text = self.lines[addr]
+        return f'{self.source}:{lineno} {text}'
+
+
+def run_profile(program, frames=None, cycles=None, harvard=False):
+    # run the game (frames) or the bare CPU (cycles) with profiling on
+    profile = parta2.ExecutionProfile()
+    if cycles is not None:
+        machine = parta2.Arch242CPU(program, profile=profile, harvard=harvard)
+        run = lambda: machine.run(cycles)
+    else:
+        machine = parta2.Arch242Emulator(program, profile=profile, harvard=harvard)
+        run = lambda: [machine.frame() for _ in range(frames)]
+    try:
+        run()
+        status = 'ok'
+    except (ValueError, IndexError) as e:
+        status = f'halted: {e}'
+    return profile, status
+
+
+def hot_labels(profile, symbols):
+    totals = {}
+    for addr, cycles in enumerate(profile.pc_cycles):
+        if cycles:
+            name = symbols.label(addr)
+            totals[name] = totals.get(name, 0) + cycles
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def opcode_name(opcode):
+    handler, arg, length = parta2.DECODE_TABLE[opcode]
+    return handler.__name__[3:]
+
+
+def format_report(profile, symbols, status, top=10):
+    total = profile.total_cycles() or 1
+    out = [f"status: {status}", f"cycles: {profile.total_cycles()}", ""]
+
+    out.append("hot labels:")
+    for name, cycles in hot_labels(profile, symbols)[:top]:
+        out.append(f"  {cycles:10}  {100 * cycles / total:5.1f}%  {name}")
+
+    out.append("")
+    out.append("hot lines:")
+    ranked = sorted(range(len(profile.pc_cycles)), key=lambda addr: -profile.pc_cycles[addr])
+    for addr in ranked[:top]:
+        if not profile.pc_cycles[addr]:
+            break
+        out.append(f"  {profile.pc_cycles[addr]:10}  {profile.pc_counts[addr]:8}x  "
+                   f"[{addr:02X}] {symbols.line(addr)}")
+
+    out.append("")
+    out.append("opcodes:")
+    ranked = sorted(range(256), key=lambda op: -profile.opcode_counts[op])
+    for opcode in ranked[:top]:
+        if not profile.opcode_counts[opcode]:
+            break
+        out.append(f"  {profile.opcode_counts[opcode]:10}  0x{opcode:02X} {opcode_name(opcode)}")
+
+    if profile.branches:
+        out.append("")
+        out.append("branches (taken / not taken):")
+        for pc in sorted(profile.branches):
+            taken, not_taken = profile.branches[pc]
+            out.append(f"  {taken:8} / {not_taken:<8}  [{pc:02X}] {symbols.line(pc)}")
+
+    if profile.frame_cycles:
+        frames = profile.frame_cycles
+        out.append("")
+        out.append(f"cycles per frame: min {min(frames)} avg {sum(frames) / len(frames):.1f} "
+                   f"max {max(frames)} over {len(frames)} frames")
+    return '\n'.join(out)
+
+
+def collapsed_stacks(profile, symbols):
+    # Brendan Gregg's collapsed format, one "frame;frame;... cycles" per
+    # line, for flamegraph.pl / speedscope / inferno
+    lines = []
+    for key, cycles in sorted(profile.stacks.items()):
+        *calls, pc = key
+        frames = [symbols.label(target) for target in calls]
+        frames.append(symbols.label(pc))
+        frames.append(symbols.line(pc).replace(';', ','))
+        lines.append(f"{';'.join(frames)} {cycles}")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile an Arch-242 program and report hot spots")
+    parser.add_argument('program', help="machine code (.bin) to run")
+    parser.add_argument('-s', '--symbols', help="symbol map from `parta1.py -s`")
+    parser.add_argument('--frames', type=int, default=600, help="emulator frames to run")
+    parser.add_argument('--cycles', type=int, default=None, help="run the bare CPU for this many cycles instead")
+    parser.add_argument('--harvard', action='store_true', help="run the program from a 2 KiB ROM (see parta2.py)")
+    parser.add_argument('--top', type=int, default=10, help="rows per table")
+    parser.add_argument('--collapsed', metavar='FILE', help="write collapsed stacks for flamegraph tools")
+    parser.add_argument('--json', metavar='FILE', help="write the raw counters as JSON")
+    args = parser.parse_args()
+
+    with open(args.program, 'rb') as f:
+        program = f.read()
+    symbols = Symbols.load(args.symbols)
+    profile, status = run_profile(program, frames=args.frames, cycles=args.cycles, harvard=args.harvard)
+
+    print(format_report(profile, symbols, status, top=args.top))
+    if args.collapsed:
+        with open(args.collapsed, 'w') as f:
+            f.write(collapsed_stacks(profile, symbols))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(profile.to_dict(), f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+import parta2
+
+
+def replay(trace, program, **cpu_options):
+    # Run a recorded InputTrace headless, as fast as possible. Returns a
+    # report dict; state_hash is the same for every replay of the same trace.
+    if hashlib.sha256(bytes(program)).digest() != trace.program_hash:
+        raise ValueError("Trace was recorded with a different program")
+    pacer = parta2.TracePacer(trace.frames) if trace.instructions_per_frame == 0 else None
+    emu = parta2.Arch242Emulator(program, instructions_per_frame=trace.instructions_per_frame or 10,
+                                 seed=trace.seed, scheduler=pacer, board_width=trace.board_width,
+                                 board_height=trace.board_height, harvard=trace.harvard,
+                                 **cpu_options)
+
+    frame_cycles = []
+    status = 'ok'
+    start = time.perf_counter()
+    for mask, _ in trace.frames:
+        before = emu.cycles
+        try:
+            emu.frame(parta2.mask_keys(mask))
+        except (ValueError, IndexError) as e:
+            status = f'halted: {e}'
+            frame_cycles.append(emu.cycles - before)
+            break
+        frame_cycles.append(emu.cycles - before)
+    elapsed = time.perf_counter() - start
+
+    diverged = sum(1 for got, (_, want) in zip(frame_cycles, trace.frames) if got != want)
+    return {
+        'status': status,
+        'frames': len(frame_cycles),
+        'cycles': emu.cycles,
+        'elapsed': elapsed,
+        'cycles_per_second': emu.cycles / elapsed if elapsed else 0.0,
+        'frame_cycles_min': min(frame_cycles, default=0),
+        'frame_cycles_avg': sum(frame_cycles) / len(frame_cycles) if frame_cycles else 0.0,
+        'frame_cycles_max': max(frame_cycles, default=0),
+        'diverged_frames': diverged,
+        'score': emu.score,
+        'state_hash': hashlib.blake2b(emu.save_state(), digest_size=16).hexdigest(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an Arch-242 input trace headless at full speed")
+    parser.add_argument('trace', help="trace from `parta2.py --record`")
+    parser.add_argument('program', help="machine code (.bin) the trace was recorded with")
+    parser.add_argument('--repeat', type=int, default=1, help="replay this many times and keep the fastest")
+    parser.add_argument('--no-jit', action='store_true', help="run translated blocks without compiling hot ones")
+    parser.add_argument('--no-blocks', action='store_true', help="plain interpreter, no translation cache")
+    parser.add_argument('--json', action='store_true', help="print the report as one JSON line")
+    args = parser.parse_args()
+
+    trace = parta2.InputTrace.load(args.trace)
+    with open(args.program, 'rb') as f:
+        program = f.read()
+    options = {'use_blocks': not args.no_blocks, 'use_jit': not args.no_jit}
+    try:
+        reports = [replay(trace, program, **options) for _ in range(max(1, args.repeat))]
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    report = min(reports, key=lambda r: r['elapsed'])
+    if len({r['state_hash'] for r in reports}) != 1:
+        report['status'] += ' (nondeterministic!)'
+
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"status: {report['status']}")
+    print(f"frames: {report['frames']}  cycles: {report['cycles']}  score: {report['score']}")
+    print(f"time: {report['elapsed']:.3f}s  ({report['cycles_per_second']:,.0f} cycles/s)")
+    print(f"cycles/frame: min {report['frame_cycles_min']} avg {report['frame_cycles_avg']:.1f} "
+          f"max {report['frame_cycles_max']}")
+    if report['diverged_frames']:
+        print(f"warning: {report['diverged_frames']} frames ran a different cycle count than recorded")
+    print(f"state hash: {report['state_hash']}")
+
+
+if __name__ == '__main__':
+    main()
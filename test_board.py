@@ -0,0 +1,44 @@
+import random
+
+import parta2
+
+
+def check(board, body):
+    cells = {(x, y) for x in range(board.width) for y in range(board.top, board.top + board.height)}
+    assert list(board.body) == body
+    assert all((pos in board) == (pos in body) for pos in cells)
+    assert sorted(board.free) == sorted(board.cell(*pos) for pos in cells - set(body))
+
+
+def test_board_tracks_a_random_walk():
+    # a naive list model of the snake against the deque, occupancy and
+    # free-cell index, on a board that keeps filling up and emptying
+    rng = random.Random(1)
+    board = parta2.SnakeBoard(5, 4, top=2)
+    body = list(board.body)
+    for _ in range(2000):
+        head = board.next_head(rng.choice([(1, 0), (-1, 0), (0, 1), (0, -1)]))
+        if head in body or (len(body) > 3 and rng.random() < 0.5):
+            body.pop()
+            board.pop_tail()
+        else:
+            body.insert(0, head)
+            board.push_head(head)
+        check(board, body)
+        food = board.random_free(rng)
+        assert food is not None and food not in body
+
+
+def test_full_board_has_no_free_cell():
+    board = parta2.SnakeBoard(3, 2, top=0)
+    board.reset([(x, y) for y in range(2) for x in range(3)])
+    assert board.free == []
+    assert board.random_free(random.Random(0)) is None
+
+
+def test_emulator_uses_the_configured_board():
+    emu = parta2.Arch242Emulator([0xE0, 0x00], seed=1, board_width=40, board_height=30)
+    assert (emu.board.width, emu.board.height) == (40, 30)
+    assert emu.food not in emu.board
+    x, y = emu.food
+    assert 0 <= x < 40 and emu.board.top <= y < emu.board.top + 30
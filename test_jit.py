@@ -0,0 +1,30 @@
+import os
+
+import parta1
+import parta2
+
+
+def assemble(name):
+    with open(os.path.join(os.path.dirname(__file__), name)) as f:
+        return parta1.assemble_program(f.read()).code
+
+
+def run(code, cycles, **options):
+    cpu = parta2.Arch242CPU(code, harvard=True, **options)
+    cpu.regs[parta2.IOA] = 0x4      # a held key, so the game takes its input paths
+    for _ in range(cycles // 100):
+        cpu.run(100)
+    return cpu
+
+
+def test_jit_agrees_with_the_interpreter():
+    # bench.asm covers the ALU, memory and both branch kinds; parta3.asm
+    # the timer and its events
+    for name in ('bench.asm', 'parta3.asm'):
+        code = assemble(name)
+        jit = run(code, 20000, jit_threshold=1)
+        blocks = run(code, 20000, use_jit=False)
+        plain = run(code, 20000, use_blocks=False)
+        assert any(block.compiled is not None for block in jit.block_cache.values())
+        assert jit.cycles == blocks.cycles == plain.cycles
+        assert bytes(jit.state) == bytes(blocks.state) == bytes(plain.state)
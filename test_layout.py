@@ -0,0 +1,54 @@
+import pytest
+
+import parta1
+import parta2
+
+
+# `sub r1` assembles to from-reg r1 plus `sub 0`, which the emulator runs
+# as two instructions, so its profile has counts at addr+1
+HOT_LOOP = '\n'.join([
+    'start:',
+    '    acc 1',
+    '    to-reg r1',
+    '    acc 12',
+    '    to-reg r2',
+    'loop:',
+    '    from-reg r2',
+    '    beqz done',
+    '    b body',
+    'cold:',
+    '    nop',
+    '    b loop',
+    'body:',
+    '    sub r1',
+    '    dec*-reg r2',
+    '    b loop',
+    'done:',
+    '    b done',
+])
+
+
+def run(asm, profile=None):
+    cpu = parta2.Arch242CPU(asm.code, profile=profile)
+    assert cpu.run_until(pc=asm.labels['done'], max_cycles=1000)
+    return cpu
+
+
+def test_layout_with_register_operand_forms():
+    plain = parta1.assemble_program(HOT_LOOP)
+    profile = parta2.ExecutionProfile()
+    before = run(plain, profile)
+    laid = parta1.assemble_program(HOT_LOOP, profile=profile.to_dict())
+    after = run(laid)
+    assert after.cycles < before.cycles
+    assert [after.regs[r] for r in (parta2.ACC, parta2.RA, parta2.RB)] == \
+           [before.regs[r] for r in (parta2.ACC, parta2.RA, parta2.RB)]
+
+
+def test_profile_of_another_program_is_rejected():
+    plain = parta1.assemble_program(HOT_LOOP)
+    profile = parta2.ExecutionProfile()
+    run(plain, profile)
+    shifted = HOT_LOOP.replace('    acc 12\n', '    acc 12\n    nop\n')
+    with pytest.raises(ValueError, match="Profile does not match"):
+        parta1.assemble_program(shifted, profile=profile.to_dict())
@@ -0,0 +1,43 @@
+import os
+import asyncio
+
+import live
+import parta1
+import parta2
+
+
+# one snake segment at (9, 0), drawn into the 0x94-0x98 bank: length at
+# 0xA1, x at 0xA2 (rarb takes RA in its high nibble, so 0x1A is 0xA1)
+HIGH_COLUMN = '\n'.join([
+    'start:',
+    '    rarb 0x1A',
+    '    acc 1',
+    '    to-mba',
+    '    rarb 0x2A',
+    '    acc 9',
+    '    to-mba',
+    'halt:',
+    '    b halt',
+])
+
+
+def test_share_and_stream_carry_all_columns():
+    emu = parta2.Arch242Emulator(list(parta1.assemble_source(HIGH_COLUMN)), seed=1)
+    share = live.SharedFrame.create(f'arch242-test-{os.getpid()}')
+    server = live.FrameServer()
+    try:
+        assert asyncio.run(live.serve(emu, share, server, fps=0, frames=2)) is None
+        frame, rows, _, _, _ = share.read()
+    finally:
+        share.close()
+    assert frame == 2
+    assert rows[0] == 0x200
+    assert live.format_rows(rows[:1]) == '.........#'
+
+    async def decode():
+        reader = asyncio.StreamReader()
+        reader.feed_data(server.keyframe())
+        return await live.read_frame(reader)
+    kind, _, _, _, _, changed = asyncio.run(decode())
+    assert kind == live.KEYFRAME
+    assert dict(changed)[0] == 0x200
@@ -0,0 +1,38 @@
+import parta1
+
+
+# dead code after a `b` used to be dropped while thread_branches kept
+# walking its stale block list, then touched an instruction already gone
+def test_dead_code_then_branch_to_next_line():
+    source = '\n'.join([
+        'start:',
+        '    b skip',
+        '    nop',
+        '    b next',
+        'next:',
+        '    nop',
+        'skip:',
+        '    ret',
+    ])
+    plain = parta1.assemble_program(source)
+    optimized = parta1.assemble_program(source, optimize=True)
+    assert len(optimized.code) < len(plain.code)
+    assert optimized.code[-1] == plain.code[-1]     # ret
+    assert optimized.code[0] == parta1.branch_ops['b']
+    assert optimized.code[1] == optimized.labels['skip']
+
+
+# a call to the next line sets TEMP, so the ret after it returns there
+# instead of to wherever TEMP pointed before
+def test_call_to_next_line_is_kept():
+    source = '\n'.join([
+        'start:',
+        '    call next',
+        'next:',
+        '    inc',
+        '    ret',
+    ])
+    plain = parta1.assemble_program(source)
+    optimized = parta1.assemble_program(source, optimize=True)
+    assert optimized.code == plain.code
+    assert optimized.code[0] == parta1.branch_ops['call']
@@ -0,0 +1,56 @@
+import os
+import random
+
+import parta1
+import parta2
+
+
+def new_emulator():
+    with open(os.path.join(os.path.dirname(__file__), 'parta3.asm')) as f:
+        code = parta1.assemble_program(f.read()).code
+    return parta2.Arch242Emulator(list(code), seed=7, harvard=True)
+
+
+def play(emu, keys):
+    for held in keys:
+        emu.frame(held)
+    return emu.save_state()
+
+
+def random_keys(seed, frames):
+    rng = random.Random(seed)
+    return [{rng.choice(['up', 'down', 'left', 'right'])} for _ in range(frames)]
+
+
+def test_load_state_replays_the_same_run():
+    emu = new_emulator()
+    saved = play(emu, random_keys(1, 100))
+    ahead = play(emu, random_keys(2, 200))
+    emu.load_state(saved)
+    assert emu.save_state() == saved
+    assert play(emu, random_keys(2, 200)) == ahead
+
+
+def test_fork_runs_independently():
+    emu = new_emulator()
+    play(emu, random_keys(1, 100))
+    clone = emu.fork()
+    assert play(clone, random_keys(2, 100)) == play(emu, random_keys(2, 100))
+    before = emu.save_state()
+    play(clone, random_keys(3, 100))
+    assert emu.save_state() == before
+
+
+def test_rewind_restores_each_recorded_frame():
+    emu = new_emulator()
+    rewind = parta2.RewindBuffer(emu, capacity=50)
+    saves = []
+    for held in random_keys(1, 120):
+        emu.frame(held)
+        rewind.record()
+        saves.append(emu.save_state())
+    assert len(rewind) == 50
+    assert rewind.rewind(10) == 10
+    assert emu.save_state() == saves[-11]
+    assert rewind.rewind(100) == 39      # only as far as the oldest kept frame
+    assert emu.save_state() == saves[-50]
@@ -0,0 +1,55 @@
+import parta1
+import parta2
+
+
+TIMER_WAIT = '\n'.join([
+    '    timer 10',
+    '    timer-start',
+    'main:',
+    '    inc',
+    '    to-reg r2',
+    'wait:',
+    '    b-timer wait',
+    '    timer-start',
+    '    b main',
+])
+
+POLL = '\n'.join([
+    'start:',
+    '    from-ioa',
+    '    beqz start',
+    '    inc*-reg r0',
+    '    b start',
+])
+
+
+def run_frames(source, clock_hz, skip_idle, frames=120):
+    scheduler = parta2.ClockScheduler(clock_hz, realtime=False, skip_idle=skip_idle)
+    emu = parta2.Arch242Emulator(list(parta1.assemble_source(source)), seed=1, scheduler=scheduler)
+    per_frame = []
+    for frame in range(frames):
+        emu.regs[parta2.IOA] = 1 if frame % 40 == 39 else 0
+        before = emu.cycles
+        emu.update_frame(set())
+        emu.frame_count += 1
+        per_frame.append(emu.cycles - before)
+    return per_frame, bytes(emu.state), scheduler
+
+
+def test_skipping_idle_loops_is_exact():
+    for source in (TIMER_WAIT, POLL):
+        for clock_hz in (600, 6000):
+            skipped, state, scheduler = run_frames(source, clock_hz, skip_idle=True)
+            plain, plain_state, _ = run_frames(source, clock_hz, skip_idle=False)
+            assert skipped == plain
+            assert state == plain_state
+            assert scheduler.idle_cycles > 0
+
+
+def test_frames_stay_on_budget():
+    # the idle probe stops at the frame's end, and an overrun is owed back
+    for clock_hz in (600, 6000):
+        per_frame, _, scheduler = run_frames(POLL, clock_hz, skip_idle=True)
+        budget = clock_hz // 30
+        assert max(per_frame) <= budget + 1
+        assert sum(per_frame) - budget * len(per_frame) == -scheduler.backlog
@@ -0,0 +1,495 @@
+import sys
+import argparse
+
+import parta1
+import parta2
+from profiler import Symbols
+
+# Static control-flow graph and cycle bounds for an Arch-242 binary.
+#
+# Cycles follow the emulator: one per instruction byte, taken or not, so
+# an instruction costs its length. A node of the graph is a basic block
+# together with the value TEMP holds when it runs. TEMP only changes on
+# call and ret, so tracking it costs little and makes every ret go to a
+# known address: a routine called from two places is analysed twice,
+# once per return site.
+
+FRAMEBUFFER = range(parta2.DISPLAY_BASE, parta2.DISPLAY_END)   # rows and the column 8-9 bank
+DATA_START = 0xA0
+TO_PC_TARGETS = range(16)  # to-pc jumps to ACC, a nibble
+
+
+# === Decoding ===
+# opcode -> (mnemonic, length, kind), from the assembler's tables. kind is
+# one of op, cond, jump, call, ret, indirect, halt.
+
+def build_decode_table():
+    table = {}
+    for name, code in parta1.reg_ops.items():
+        for reg, bits in parta1.regs.items():
+            table[code | bits << 1] = (f'{name} {reg}', 1, 'op')
+    # plain instructions win where a reg op collides (to-reg r5 is clr-cf)
+    for name, code in parta1.instruction_set.items():
+        if name == 'shutdown':
+            table[code[0]] = (name, 1, 'halt')
+        else:
+            table[code] = (name, 1, 'ret' if name == 'ret' else 'op')
+    for name, code in parta1.imm_ops.items():
+        table[code] = (name, 2, 'op')
+    for imm in range(16):
+        table[parta1.acc_imm_prefix | imm] = (f'acc {imm}', 1, 'op')
+        table[0x50 | imm] = ('rarb', 2, 'op')
+        table[0x60 | imm] = ('rcrd', 2, 'op')
+    for name, code in parta1.branch_ops.items():
+        kind = {'b': 'jump', 'call': 'call'}.get(name, 'cond')
+        if name == 'b-bit':
+            for k in range(4):
+                for high in range(8):
+                    table[code | k << 3 | high] = (f'b-bit {k}', 2, kind)
+        else:
+            for high in range(8):
+                table[code | high] = (name, 2, kind)
+
+    assembler = set(table)
+
+    # opcodes the emulator runs that the assembler never emits
+    kinds = {'op_call': 'call', 'op_retc': 'ret', 'op_reti': 'ret', 'op_to_pc': 'indirect', 'op_b': 'jump'}
+    for opcode, (handler, _, length) in enumerate(parta2.DECODE_TABLE):
+        if opcode not in table and handler is not parta2.op_unknown:
+            name = handler.__name__[3:].replace('_', '-')
+            table[opcode] = (name, length, kinds.get(handler.__name__, 'op'))
+    return table, assembler
+
+
+DECODE, ASSEMBLER_OPCODES = build_decode_table()
+EMULATED = {opcode for opcode, (handler, _, _) in enumerate(parta2.DECODE_TABLE)
+            if handler is not parta2.op_unknown}
+
+
+class Instruction:
+    __slots__ = ('addr', 'opcode', 'name', 'length', 'kind', 'target', 'returns_to')
+
+    def __init__(self, code, addr):
+        self.addr = addr
+        self.opcode = opcode = code[addr] if addr < len(code) else 0
+        self.name, self.length, self.kind = DECODE.get(opcode, (f'0x{opcode:02X}', 1, 'halt'))
+        if opcode not in DECODE:
+            self.name = f'unknown 0x{opcode:02X}'
+        if addr >= len(code):
+            # memory past the program is zeroes, not code: stop here
+            self.name, self.length, self.kind = '(end of program)', 1, 'halt'
+        arg = code[(addr + 1) & 0xFF] if (addr + 1) & 0xFF < len(code) else 0
+        self.target = self.returns_to = None
+        if self.kind in ('cond', 'jump', 'call'):
+            # the assembler's branches carry 11 bits, the extra emulator ones 8
+            high = (opcode & 0x07) << 8 if opcode in ASSEMBLER_OPCODES else 0
+            self.target = high | arg
+        if self.kind == 'call':
+            # call 0x4C saves PC + 2 after both bytes are fetched, as parta2 does
+            self.returns_to = (addr + (4 if opcode == 0x4C else 2)) & 0xFF
+
+    def next(self):
+        return (self.addr + self.length) & 0xFF
+
+    def text(self):
+        if self.target is not None:
+            return f'{self.name} 0x{self.target:02X}'
+        return self.name
+
+
+# === Control-flow graph ===
+
+class Block:
+    __slots__ = ('key', 'instructions', 'successors', 'predecessors')
+
+    def __init__(self, key):
+        self.key = key  # (address, TEMP)
+        self.instructions = []
+        self.successors = []
+        self.predecessors = []
+
+    @property
+    def addr(self):
+        return self.key[0]
+
+    @property
+    def cycles(self):
+        return sum(ins.length for ins in self.instructions)
+
+
+class ControlFlowGraph:
+    def __init__(self, code, entry=0):
+        self.code = code
+        self.entry = (entry, 0)  # TEMP is 0 after reset
+        self.warnings = []
+        self.instructions = {}
+        self.blocks = {}
+        self.build()
+
+    def warn(self, ins, message):
+        entry = (ins.addr, message)
+        if entry not in self.warnings:
+            self.warnings.append(entry)
+
+    def step(self, ins, temp):
+        # the (address, TEMP) states that follow ins
+        if ins.target is not None and ins.target > 0xFF:
+            self.warn(ins, f'target 0x{ins.target:03X} is past memory, the emulator takes 0x{ins.target & 0xFF:02X}')
+        if ins.kind == 'op':
+            return [(ins.next(), temp)]
+        if ins.kind == 'cond':
+            return [(ins.target & 0xFF, temp), (ins.next(), temp)]
+        if ins.kind == 'jump':
+            return [(ins.target & 0xFF, temp)]
+        if ins.kind == 'call':
+            if temp:
+                self.warn(ins, f'call overwrites return address 0x{temp:02X} in TEMP')
+            return [(ins.target & 0xFF, ins.returns_to)]
+        if ins.kind == 'ret':
+            return [(temp, 0)]
+        if ins.kind == 'indirect':
+            self.warn(ins, 'to-pc jumps to ACC, assuming any of 0x00-0x0F')
+            return [(target, temp) for target in TO_PC_TARGETS]
+        if ins.opcode not in DECODE and ins.addr < len(self.code):
+            self.warn(ins, f'unknown opcode 0x{ins.opcode:02X} halts the emulator')
+        return []
+
+    def build(self):
+        # instruction-level states first, then runs of straight-line code
+        # are merged into blocks
+        successors = {}
+        pending = [self.entry]
+        while pending:
+            state = pending.pop()
+            if state in successors:
+                continue
+            addr, temp = state
+            if addr not in self.instructions:
+                ins = self.instructions[addr] = Instruction(self.code, addr)
+                if addr >= len(self.code):
+                    self.warn(ins, 'runs past the end of the program')
+                elif ins.opcode not in EMULATED and ins.opcode in DECODE:
+                    self.warn(ins, f'{ins.name} is not implemented by the emulator')
+            successors[state] = self.step(self.instructions[addr], temp)
+            pending.extend(successors[state])
+
+        predecessors = {state: 0 for state in successors}
+        for targets in successors.values():
+            for target in targets:
+                predecessors[target] += 1
+        starts = {state for state, count in predecessors.items() if count != 1}
+        starts.add(self.entry)
+        for state, targets in successors.items():
+            if len(targets) != 1:
+                starts.update(targets)
+        for start in starts:
+            block = self.blocks[start] = Block(start)
+            state = start
+            while True:
+                block.instructions.append(self.instructions[state[0]])
+                targets = successors[state]
+                if len(targets) != 1 or targets[0] in starts:
+                    break
+                state = targets[0]
+            block.successors = list(dict.fromkeys(targets))
+        for block in self.blocks.values():
+            for target in block.successors:
+                self.blocks[target].predecessors.append(block.key)
+
+    def unreachable(self):
+        # byte ranges of the program no reachable instruction covers
+        covered = set()
+        for ins in self.instructions.values():
+            covered.update((ins.addr + i) & 0xFF for i in range(ins.length))
+        ranges = []
+        for addr in range(len(self.code)):
+            if addr in covered:
+                continue
+            if ranges and ranges[-1][1] == addr:
+                ranges[-1][1] = addr + 1
+            else:
+                ranges.append([addr, addr + 1])
+        return ranges
+
+    def overlaps(self):
+        # (region, first, last) for code placed over the framebuffer or data
+        out = []
+        regions = [('framebuffer', FRAMEBUFFER.start, FRAMEBUFFER.stop), ('data', DATA_START, parta2.MEM_SIZE)]
+        for name, start, stop in regions:
+            if len(self.code) > start:
+                out.append((name, start, min(stop, len(self.code)) - 1))
+        return out
+
+
+# === Loops and cycle bounds ===
+# Natural loops from dominators, analysed innermost first. Inside a loop,
+# every edge back to its header is dropped, inner loops are collapsed into
+# one node and the rest is a DAG, so the shortest and longest path from
+# the header to each block is one pass in topological order. An inner
+# loop costs its bound times its worst iteration on the way through; with
+# no bound it makes everything around it unbounded.
+
+INFINITE = float('inf')
+
+
+class Loop:
+    def __init__(self, header, body):
+        self.header = header
+        self.body = body
+        self.children = []
+        self.bound = None
+        self.best = self.worst = None  # cycles per iteration
+        self.best_to = {}  # block -> cycles from the header to its start
+        self.worst_to = {}
+        self.reached = None  # (best, worst) cycles to first reach the header
+        self.irreducible = False
+
+    @property
+    def extra(self):
+        # worst case spent going round again before leaving
+        if self.bound is None:
+            return INFINITE
+        return self.bound * self.worst if self.bound else 0
+
+
+def dominators(cfg):
+    order = []
+    seen = set()
+    stack = [(cfg.entry, iter(cfg.blocks[cfg.entry].successors))]
+    seen.add(cfg.entry)
+    while stack:
+        key, successors = stack[-1]
+        for target in successors:
+            if target not in seen:
+                seen.add(target)
+                stack.append((target, iter(cfg.blocks[target].successors)))
+                break
+        else:
+            stack.pop()
+            order.append(key)
+    order.reverse()
+
+    dom = {key: set(cfg.blocks) for key in order}
+    dom[cfg.entry] = {cfg.entry}
+    changed = True
+    while changed:
+        changed = False
+        for key in order[1:]:
+            new = set.intersection(*(dom[p] for p in cfg.blocks[key].predecessors)) | {key}
+            if new != dom[key]:
+                dom[key] = new
+                changed = True
+    return dom, order
+
+
+def find_loops(cfg):
+    dom, order = dominators(cfg)
+    loops = {}
+    for key in order:
+        for target in cfg.blocks[key].successors:
+            if target in dom[key]:
+                body = loops[target].body if target in loops else {target}
+                pending = [key]
+                while pending:
+                    node = pending.pop()
+                    if node not in body:
+                        body.add(node)
+                        pending.extend(cfg.blocks[node].predecessors)
+                loops[target] = Loop(target, body)
+    # nest by body size, a loop's parent is the smallest loop containing it
+    ranked = sorted(loops.values(), key=lambda loop: len(loop.body))
+    top = []
+    for i, loop in enumerate(ranked):
+        parent = next((outer for outer in ranked[i + 1:] if loop.header in outer.body), None)
+        (parent.children if parent else top).append(loop)
+    return top, order
+
+
+def analyse(cfg, loop, order):
+    for child in loop.children:
+        analyse(cfg, child, order)
+    owner = {}
+    for child in loop.children:
+        for key in child.body:
+            owner[key] = child
+
+    def exits(node):
+        # (block left from, target, best, worst) for each way out of node
+        child = owner.get(node)
+        if child is None:
+            cycles = cfg.blocks[node].cycles
+            return [(node, target, cycles, cycles) for target in cfg.blocks[node].successors]
+        out = []
+        for key in child.body:
+            cycles = cfg.blocks[key].cycles
+            for target in cfg.blocks[key].successors:
+                if target not in child.body:
+                    out.append((key, target, child.best_to[key] + cycles,
+                                child.extra + child.worst_to[key] + cycles))
+        return out
+
+    position = {key: i for i, key in enumerate(order)}
+    best = {loop.header: 0}
+    worst = {loop.header: 0}
+    back_best, back_worst = [], []
+    for node in order:
+        if node not in best or (node in owner and node != owner[node].header):
+            continue
+        for source, target, low, high in exits(node):
+            if target == loop.header:
+                back_best.append(best[node] + low)
+                back_worst.append(worst[node] + high)
+                continue
+            if target not in loop.body:
+                continue
+            target = owner[target].header if target in owner else target
+            if position[target] <= position[node]:
+                # a retreating edge that is not a back edge: a loop with
+                # two entries, no bound can be given
+                loop.irreducible = True
+                continue
+            best[target] = min(best.get(target, INFINITE), best[node] + low)
+            worst[target] = max(worst.get(target, 0), worst[node] + high)
+
+    for child in loop.children:
+        child.reached = (best.get(child.header, INFINITE), worst.get(child.header, INFINITE))
+    for key in loop.body:
+        child = owner.get(key)
+        if child is None:
+            loop.best_to[key], loop.worst_to[key] = best.get(key, INFINITE), worst.get(key, INFINITE)
+        else:
+            loop.best_to[key] = best.get(child.header, INFINITE) + child.best_to[key]
+            loop.worst_to[key] = worst.get(child.header, INFINITE) + child.extra + child.worst_to[key]
+    loop.best = min(back_best, default=0)
+    loop.worst = INFINITE if loop.irreducible else max(back_worst, default=0)
+
+
+def analyse_program(cfg, bounds=None):
+    # returns the top-level loops, each analysed; the program around them
+    # is analysed as a loop headed at reset that never goes round
+    bounds = bounds or {}
+    top, order = find_loops(cfg)
+
+    def apply(loops):
+        for loop in loops:
+            loop.bound = bounds.get(loop.header[0])
+            apply(loop.children)
+    apply(top)
+    root = Loop(cfg.entry, set(order))
+    root.children = top
+    analyse(cfg, root, order)
+    return top
+
+
+# === Reporting ===
+
+def cycles_text(value):
+    return 'unbounded' if value == INFINITE else str(value)
+
+
+def block_name(cfg, key, symbols):
+    addr, temp = key
+    name = f'[{addr:02X}] {symbols.label(addr)}'
+    if temp:
+        name += f' (returning to 0x{temp:02X})'
+    return name
+
+
+def format_report(cfg, top, symbols):
+    out = [f"cfg: {len(cfg.code)} bytes, {len(cfg.instructions)} instructions reachable, "
+           f"{len(cfg.blocks)} blocks", ""]
+
+    out.append("loops (cycles per iteration, best..worst):")
+
+    def show(loops, depth):
+        for loop in sorted(loops, key=lambda loop: loop.header):
+            line = (f"{'  ' * depth}  {block_name(cfg, loop.header, symbols):32} "
+                    f"{cycles_text(loop.best):>9}..{cycles_text(loop.worst):<9}")
+            if depth:
+                line += f"  bound {loop.bound}" if loop.bound is not None else "  no bound (--bound)"
+            else:
+                line += f"  first reached after {cycles_text(loop.reached[0])}..{cycles_text(loop.reached[1])}"
+            if loop.irreducible:
+                line += "  irreducible"
+            out.append(line)
+            show(loop.children, depth + 1)
+    show(top, 0)
+    if not top:
+        out.append("  (none)")
+
+    unreachable = cfg.unreachable()
+    if unreachable:
+        out.append("")
+        out.append("unreachable:")
+        for start, stop in unreachable:
+            out.append(f"  [{start:02X}..{stop - 1:02X}] {stop - start:3} bytes  {symbols.line(start)}")
+
+    overlaps = cfg.overlaps()
+    if overlaps:
+        out.append("")
+        out.append("overlapping memory:")
+        for name, first, last in overlaps:
+            live = sum(1 for addr in range(first, last + 1) if addr in cfg.instructions)
+            out.append(f"  [{first:02X}..{last:02X}] {name}: {last - first + 1} bytes of program, "
+                       f"{live} reachable instructions, overwritten as the game runs")
+
+    if cfg.warnings:
+        out.append("")
+        out.append("warnings:")
+        for addr, message in sorted(cfg.warnings):
+            out.append(f"  [{addr:02X}] {message}  {symbols.line(addr)}")
+    return '\n'.join(out)
+
+
+def format_dot(cfg, symbols):
+    out = ['digraph cfg {', '  node [shape=box fontname=monospace];']
+    for key, block in sorted(cfg.blocks.items()):
+        lines = [block_name(cfg, key, symbols), f'{block.cycles} cycles']
+        lines += [f'{ins.addr:02X}  {ins.text()}' for ins in block.instructions]
+        label = '\\l'.join(line.replace('"', '\\"') for line in lines) + '\\l'
+        out.append(f'  "{key[0]:02X}_{key[1]:02X}" [label="{label}"];')
+        for target in block.successors:
+            out.append(f'  "{key[0]:02X}_{key[1]:02X}" -> "{target[0]:02X}_{target[1]:02X}";')
+    out.append('}')
+    return '\n'.join(out) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static control-flow graph and cycle bounds for an Arch-242 binary")
+    parser.add_argument('program', help="machine code (.bin) to analyse")
+    parser.add_argument('-s', '--symbols', help="symbol map from `parta1.py -s`")
+    parser.add_argument('--bound', action='append', default=[], metavar='LOOP=N',
+                        help="at most N extra iterations of the inner loop headed at LOOP (number or label)")
+    parser.add_argument('--budget', type=int, help="exit 2 unless every outer loop iteration fits in this many cycles")
+    parser.add_argument('--dot', metavar='FILE', help="write the graph for Graphviz")
+    args = parser.parse_args()
+
+    with open(args.program, 'rb') as f:
+        code = f.read()
+    symbols = Symbols.load(args.symbols)
+    bounds = {}
+    try:
+        for text in args.bound:
+            loop, _, count = text.partition('=')
+            bounds[symbols.address(loop)] = int(count)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    cfg = ControlFlowGraph(code)
+    top = analyse_program(cfg, bounds)
+    print(format_report(cfg, top, symbols))
+    if args.dot:
+        with open(args.dot, 'w') as f:
+            f.write(format_dot(cfg, symbols))
+    if args.budget is not None:
+        over = [loop for loop in top if loop.worst > args.budget]
+        for loop in over:
+            print(f"over budget: {block_name(cfg, loop.header, symbols)} takes up to "
+                  f"{cycles_text(loop.worst)} cycles, budget {args.budget}")
+        if over:
+            sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()